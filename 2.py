@@ -1,91 +1,78 @@
 import streamlit as st
-import pandas as pd
-import os
-import requests
-import string
-from dotenv import load_dotenv
-import google.generativeai as Genai
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-from nltk.stem import WordNetLemmatizer
-from nltk.corpus import stopwords
-import hashlib
-import json
 from datetime import datetime
-import nltk
-
-# Download NLTK data
-nltk.download("stopwords")
-nltk.download("wordnet")
-nltk.download("omw-1.4")
+import credentials
+from assistant import Assistant
+from metrics import LOGINS, span
+from services import PASSWORD_HASH_PARAMS, get_chat_store, get_metrics_server, get_user_store
+
+# Services (NLTK data, the offline index, the Gemini client) are built on
+# first use by services.py, not on every rerun of this script. Routing a
+# question and storing the answer is done by the Assistant, which the HTTP
+# API (api.py) shares.
+assistant = Assistant()
+get_metrics_server()  # no-op unless PAKLAW_METRICS=1 and PAKLAW_METRICS_PORT are set
 
 # ----------------------- AUTH FUNCTIONS -----------------------
 
 def hash_password(password):
-    return hashlib.sha256(password.encode()).hexdigest()
-
-def load_users():
-    if not os.path.exists("users.csv"):
-        df = pd.DataFrame(columns=["username", "email", "password_hash"])
-        df.to_csv("users.csv", index=False)
-    return pd.read_csv("users.csv")
+    return credentials.hash_password(password, PASSWORD_HASH_PARAMS)
 
 def save_user(username, email, password):
-    df = load_users()
-    new_user = {
-        "username": username,
-        "email": email,
-        "password_hash": hash_password(password)
-    }
-    df.loc[len(df)] = new_user
-    df.to_csv("users.csv", index=False)
+    """Create the account; returns False if the email is already registered"""
+    with span("auth_signup"):
+        return get_user_store().add(username, email, hash_password(password))
 
 def authenticate(email, password):
-    df = load_users()
-    password_hash = hash_password(password)
-    user = df[(df["email"] == email) & (df["password_hash"] == password_hash)]
-    if not user.empty:
-        return user.iloc[0]["username"]  # Return username instead of boolean
-    return None
+    with span("auth_login"):
+        store = get_user_store()
+        user = store.get(email)
+        if user and credentials.verify_password(password, user["password_hash"]):
+            # Upgrade old unsalted SHA-256 (or outdated cost) hashes on successful login
+            if credentials.needs_rehash(user["password_hash"], PASSWORD_HASH_PARAMS):
+                store.set_password_hash(email, hash_password(password))
+            LOGINS.inc(result="ok")
+            return user["username"]  # Return username instead of boolean
+        LOGINS.inc(result="failed")
+        return None
 
 
 # ----------------------- CHAT STORAGE FUNCTIONS -----------------------
 
-def load_user_chats(email):
-    """Load user's chats from file"""
-    if not os.path.exists("user_chats.json"):
-        return {}
-    
-    try:
-        with open("user_chats.json", "r") as f:
-            all_chats = json.load(f)
-        return all_chats.get(email, {})
-    except:
-        return {}
-
-def save_user_chats(email, chats):
-    """Save user's chats to file"""
-    if os.path.exists("user_chats.json"):
-        try:
-            with open("user_chats.json", "r") as f:
-                all_chats = json.load(f)
-        except:
-            all_chats = {}
-    else:
-        all_chats = {}
-    
-    all_chats[email] = chats
-    
-    with open("user_chats.json", "w") as f:
-        json.dump(all_chats, f)
+# The sidebar lists this many chats per page and the chat pane shows this many
+# of the latest messages, with a button to reveal earlier ones.
+CHATS_PER_PAGE = 20
+MESSAGES_PER_PAGE = 30
+
+def list_user_chats(email, page=0, title_filter=""):
+    """One page of the user's chat index (id, title, timestamp), newest first"""
+    return get_chat_store().list_chats(
+        email, limit=CHATS_PER_PAGE, offset=page * CHATS_PER_PAGE, title_filter=title_filter
+    )
+
+def load_chat_messages(email, chat_id):
+    """Load one chat's messages and the shared version they reflect"""
+    return assistant.open_chat(email, chat_id)
+
+def chat_changed(email, chat_id, version):
+    """True once another tab or worker has committed to the chat since `version`"""
+    return assistant.chat_version(email, chat_id) != version
+
+def search_user_chats(email, query):
+    """Full-text search over the user's messages: best-matching chats with a snippet"""
+    return assistant.search(email, query, limit=CHATS_PER_PAGE)
+
+def save_user_chat(email, chat_id, chat):
+    """Save any messages of one chat that aren't stored yet; returns the write's ticket"""
+    return get_chat_store().sync_chat(email, chat_id, chat)
+
+# Chat writes are committed in the background; logging out waits this long
+# for the session's to reach disk.
+LOGOUT_SAVE_TIMEOUT = 5.0
 
-def generate_chat_title(first_message):
-    """Generate a meaningful chat title from the first message"""
-    words = first_message.split()[:5]  # Take first 5 words
-    title = " ".join(words)
-    if len(title) > 30:
-        title = title[:30] + "..."
-    return title if title else "New Chat"
+def wait_for_saves(ticket):
+    """Wait until the save that returned `ticket`, and every earlier one, is committed"""
+    if ticket is not None:
+        assistant.wait_saved(ticket, timeout=LOGOUT_SAVE_TIMEOUT)
 
 
 # ----------------------- PAGE SETTINGS -----------------------
@@ -110,10 +97,18 @@ if "show_login" not in st.session_state:
     st.session_state.show_login = False
 if "current_chat_id" not in st.session_state:
     st.session_state.current_chat_id = None
+if "current_chat_title" not in st.session_state:
+    st.session_state.current_chat_title = None
 if "chat_started" not in st.session_state:
     st.session_state.chat_started = False
+if "chat_version" not in st.session_state:
+    st.session_state.chat_version = 0
 if "signup_success" not in st.session_state:
     st.session_state.signup_success = False
+if "chat_page" not in st.session_state:
+    st.session_state.chat_page = 0
+if "messages_shown" not in st.session_state:
+    st.session_state.messages_shown = MESSAGES_PER_PAGE
 
 # Top-right auth section
 st.markdown("""
@@ -154,14 +149,14 @@ st.markdown("</div>", unsafe_allow_html=True)
 if st.session_state.logged_in:
     if st.sidebar.button("🚪 Logout"):
         # Save current chat before logging out
+        ticket = st.session_state.get("save_ticket")
         if st.session_state.messages and st.session_state.current_chat_id:
-            user_chats = load_user_chats(st.session_state.user_email)
-            user_chats[st.session_state.current_chat_id] = {
-                "title": st.session_state.current_chat_id,
+            ticket = save_user_chat(st.session_state.user_email, st.session_state.current_chat_id, {
+                "title": st.session_state.current_chat_title,
                 "messages": st.session_state.messages,
                 "timestamp": datetime.now().isoformat()
-            }
-            save_user_chats(st.session_state.user_email, user_chats)
+            })
+        wait_for_saves(ticket)
         
         st.session_state.clear()
         st.rerun()
@@ -202,12 +197,12 @@ if st.session_state.show_login and not st.session_state.logged_in:
                         st.session_state.user_email = email
                         st.session_state.username = username
                         st.session_state.show_login = False
-                        # Load user's chats when logging in
-                        st.session_state.saved_chats = load_user_chats(email)
                         st.session_state.messages = []
                         st.session_state.chat_session = {"Province": [], "Problem": []}
                         st.session_state.current_chat_id = None
+                        st.session_state.current_chat_title = None
                         st.session_state.chat_started = False
+                        st.session_state.chat_version = 0
                         st.success(f"Welcome back, {username}!")
                         st.rerun()
                     else:
@@ -239,11 +234,9 @@ if st.session_state.show_login and not st.session_state.logged_in:
                     if password != confirm:
                         st.error("Passwords do not match!")
                     else:
-                        df = load_users()
-                        if email in df["email"].values:
+                        if not save_user(username, email, password):
                             st.error("Email already exists!")
                         else:
-                            save_user(username, email, password)
                             st.success("🎉 Account created successfully! Please login with your credentials.")
                             st.session_state.signup_success = True
                             # Switch to login tab automatically
@@ -261,172 +254,17 @@ if st.session_state.show_login and not st.session_state.logged_in:
         st.rerun()
 
 
-# ----------------------- LOAD MODEL -----------------------
-
-load_dotenv("Secret_key.env")
-My_key = os.getenv("YOUR_API_KEY")
-Genai.configure(api_key=My_key)
-
-model = Genai.GenerativeModel(
-    "gemini-2.5-flash-lite",
-    generation_config={"max_output_tokens": 1080, "temperature": 0.3}
-)
-
-
-# ----------------------- LOAD CSV DATA -----------------------
-
-df = pd.read_csv("AI_legal_assistance.csv")
-
-
-# ----------------------- TEXT PREPROCESSING -----------------------
-
-def preprocessing(text):
-    text = text.translate(str.maketrans("", "", string.punctuation))
-    stop_words = set(stopwords.words("english"))
-    tokens = text.split()
-    tokens = [word for word in tokens if word.lower() not in stop_words]
-    lemmatizer = WordNetLemmatizer()
-    tokens = [lemmatizer.lemmatize(word, pos="v") for word in tokens]
-    return " ".join(tokens)
-
-
-df["Topic"] = df["Topic"].apply(preprocessing)
-vectorizer = TfidfVectorizer()
-X = vectorizer.fit_transform(df["Topic"])
-
+# ----------------------- STREAMING -----------------------
 
-# ----------------------- OFFLINE RESPONSE -----------------------
-
-def offline_response(user_input):
-    clean_input = preprocessing(user_input)
-    vectorized = vectorizer.transform([clean_input])
-    similarity = cosine_similarity(X, vectorized)
-    idx = similarity.argmax()
-    if similarity.max() > 0.3:
-        return df["Details"].iloc[idx]
-    else:
-        return "Sorry, this topic is not available offline."
-
-
-# ----------------------- INTERNET CHECK -----------------------
-
-def check_internet():
-    websites = ["https://www.google.com", "https://www.microsoft.com"]
-    for site in websites:
-        try:
-            requests.get(site, timeout=3)
-            return True
-        except:
-            continue
-    return False
-
-
-# ----------------------- ONLINE BOT -----------------------
-
-def chat_bot(user_input, chat_session):
-    prompt = f"""
-    You are PakLaw Assist, a friendly, knowledgeable,non-advocacy AI legal assistant for Pakistan.
-            Do NOT repeat your identity in every message.
-            Do NOT greet repeatedly.
-Your job is to provide clear, simple, step-by-step general guidance about Pakistani laws and government procedures.
-You are not a lawyer, and you must never give legal advice — only general procedural guidance.
-🔥 CHAT SESSION MEMORY RULE
-You have access to:
-{chat_session}
-Whenever the user asks about something that is already stored here, you must answer using this information.
-🎯 PERSONA & STYLE
-Friendly, respectful, calm, non-judgmental.
-Simple English with light Urdu mix for clarity (e.g., “Aasan alfaaz mein bataoon…”).
-Very concise.
-No legal jargon. If you use a legal term, explain it in 1 short line.
-Use bullets, numbered steps, and short sentences only.
-Only ask for city/district if necessary.
-📌 COVER THESE DOMAINS
-You must give accurate, Pakistan-specific guidance on:
-FIR registration, SHO duties, rights, follow-up
-Cybercrime reporting (FIA portal, helpline, WhatsApp, evidence)
-Property disputes (mutation, stay order, civil court steps)
-Traffic challans (check, pay, contest, appeal)
-Nikahnama, talaq, khula, NADRA updates
-NADRA CNIC / B-Form / Smart Card / errors / lost card process
-Passport applications, renewals, lost passport reporting
-Police harassment (citizen rights, complaint channels)
-Tenant–landlord issues (rent agreement, eviction rules)
-Consumer protection complaints & consumer courts
-📑 RESPONSE FORMAT (MANDATORY FOR ANY PROCEDURE)
-1. Step-by-Step Process (numbered, very simple)
-2. Required Documents (bullets)
-3. Where to Apply / Report (exact office/portal)
-4. Fees & Time (approx, safe ranges)
-5. Important Notes & Cautions
-6. If Issue Is Not Resolved (Escalation Path)
-If the user asks a general/conceptual question, give a short explanation and ask:
-“Do you want the full step-by-step procedure?”
-⚠️ SAFETY & LEGAL BOUNDARIES
-Always say: “This is general guidance based on Pakistani procedures.”
-Never draft legal petitions, false evidence, fake complaints, or anything illegal.
-If user faces violence, serious threats, kidnapping, assault →
-Tell them to contact nearest police station / emergency helpline immediately.
-For cybercrime abuse/harassment, always include evidence preservation steps.
-🔒 EVIDENCE & PRIVACY GUIDELINES
-Always remind users (when relevant):
-Take screenshots with timestamps
-Export chat logs
-Save emails with headers
-Keep original WhatsApp messages
-Do NOT share passwords, OTPs, CNIC copies, or sensitive data publicly
-💬 TONE RULES
-Short sentences, super clear.
-Use friendly Urdu phrases occasionally:
-“Agar aap chahein, main Urdu mein bhi samjha sakta hoon.”
-Never write long paragraphs.
-No unnecessary formality.
-❓ WHEN UNSURE
-If you are not fully certain about the latest fees, timings, or district-specific rules, say:
-“I may not have the latest fee/time — do you want typical ranges or should I ask your district?
-    {user_input}
-    """
-    response = model.generate_content(prompt)
-    return response.text
-
-
-# ----------------------- EMERGENCY MODE -----------------------
-
-def emergency_mode(user_input):
-    prompt = f"""
-     # --- EMERGENCY MODE (ACTIVE) ---
-You are in EMERGENCY MODE in Pakistan. The user is reporting danger, harassment, violence, threats, kidnapping, sexual assault, police abuse, or any situation that may risk immediate harm.
-Your priority is SAFETY, not law explanation.
-Behave like a real human be realistic
-STRICT RULES:
-1. DO NOT give legal advice. Only give general safety guidance and official reporting options.
-2. Keep responses SHORT, DIRECT, and calming.
-3. Use bilingual clarity where needed (English + short Urdu phrases).
-4. Always tell the user to move to a safe place if possible.
-5. Always tell the user to contact local emergency authorities:
-   - Police: 15
-   - FIA Cybercrime: 1991 (for online threats)
-6. Include a fast, numbered safety checklist.
-7. Instruct the user to preserve evidence (screenshots, recordings, photos, timestamps).
-8. Never blame the user or question their situation.
-9. Never escalate or provoke the attacker in your suggestions.
-10. If the user mentions severe injury or imminent threat, tell them:
-    “Call 15 immediately. If possible go to a public place or trusted person.”
-11. Always include a calm note: “Main aap ke saath hoon — stay calm.”
-RESPONSE TEMPLATE:
-1) Immediate Safety Steps — 3 to 6 very short steps (move to safety, call 15, contact trusted person).
-2) Evidence Preservation — list of what to save.
-3) Where to Report — relevant official helplines/offices based on issue.
-4) If You Cannot Call 15 — alternative suggestions (safe location, nearby people, family).
-5) Short reassurance line — empathetic, supportive tone.
-Do NOT ask long follow-up questions. Only ask:
-“Are you currently safe?” or
-“Can you reach a trusted person right now?”
-and wait for the answer.
-    {user_input}
-    """
-    response = model.generate_content(prompt)
-    return response.text
+def render_stream(turn):
+    """Show the reply in a bot bubble as it arrives and return the final text"""
+    placeholder = st.empty()
+    reply = ""
+    for chunk in turn:
+        reply += chunk
+        placeholder.markdown(f"<div class='chat-bubble-bot'><b>PakLaw Assist:</b> {reply}</div>",
+                             unsafe_allow_html=True)
+    return turn.reply
 
 
 # ----------------------- CHAT UI COLORS -----------------------
@@ -460,10 +298,6 @@ st.markdown("""
 if st.session_state.logged_in:
     st.sidebar.title("📁 Your Chats")
     
-    # Load user's chats
-    if "saved_chats" not in st.session_state:
-        st.session_state.saved_chats = load_user_chats(st.session_state.user_email)
-    
     if "messages" not in st.session_state:
         st.session_state.messages = []
     
@@ -474,51 +308,73 @@ if st.session_state.logged_in:
     if st.sidebar.button("🆕 New Chat"):
         # Save current chat if it has messages
         if st.session_state.messages and st.session_state.current_chat_id:
-            st.session_state.saved_chats[st.session_state.current_chat_id] = {
-                "title": st.session_state.current_chat_id,
-                "messages": st.session_state.messages,
-                "timestamp": datetime.now().isoformat()
-            }
-            save_user_chats(st.session_state.user_email, st.session_state.saved_chats)
+            st.session_state.save_ticket = save_user_chat(
+                st.session_state.user_email, st.session_state.current_chat_id, {
+                    "title": st.session_state.current_chat_title,
+                    "messages": st.session_state.messages,
+                    "timestamp": datetime.now().isoformat()
+                })
         
         # Start new chat
         st.session_state.messages = []
         st.session_state.chat_session = {"Province": [], "Problem": []}
         st.session_state.current_chat_id = None
+        st.session_state.current_chat_title = None
         st.session_state.chat_started = False
+        st.session_state.chat_version = 0
+        st.session_state.messages_shown = MESSAGES_PER_PAGE
         st.rerun()
 
-    # Search chats
-    query = st.sidebar.text_input("🔍 Search")
+    # Search chats (a new search starts again from the first page)
+    query = st.sidebar.text_input(
+        "🔍 Search", on_change=lambda: st.session_state.update(chat_page=0)
+    )
 
-    # Display user's chats
-    if not st.session_state.saved_chats:
-        st.sidebar.caption("No chats saved yet. Start a new conversation!")
-    else:
-        # Sort chats by timestamp (newest first)
-        sorted_chats = sorted(
-            st.session_state.saved_chats.items(),
-            key=lambda x: x[1].get("timestamp", ""),
-            reverse=True
+    def open_chat(chat_id, title):
+        # Every turn is already stored, so just load the selected chat
+        st.session_state.messages, st.session_state.chat_version = load_chat_messages(
+            st.session_state.user_email, chat_id
         )
-        
-        for chat_id, chat_data in sorted_chats:
-            chat_title = chat_data.get("title", chat_id)
-            if query.lower() in chat_title.lower():
-                if st.sidebar.button(f"💬 {chat_title}", key=chat_id):
-                    # Save current chat before switching
-                    if st.session_state.messages and st.session_state.current_chat_id:
-                        st.session_state.saved_chats[st.session_state.current_chat_id] = {
-                            "title": st.session_state.current_chat_id,
-                            "messages": st.session_state.messages,
-                            "timestamp": datetime.now().isoformat()
-                        }
-                    
-                    # Load selected chat
-                    st.session_state.messages = chat_data["messages"]
-                    st.session_state.current_chat_id = chat_id
-                    st.session_state.chat_started = True
-                    st.rerun()
+        st.session_state.current_chat_id = chat_id
+        st.session_state.current_chat_title = title
+        st.session_state.chat_started = True
+        st.session_state.messages_shown = MESSAGES_PER_PAGE
+        st.rerun()
+
+    if query.strip():
+        # Search message contents, not just titles; best match first
+        results = search_user_chats(st.session_state.user_email, query)
+        if not results:
+            st.sidebar.caption("No chats match your search.")
+        for result in results:
+            if st.sidebar.button(f"💬 {result['title']}", key=f"found_{result['chat_id']}"):
+                open_chat(result["chat_id"], result["title"])
+            st.sidebar.caption(result["snippet"])
+    else:
+        # Display one page of the user's chats; only titles are read, never messages
+        total_chats = get_chat_store().count_chats(st.session_state.user_email)
+        if not total_chats:
+            st.sidebar.caption("No chats saved yet. Start a new conversation!")
+        else:
+            n_pages = (total_chats + CHATS_PER_PAGE - 1) // CHATS_PER_PAGE
+            page = min(st.session_state.chat_page, n_pages - 1)
+
+            for entry in list_user_chats(st.session_state.user_email, page):
+                if st.sidebar.button(f"💬 {entry['title']}", key=entry["chat_id"]):
+                    open_chat(entry["chat_id"], entry["title"])
+
+            if n_pages > 1:
+                col_newer, col_page, col_older = st.sidebar.columns([1, 1, 1])
+                with col_newer:
+                    if st.button("‹", key="chats_newer", disabled=page == 0):
+                        st.session_state.chat_page = page - 1
+                        st.rerun()
+                with col_page:
+                    st.caption(f"{page + 1} / {n_pages}")
+                with col_older:
+                    if st.button("›", key="chats_older", disabled=page >= n_pages - 1):
+                        st.session_state.chat_page = page + 1
+                        st.rerun()
 
 
 # ----------------------- MAIN CHAT UI -----------------------
@@ -545,8 +401,22 @@ elif st.session_state.logged_in:
     # Welcome message with username
     st.success(f"Welcome, {st.session_state.username}! How can I assist you with your legal questions today?")
 
-    # Show messages
-    for msg in st.session_state.messages:
+    # Another tab or worker may have added to this chat. Appends from all of
+    # them are merged in the store, so pick up the merged history.
+    if st.session_state.current_chat_id and chat_changed(
+        st.session_state.user_email, st.session_state.current_chat_id, st.session_state.chat_version
+    ):
+        st.session_state.messages, st.session_state.chat_version = load_chat_messages(
+            st.session_state.user_email, st.session_state.current_chat_id
+        )
+
+    # Show only the latest messages; earlier ones are revealed a page at a time
+    hidden = len(st.session_state.messages) - st.session_state.messages_shown
+    if hidden > 0:
+        if st.button(f"⬆️ Load earlier messages ({hidden} more)", key="load_earlier"):
+            st.session_state.messages_shown += MESSAGES_PER_PAGE
+            st.rerun()
+    for msg in st.session_state.messages[-st.session_state.messages_shown:]:
         if msg["role"] == "user":
             st.markdown(f"<div class='chat-bubble-user'><b>You:</b> {msg['content']}</div>",
                         unsafe_allow_html=True)
@@ -558,32 +428,31 @@ elif st.session_state.logged_in:
     user_input = st.chat_input("Ask your legal question…")
 
     if user_input:
-        # Create new chat if this is the first message
-        if not st.session_state.chat_started:
-            st.session_state.current_chat_id = generate_chat_title(user_input)
-            st.session_state.chat_started = True
+        # The first message starts a new chat: titled from it, under a unique id
+        new_chat = not st.session_state.chat_started
 
         st.session_state.messages.append({"role": "user", "content": user_input})
-
-        emergency_words = ["danger", "threat", "harass", "violence", "kidnap"]
-
-        if any(word in user_input.lower() for word in emergency_words):
-            bot_reply = emergency_mode(user_input)
-        else:
-            if check_internet():
-                bot_reply = chat_bot(user_input, st.session_state.chat_session)
-            else:
-                bot_reply = offline_response(user_input)
+        st.markdown(f"<div class='chat-bubble-user'><b>You:</b> {user_input}</div>",
+                    unsafe_allow_html=True)
+
+        turn = assistant.start(
+            st.session_state.user_email,
+            user_input,
+            None if new_chat else st.session_state.current_chat_id,
+            st.session_state.chat_session,
+            history=st.session_state.messages[:-1],
+        )
+        if new_chat:
+            st.session_state.current_chat_id = turn.chat_id
+            st.session_state.current_chat_title = turn.title
+            st.session_state.chat_started = True
+        bot_reply = render_stream(turn)
+        if turn.prompt_stats is not None:
+            st.session_state.last_prompt_stats = turn.prompt_stats
 
         st.session_state.messages.append({"role": "bot", "content": bot_reply})
 
-        # Save chat after each message
-        if st.session_state.current_chat_id:
-            st.session_state.saved_chats[st.session_state.current_chat_id] = {
-                "title": st.session_state.current_chat_id,
-                "messages": st.session_state.messages,
-                "timestamp": datetime.now().isoformat()
-            }
-            save_user_chats(st.session_state.user_email, st.session_state.saved_chats)
+        # Save chat after each message (appends only this turn); logout waits on the ticket
+        st.session_state.save_ticket = assistant.save(turn)
 
         st.rerun()
@@ -0,0 +1,278 @@
+"""HTTP/JSON front end for the assistant, as a plain ASGI application.
+
+Run with any ASGI server, e.g.:
+
+    uvicorn api:app --workers 4
+
+Workers share nothing but the SQLite stores, so they can run side by side
+or behind a load balancer. Each worker caches chats and reloads one only
+when its version moves; PAKLAW_SHARED_STATE=sqlite (the default) keeps the
+versions in the chat database, where every worker sees them.
+PAKLAW_SHARED_STATE=local keeps them in process memory and is only correct
+with a single worker. PAKLAW_FAKE_MODEL=1 swaps Gemini for the local fake
+model for load tests. Every request except /healthz and /metrics must
+send "Authorization: Bearer <PAKLAW_API_TOKEN>"; the app refuses to start
+without a token unless PAKLAW_API_INSECURE=1 (local development only).
+A request without a chat_id starts a new chat with a fresh, unique id.
+
+    POST /v1/ask                 {"user_id", "question", "chat_id"?, "session"?}
+                                 answers once the turn is committed (503 if
+                                 it cannot be stored or takes too long)
+    POST /v1/stream              same body; server-sent events, one per chunk,
+                                 then a "done" event with the final reply once
+                                 it is committed (or an "error" event)
+    GET  /v1/chats?user_id=&page=
+    GET  /v1/chats/<chat_id>?user_id=
+    GET  /v1/search?user_id=&q=
+    GET  /healthz
+    GET  /metrics                Prometheus text format (records only with
+                                 PAKLAW_METRICS=1; no token needed)
+"""
+import asyncio
+import hmac
+import json
+import os
+from urllib.parse import parse_qs, unquote
+
+from assistant import Assistant, TurnNotStored
+from metrics import CONTENT_TYPE, METRICS
+
+
+MAX_BODY_BYTES = 64 * 1024
+MAX_QUESTION_CHARS = 4000
+
+_END = object()
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+# ----------------------- RESPONSES -----------------------
+
+async def send_json(send, status, payload):
+    body = json.dumps(payload, ensure_ascii=False).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json; charset=utf-8"),
+            (b"content-length", str(len(body)).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def send_metrics(send):
+    body = METRICS.render().encode()
+    await send({
+        "type": "http.response.start",
+        "status": 200,
+        "headers": [
+            (b"content-type", CONTENT_TYPE.encode()),
+            (b"content-length", str(len(body)).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+def sse_event(payload, event=None):
+    data = json.dumps(payload, ensure_ascii=False)
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {data}\n\n".encode()
+
+
+# ----------------------- REQUESTS -----------------------
+
+async def read_json(receive):
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if len(body) > MAX_BODY_BYTES:
+            raise HTTPError(413, "request body too large")
+        if not message.get("more_body"):
+            break
+    try:
+        data = json.loads(body or b"{}")
+    except ValueError:
+        raise HTTPError(400, "body must be JSON")
+    if not isinstance(data, dict):
+        raise HTTPError(400, "body must be a JSON object")
+    return data
+
+
+def required(data, name):
+    value = data.get(name)
+    if not isinstance(value, str) or not value.strip():
+        raise HTTPError(400, f"'{name}' is required")
+    return encodable(value, name)
+
+
+def optional(data, name):
+    """A string field that may be left out (or null), but not empty or of another type"""
+    value = data.get(name)
+    if value is None:
+        return None
+    if not isinstance(value, str) or not value.strip():
+        raise HTTPError(400, f"'{name}' must be a non-empty string")
+    return encodable(value, name)
+
+
+def encodable(value, name):
+    # Lone surrogates survive JSON decoding but not storage
+    try:
+        value.encode("utf-8")
+    except UnicodeEncodeError:
+        raise HTTPError(400, f"'{name}' is not valid text")
+    return value
+
+
+def turn_args(data):
+    question = required(data, "question")
+    if len(question) > MAX_QUESTION_CHARS:
+        raise HTTPError(400, f"'question' is longer than {MAX_QUESTION_CHARS} characters")
+    session = data.get("session")
+    if session is not None and not isinstance(session, dict):
+        raise HTTPError(400, "'session' must be an object")
+    if session is not None:
+        encodable(json.dumps(session, ensure_ascii=False), "session")
+    return required(data, "user_id"), question, optional(data, "chat_id"), session
+
+
+def check_token(scope, token):
+    for name, value in scope.get("headers", []):
+        if name == b"authorization":
+            return hmac.compare_digest(value.decode("latin-1"), f"Bearer {token}")
+    return False
+
+
+# ----------------------- APPLICATION -----------------------
+
+class AssistantAPI:
+    """ASGI app exposing Assistant; blocking work runs on the default thread pool"""
+
+    def __init__(self, assistant=None, token=None):
+        self.assistant = assistant or Assistant()
+        self.token = token
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            return await self._lifespan(receive, send)
+        if scope["type"] != "http":
+            return
+        try:
+            await self._route(scope, receive, send)
+        except HTTPError as exc:
+            await send_json(send, exc.status, {"error": exc.message})
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _route(self, scope, receive, send):
+        method, path = scope["method"], scope["path"].rstrip("/") or "/"
+        query_string = scope.get("query_string", b"").decode()
+        query = {key: values[-1] for key, values in parse_qs(query_string).items()}
+
+        if path == "/healthz":
+            return await send_json(send, 200, {"ok": True})
+        if path == "/metrics":
+            return await send_metrics(send)
+        if self.token and not check_token(scope, self.token):
+            raise HTTPError(401, "missing or invalid bearer token")
+
+        if path == "/v1/ask":
+            self._allow(method, "POST")
+            return await self._ask(receive, send)
+        if path == "/v1/stream":
+            self._allow(method, "POST")
+            return await self._stream(receive, send)
+        if path == "/v1/chats":
+            self._allow(method, "GET")
+            page = query.get("page", "0")
+            if not page.isdigit():
+                raise HTTPError(400, "'page' must be a non-negative integer")
+            result = await asyncio.to_thread(
+                self.assistant.list_chats, required(query, "user_id"), int(page)
+            )
+            return await send_json(send, 200, result)
+        if path.startswith("/v1/chats/"):
+            self._allow(method, "GET")
+            chat_id = unquote(path[len("/v1/chats/"):])
+            messages = await asyncio.to_thread(
+                self.assistant.load_chat, required(query, "user_id"), chat_id
+            )
+            if not messages:
+                raise HTTPError(404, "no such chat")
+            return await send_json(send, 200, {"chat_id": chat_id, "messages": messages})
+        if path == "/v1/search":
+            self._allow(method, "GET")
+            results = await asyncio.to_thread(
+                self.assistant.search, required(query, "user_id"), required(query, "q")
+            )
+            return await send_json(send, 200, {"results": results})
+        raise HTTPError(404, "not found")
+
+    @staticmethod
+    def _allow(method, expected):
+        if method != expected:
+            raise HTTPError(405, f"use {expected}")
+
+    async def _ask(self, receive, send):
+        args = turn_args(await read_json(receive))
+        try:
+            turn = await asyncio.to_thread(self.assistant.ask, *args)
+        except TurnNotStored:
+            raise HTTPError(503, "the answer could not be stored")
+        await send_json(send, 200, turn.as_dict())
+
+    async def _stream(self, receive, send):
+        args = turn_args(await read_json(receive))
+        turn = await asyncio.to_thread(self.assistant.start, *args)
+        chunks = iter(turn)
+
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", b"text/event-stream; charset=utf-8"),
+                (b"cache-control", b"no-cache"),
+            ],
+        })
+        # The model stream blocks, so pull each chunk on a worker thread
+        while True:
+            chunk = await asyncio.to_thread(next, chunks, _END)
+            if chunk is _END:
+                break
+            await send({"type": "http.response.body", "body": sse_event({"chunk": chunk}),
+                        "more_body": True})
+        ticket = await asyncio.to_thread(self.assistant.save, turn)
+        # "done" promises the turn is stored, so it waits for the commit
+        if not await asyncio.to_thread(self.assistant.wait_saved, ticket):
+            await send({"type": "http.response.body",
+                        "body": sse_event({"error": "the answer could not be stored"}, "error")})
+            return
+        await send({"type": "http.response.body", "body": sse_event(turn.as_dict(), "done")})
+
+
+def token_from_env():
+    """PAKLAW_API_TOKEN, or None if PAKLAW_API_INSECURE=1 explicitly allows no auth"""
+    token = os.getenv("PAKLAW_API_TOKEN") or None
+    if token is None and os.getenv("PAKLAW_API_INSECURE") != "1":
+        raise RuntimeError(
+            "PAKLAW_API_TOKEN is not set. Set it, or set PAKLAW_API_INSECURE=1 "
+            "to serve without authentication (local development only)."
+        )
+    return token
+
+
+app = AssistantAPI(token=token_from_env())
@@ -0,0 +1,303 @@
+"""The assistant without a UI: routing, model calls and persistence for one turn.
+
+Both the Streamlit app and the HTTP API (api.py) drive it. Nothing is kept
+between calls except in the shared services, so any worker process can serve
+any user's request.
+"""
+import logging
+import secrets
+
+from metrics import OFFLINE_FALLBACKS, TURNS, span
+from prompts import EMERGENCY_OFFLINE_REPLY, EMERGENCY_SYSTEM_PROMPT
+from response_cache import context_key, normalize_query
+from scheduler import DeadlineExceeded, PRIORITY_EMERGENCY, PRIORITY_NORMAL
+from services import (
+    get_chat_cache,
+    get_chat_store,
+    get_connectivity_monitor,
+    get_context_builder,
+    get_emergency_classifier,
+    get_ingestion_pipeline,
+    get_response_cache,
+    get_scheduler,
+    get_section_classifier,
+    get_shared_state,
+)
+
+
+OFFLINE_MISS_REPLY = "Sorry, this topic is not available offline."
+
+# How a turn was answered
+ROUTE_EMERGENCY = "emergency"
+ROUTE_CACHE = "cache"
+ROUTE_ONLINE = "online"
+ROUTE_OFFLINE = "offline"
+
+DEFAULT_PAGE_SIZE = 20
+# How long ask() waits for its turn to be committed to the chat store
+DEFAULT_SAVE_TIMEOUT = 10.0
+
+logger = logging.getLogger("paklaw.assistant")
+
+
+# ----------------------- OFFLINE RESPONSE -----------------------
+
+def offline_response(user_input):
+    """The best entry's Details, cut down to the sections the question asks for"""
+    hit = get_ingestion_pipeline().best(user_input)
+    if hit is not None:
+        return hit.section(get_section_classifier()(user_input)) or hit.details
+    else:
+        return OFFLINE_MISS_REPLY
+
+
+# ----------------------- INTERNET CHECK -----------------------
+
+def check_internet():
+    return get_connectivity_monitor().is_online()
+
+
+# ----------------------- ONLINE BOT -----------------------
+
+def build_chat_prompt(user_input, chat_session, history=()):
+    """System instruction plus token-budgeted summary, recent turns and the question"""
+    return get_context_builder().build(history, user_input, chat_session)
+
+
+def chat_bot(user_input, chat_session, history=(), prompt=None):
+    """Stream the online answer as text chunks"""
+    prompt = prompt or build_chat_prompt(user_input, chat_session, history)
+    return get_scheduler().stream(
+        prompt.contents, label="chat", priority=PRIORITY_NORMAL, system=prompt.system
+    )
+
+
+def cache_lookup_key(user_input, prompt):
+    """(normalised question, context hash) for a normal, non-emergency chat turn.
+
+    The context is the whole prompt except the question's own text. With no
+    recent turns the session details and summary are folded into the final
+    user turn, so that turn is hashed too, minus the question.
+    """
+    question = prompt.contents[-1]["parts"][-1]
+    if user_input and question.endswith(user_input):
+        question = question[:-len(user_input)]
+    return (
+        normalize_query(user_input),
+        context_key(prompt.system, prompt.contents[:-1], question),
+    )
+
+
+# ----------------------- EMERGENCY MODE -----------------------
+
+def emergency_mode(user_input):
+    """Stream the emergency answer as text chunks"""
+    return get_scheduler().stream(
+        user_input, label="emergency", priority=PRIORITY_EMERGENCY, system=EMERGENCY_SYSTEM_PROMPT
+    )
+
+
+# ----------------------- CHAT TITLES -----------------------
+
+def generate_chat_title(first_message):
+    """Generate a meaningful chat title from the first message"""
+    words = first_message.split()[:5]  # Take first 5 words
+    title = " ".join(words)
+    if len(title) > 30:
+        title = title[:30] + "..."
+    return title if title else "New Chat"
+
+
+def new_chat_id(title):
+    """Unique id for a new chat: its title plus a random suffix"""
+    return f"{title} #{secrets.token_hex(4)}"
+
+
+# ----------------------- TURN -----------------------
+
+class TurnNotStored(Exception):
+    """The turn was answered, but the chat store did not commit it"""
+
+
+class Turn:
+    """One question and its answer.
+
+    Iterating streams the reply as it is produced. Cached and offline answers
+    arrive as a single chunk. If the model fails part-way, the fallback answer
+    replaces what was streamed, so `reply` (set once iteration ends) is the
+    text to show and store, and `route` says how it was answered.
+    """
+
+    def __init__(self, question, history=(), chat_session=None, user_id=None, chat_id=None,
+                 title=None):
+        self.question = question
+        self.history = list(history)
+        self.chat_session = chat_session or {}
+        self.user_id = user_id
+        self.chat_id = chat_id
+        self.title = title or chat_id
+        self.route = None
+        self.reply = None
+        self.prompt_stats = None
+
+    def __iter__(self):
+        return self._run()
+
+    def _run(self):
+        question = self.question
+        streamed = False
+
+        with span("routing"):
+            emergency = get_emergency_classifier()(question)
+        if emergency:
+            self.route = ROUTE_EMERGENCY
+            parts = []
+            try:
+                with span("model", label="emergency"):
+                    for chunk in emergency_mode(question):
+                        parts.append(chunk)
+                        streamed = True
+                        yield chunk
+                reply = "".join(parts)
+            except Exception:
+                OFFLINE_FALLBACKS.inc(reason="emergency_error")
+                reply = EMERGENCY_OFFLINE_REPLY
+        else:
+            # Emergency turns above are never cached; normal ones check the cache first
+            with span("prompt"):
+                prompt = build_chat_prompt(question, self.chat_session, self.history)
+            self.prompt_stats = prompt.stats.as_dict()
+            with span("cache"):
+                cache_query, cache_context = cache_lookup_key(question, prompt)
+                reply = get_response_cache().get(cache_query, cache_context)
+            if reply is not None:
+                self.route = ROUTE_CACHE
+            online = False
+            if reply is None:
+                with span("connectivity"):
+                    online = check_internet()
+            fallback_reason = "offline"
+            if reply is None and online:
+                parts = []
+                try:
+                    with span("model", label="chat"):
+                        for chunk in chat_bot(question, self.chat_session, prompt=prompt):
+                            parts.append(chunk)
+                            streamed = True
+                            yield chunk
+                    reply = "".join(parts)
+                    self.route = ROUTE_ONLINE
+                except DeadlineExceeded:
+                    # Busy or rate limited, not necessarily offline
+                    fallback_reason = "deadline"
+                except Exception:
+                    fallback_reason = "model_error"
+                    get_connectivity_monitor().mark_unhealthy()
+                if reply is not None:
+                    try:
+                        get_response_cache().put(cache_query, cache_context, reply)
+                    except Exception:
+                        # The answer stands; only the cache missed out on it
+                        logger.exception("response cache write failed")
+            if reply is None:
+                self.route = ROUTE_OFFLINE
+                OFFLINE_FALLBACKS.inc(reason=fallback_reason)
+                with span("retrieval"):
+                    reply = offline_response(question)
+
+        TURNS.inc(route=self.route)
+        self.reply = reply
+        if not streamed:
+            yield reply
+
+    def messages(self):
+        return [
+            {"role": "user", "content": self.question},
+            {"role": "bot", "content": self.reply},
+        ]
+
+    def as_dict(self):
+        return {"chat_id": self.chat_id, "route": self.route, "reply": self.reply}
+
+
+# ----------------------- ASSISTANT -----------------------
+
+class Assistant:
+    """Stateless request handler keyed by user id (the account email).
+
+    A chat's history is read from the shared chat store unless the caller
+    already has it, and each finished turn is appended there, so requests
+    for one user can land on any worker. Reads go through the worker's chat
+    cache, which reloads a chat only after its shared version has moved.
+    """
+
+    def start(self, user_id, question, chat_id=None, chat_session=None, history=None):
+        """Begin a turn; iterate it for the reply, then pass it to save().
+
+        Without a chat_id this starts a new chat, titled from the question
+        under an id of its own, so it never appends to an existing chat.
+        """
+        title = None
+        if chat_id is None:
+            title = generate_chat_title(question)
+            chat_id = new_chat_id(title)
+            history = history or []
+        if history is None:
+            history, _ = get_chat_cache().load(user_id, chat_id)
+        return Turn(question, history, chat_session, user_id=user_id, chat_id=chat_id,
+                    title=title)
+
+    def save(self, turn):
+        """Queue the finished turn's append to its chat and return its ticket.
+
+        The write commits in the background; pass the ticket to wait_saved()
+        before telling anyone the turn is stored.
+        """
+        with span("persistence"):
+            return get_chat_store().append_messages(
+                turn.user_id, turn.chat_id, turn.messages(), title=turn.title
+            )
+
+    def wait_saved(self, ticket, timeout=DEFAULT_SAVE_TIMEOUT):
+        """Block until the save that returned `ticket` has committed.
+
+        False on timeout, or if the store dropped that write. Tickets are
+        acknowledged in order, so every earlier save has been dealt with too.
+        """
+        with span("persistence"):
+            return get_chat_store().wait(ticket, timeout)
+
+    def ask(self, user_id, question, chat_id=None, chat_session=None,
+            save_timeout=DEFAULT_SAVE_TIMEOUT):
+        """Answer one question end to end and return the Turn once it is stored.
+
+        Raises TurnNotStored if the chat store dropped the turn or has not
+        committed it within `save_timeout` seconds.
+        """
+        turn = self.start(user_id, question, chat_id, chat_session)
+        for _ in turn:
+            pass
+        if not self.wait_saved(self.save(turn), save_timeout):
+            raise TurnNotStored("chat turn not stored")
+        return turn
+
+    def list_chats(self, user_id, page=0, page_size=DEFAULT_PAGE_SIZE):
+        store = get_chat_store()
+        return {
+            "chats": store.list_chats(user_id, limit=page_size, offset=page * page_size),
+            "total": store.count_chats(user_id),
+        }
+
+    def load_chat(self, user_id, chat_id):
+        return get_chat_cache().load(user_id, chat_id)[0]
+
+    def open_chat(self, user_id, chat_id):
+        """(messages, version) of one chat; see chat_version"""
+        return get_chat_cache().load(user_id, chat_id)
+
+    def chat_version(self, user_id, chat_id):
+        """Shared version of a chat; it moves whenever any worker commits a change to it"""
+        return get_shared_state().version(user_id, chat_id)
+
+    def search(self, user_id, query, limit=DEFAULT_PAGE_SIZE):
+        return get_chat_store().search(user_id, query, limit=limit)
@@ -0,0 +1,322 @@
+"""End-to-end load test of the chat path: concurrent users asking questions built from the CSV topics.
+
+Run from the repo root:  python benchmarks/bench_chat_path.py [options]
+
+    --users 8 --turns 5          concurrent users and questions per user
+    --model-latency 0.3          fake Gemini: seconds to the first chunk
+    --chunk-delay 0.02           fake Gemini: seconds between chunks
+    --connectivity online        pin the connectivity check (online / offline)
+    --rate / --concurrency       scheduler limits (default: the app's settings)
+    --emergency 0.05             share of questions that trip emergency mode
+    --json results.json          write the results
+    --compare baseline.json      print the change against an earlier run
+
+Runs in-process against the real Assistant, stores and offline index, with
+the model replaced by FakeModelClient (PAKLAW_FAKE_MODEL) and connectivity
+pinned (PAKLAW_CONNECTIVITY). All databases go to a temp dir. Reports
+p50/p95/p99 per stage and end to end, throughput, the route each turn took,
+and peak RSS. "model" includes time queued in the scheduler, so with the
+app's default rate limit it measures the limit, not the fake model. Needs
+the NLTK data (`python preprocess.py`).
+"""
+import argparse
+import csv
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+TEMPLATES = [
+    "{topic}",
+    "How do I deal with {topic}?",
+    "What documents are needed for {topic}?",
+    "{topic} ka tareeqa kya hai",
+    "What are the fees and time for {topic}?",
+]
+EMERGENCY_QUESTIONS = [
+    "Someone is threatening to kill me",
+    "I am being harassed and stalked by my neighbour",
+    "mujhe dhamki mil rahi hai, bachao",
+]
+STAGES = ["routing", "prompt", "cache", "model", "retrieval", "persistence", "end_to_end"]
+
+
+# ----------------------- STAGE TIMING -----------------------
+
+_turn = threading.local()
+
+
+def _record(stage, seconds):
+    stages = getattr(_turn, "stages", None)
+    if stages is not None:
+        stages[stage] += seconds
+
+
+def timed(stage, func):
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _record(stage, time.perf_counter() - start)
+    return wrapper
+
+
+def timed_stream(stage, func):
+    """Time a chunk stream from the call until it is exhausted"""
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+
+        def chunks():
+            try:
+                yield from func(*args, **kwargs)
+            finally:
+                _record(stage, time.perf_counter() - start)
+        return chunks()
+    return wrapper
+
+
+class TimedProxy:
+    """Times every call made through it (the object itself, or its methods)"""
+
+    def __init__(self, target, stage):
+        self._target = target
+        self._stage = stage
+
+    def __call__(self, *args, **kwargs):
+        return timed(self._stage, self._target)(*args, **kwargs)
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        return timed(self._stage, attr) if callable(attr) else attr
+
+
+def instrument(assistant_module, assistant):
+    """Wrap each stage of the turn pipeline with a timer"""
+    import services
+
+    classifier = TimedProxy(services.get_emergency_classifier(), "routing")
+    cache = TimedProxy(services.get_response_cache(), "cache")
+    assistant_module.get_emergency_classifier = lambda: classifier
+    assistant_module.get_response_cache = lambda: cache
+    assistant_module.build_chat_prompt = timed("prompt", assistant_module.build_chat_prompt)
+    assistant_module.cache_lookup_key = timed("cache", assistant_module.cache_lookup_key)
+    assistant_module.offline_response = timed("retrieval", assistant_module.offline_response)
+    assistant_module.chat_bot = timed_stream("model", assistant_module.chat_bot)
+    assistant_module.emergency_mode = timed_stream("model", assistant_module.emergency_mode)
+    # Queueing the write plus waiting for its commit: the turn is durable after both
+    assistant.save = timed("persistence", assistant.save)
+    assistant.wait_saved = timed("persistence", assistant.wait_saved)
+
+
+# ----------------------- WORKLOAD -----------------------
+
+def load_topics():
+    with open(os.path.join(ROOT, "AI_legal_assistance.csv"), encoding="utf-8", newline="") as f:
+        return [row["Topic"] for row in csv.DictReader(f)]
+
+
+def make_questions(topics, n, emergency_share, rng):
+    questions = []
+    for _ in range(n):
+        if rng.random() < emergency_share:
+            questions.append(rng.choice(EMERGENCY_QUESTIONS))
+        else:
+            questions.append(rng.choice(TEMPLATES).format(topic=rng.choice(topics)))
+    return questions
+
+
+def max_rss_mb():
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def percentiles(samples):
+    if not samples:
+        return None
+    samples = sorted(samples)
+
+    def at(q):
+        return samples[min(len(samples) - 1, int(q * len(samples)))] * 1000
+
+    return {
+        "n": len(samples),
+        "p50": at(0.50),
+        "p95": at(0.95),
+        "p99": at(0.99),
+        "mean": sum(samples) / len(samples) * 1000,
+        "max": samples[-1] * 1000,
+    }
+
+
+# ----------------------- RUN -----------------------
+
+def run(args):
+    os.environ["PAKLAW_FAKE_MODEL"] = "1"
+    os.environ["PAKLAW_FAKE_MODEL_DELAY"] = str(args.model_latency)
+    os.environ["PAKLAW_FAKE_MODEL_CHUNK_DELAY"] = str(args.chunk_delay)
+    os.environ["PAKLAW_CONNECTIVITY"] = args.connectivity
+
+    import services
+    services.KNOWLEDGE_SOURCES = [os.path.join(ROOT, "AI_legal_assistance.csv")]
+    services.KNOWLEDGE_WATCH_INTERVAL = 3600
+    if args.rate is not None:
+        services.SCHEDULER_RATE = args.rate
+        services.SCHEDULER_BURST = max(services.SCHEDULER_BURST, int(args.rate))
+    if args.concurrency is not None:
+        services.SCHEDULER_CONCURRENCY = args.concurrency
+
+    import assistant as assistant_module
+
+    rss_start = max_rss_mb()
+    assistant = assistant_module.Assistant()
+    start = time.perf_counter()
+    assistant.ask("warmup@example.com", "FIR")  # build the index, preprocessor and stores
+    warmup = time.perf_counter() - start
+    rss_warm = max_rss_mb()
+
+    instrument(assistant_module, assistant)
+    rng = random.Random(args.seed)
+    topics = load_topics()
+    workloads = [
+        make_questions(topics, args.turns, args.emergency, random.Random(rng.random()))
+        for _ in range(args.users)
+    ]
+
+    samples = defaultdict(list)
+    routes = Counter()
+    errors = []
+    lock = threading.Lock()
+    barrier = threading.Barrier(args.users)
+
+    def user(number, questions):
+        user_id = f"user{number}@example.com"
+        chat_id = None
+        barrier.wait()
+        for question in questions:
+            _turn.stages = defaultdict(float)
+            start = time.perf_counter()
+            try:
+                turn = assistant.ask(user_id, question, chat_id)
+            except Exception as exc:
+                with lock:
+                    errors.append(repr(exc))
+                continue
+            elapsed = time.perf_counter() - start
+            chat_id = turn.chat_id
+            with lock:
+                routes[turn.route] += 1
+                samples["end_to_end"].append(elapsed)
+                for stage, seconds in _turn.stages.items():
+                    samples[stage].append(seconds)
+            if args.think_time:
+                time.sleep(rng.uniform(0, args.think_time))
+
+    threads = [
+        threading.Thread(target=user, args=(number, questions))
+        for number, questions in enumerate(workloads)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+
+    turns = len(samples["end_to_end"])
+    return {
+        "config": {key: value for key, value in vars(args).items() if key not in ("json", "compare")},
+        "turns": turns,
+        "errors": len(errors),
+        "error_samples": errors[:5],
+        "wall_s": wall,
+        "throughput_turns_per_s": turns / wall if wall else 0.0,
+        "warmup_s": warmup,
+        "routes": dict(routes),
+        "latency_ms": {stage: percentiles(samples[stage]) for stage in STAGES if samples[stage]},
+        "scheduler": dict(services.get_scheduler().stats),
+        "memory_mb": {"max_rss_start": rss_start, "max_rss_after_warmup": rss_warm,
+                      "max_rss_end": max_rss_mb()},
+    }
+
+
+# ----------------------- REPORT -----------------------
+
+def report(results):
+    print(f"{results['turns']} turns in {results['wall_s']:.2f}s  "
+          f"({results['throughput_turns_per_s']:.1f} turns/s, {results['errors']} errors, "
+          f"warm-up {results['warmup_s']:.2f}s)")
+    print("routes: " + ", ".join(f"{route} {n}" for route, n in sorted(results["routes"].items())))
+    print(f"{'stage':<12} {'n':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for stage, stats in results["latency_ms"].items():
+        print(f"{stage:<12} {stats['n']:>5} {stats['p50']:>9.2f} {stats['p95']:>9.2f} "
+              f"{stats['p99']:>9.2f} {stats['max']:>9.2f}")
+    memory = results["memory_mb"]
+    if memory["max_rss_end"] is not None:
+        print(f"peak RSS {memory['max_rss_end']:.0f} MB "
+              f"(after imports {memory['max_rss_start']:.0f} MB, "
+              f"after warm-up {memory['max_rss_after_warmup']:.0f} MB)")
+
+
+def compare(results, baseline):
+    print("\nchange against baseline (negative is faster):")
+    old_tp, new_tp = baseline["throughput_turns_per_s"], results["throughput_turns_per_s"]
+    if old_tp:
+        print(f"throughput   {(new_tp - old_tp) / old_tp * 100:+.1f}%")
+    for stage, stats in results["latency_ms"].items():
+        old = baseline.get("latency_ms", {}).get(stage)
+        if not old:
+            continue
+        deltas = [
+            f"{q} {(stats[q] - old[q]) / old[q] * 100:+.1f}%" if old[q] else f"{q} n/a"
+            for q in ("p50", "p95", "p99")
+        ]
+        print(f"{stage:<12} " + "  ".join(deltas))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=8)
+    parser.add_argument("--turns", type=int, default=5)
+    parser.add_argument("--model-latency", type=float, default=0.3)
+    parser.add_argument("--chunk-delay", type=float, default=0.02)
+    parser.add_argument("--connectivity", choices=["online", "offline"], default="online")
+    parser.add_argument("--rate", type=float, default=None)
+    parser.add_argument("--concurrency", type=int, default=None)
+    parser.add_argument("--emergency", type=float, default=0.05)
+    parser.add_argument("--think-time", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json")
+    parser.add_argument("--compare")
+    args = parser.parse_args()
+
+    json_path = args.json and os.path.abspath(args.json)
+    compare_path = args.compare and os.path.abspath(args.compare)
+    with tempfile.TemporaryDirectory(prefix="paklaw-load-", ignore_cleanup_errors=True) as workdir:
+        os.chdir(workdir)
+        results = run(args)
+        os.chdir(ROOT)
+    report(results)
+    if compare_path:
+        with open(compare_path, encoding="utf-8") as f:
+            compare(results, json.load(f))
+    if json_path:
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Chat search latency: FTS5 index in SQLiteChatStore versus scanning every message.
+
+Run from the repo root:  python benchmarks/bench_chat_search.py [messages_per_user ...]
+Defaults to 1,000 and 10,000 messages for the searched user, with 20 other
+users of the same size in the same database. Everything is written to a temp dir.
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chat_store import SQLiteChatStore  # noqa: E402
+
+WORDS = (
+    "fir police station sho complaint cnic nadra passport renewal fee challan traffic "
+    "property mutation stay order tenant landlord rent eviction consumer court khula "
+    "talaq nikahnama cybercrime fia evidence screenshot harassment appeal district "
+    "documents procedure office portal helpline lahore karachi islamabad peshawar"
+).split()
+QUERIES = ["khula", "passport renewal", "lost cnic", "tenant eviction", "fia evidence", "chall"]
+# Everyday words follow a Zipf curve over a large vocabulary, and each message
+# mentions a couple of legal terms, so query terms are about as selective as
+# they are in real chats.
+FILLER = [f"w{rank}" for rank in range(5_000)]
+FILLER_WEIGHTS = [1 / (rank + 1) for rank in range(5_000)]
+LEGAL_TERMS_PER_MESSAGE = 2
+OTHER_USERS = 20
+MESSAGES_PER_CHAT = 20
+
+
+def message_text(rng):
+    words = rng.choices(FILLER, FILLER_WEIGHTS, k=rng.randint(8, 40))
+    words += rng.sample(WORDS, LEGAL_TERMS_PER_MESSAGE)
+    rng.shuffle(words)
+    return " ".join(words)
+
+
+def fill(store, email, n_messages, rng):
+    for chat in range(n_messages // MESSAGES_PER_CHAT):
+        store.append_messages(email, f"chat{chat}", [
+            {"role": "user" if i % 2 == 0 else "bot",
+             "content": message_text(rng)}
+            for i in range(MESSAGES_PER_CHAT)
+        ], title=f"Chat {chat}")
+
+
+def scan_search(store, email, query):
+    """What the sidebar would have to do without an index"""
+    words = query.lower().split()
+    found = []
+    for chat_id, chat in store.load_chats(email).items():
+        if any(all(w in m["content"].lower() for w in words) for m in chat["messages"]):
+            found.append(chat_id)
+    return found
+
+
+def timed(func, repeat=20):
+    samples = []
+    for i in range(repeat):
+        query = QUERIES[i % len(QUERIES)]
+        start = time.perf_counter()
+        func(query)
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return samples[len(samples) // 2] * 1000, samples[int(len(samples) * 0.95)] * 1000
+
+
+def run(n_messages, workdir):
+    rng = random.Random(n_messages)
+    store = SQLiteChatStore(os.path.join(workdir, f"chats_{n_messages}.db"))
+    for user in range(OTHER_USERS):
+        fill(store, f"other{user}@example.com", n_messages, rng)
+    fill(store, "me@example.com", n_messages, rng)
+
+    indexed = timed(lambda q: store.search("me@example.com", q))
+    scanned = timed(lambda q: scan_search(store, "me@example.com", q), repeat=6)
+    print(f"{n_messages:>8,} msgs/user  fts p50 {indexed[0]:6.2f} ms p95 {indexed[1]:6.2f} ms  "
+          f"scan p50 {scanned[0]:8.2f} ms p95 {scanned[1]:8.2f} ms")
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [1_000, 10_000]
+    with tempfile.TemporaryDirectory() as workdir:
+        for n_messages in sizes:
+            run(n_messages, workdir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Chat append latency: synchronous SQLite writes versus the write-behind queue.
+
+Several sessions (threads) each append one turn (two messages) at a time to
+their own chat, as Assistant.save does after every reply. Reports how long
+a caller is blocked per append, and how many appends per second reach disk,
+for SQLiteChatStore on its own and behind WriteBehindChatStore, both with
+synchronous=FULL.
+
+Run from the repo root:  python benchmarks/bench_chat_writes.py [--sessions 8] [--turns 200]
+Everything is written to a temp dir.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chat_store import SQLiteChatStore  # noqa: E402
+from db import ConnectionPool  # noqa: E402
+from write_behind import WriteBehindChatStore  # noqa: E402
+
+
+def percentile(samples, q):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+def run(store, sessions, turns):
+    latencies = []
+    lock = threading.Lock()
+
+    def session(n):
+        mine = []
+        for turn in range(turns):
+            messages = [
+                {"role": "user", "content": f"question {turn} from session {n}"},
+                {"role": "bot", "content": f"answer {turn} " + "lorem ipsum " * 40},
+            ]
+            start = time.perf_counter()
+            store.append_messages(f"user{n}@example.com", "chat", messages, title="Chat")
+            mine.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(mine)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=session, args=(n,)) for n in range(sessions)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if isinstance(store, WriteBehindChatStore):
+        store.flush()
+    return latencies, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=8)
+    parser.add_argument("--turns", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{args.sessions} sessions x {args.turns} appends, synchronous=FULL")
+    print(f"{'store':<14} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'appends/s':>10} {'commits':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in ("sqlite", "write-behind"):
+            path = os.path.join(tmp, f"{name}.db")
+            store = SQLiteChatStore(path, pool=ConnectionPool(path, synchronous="FULL"))
+            commits = args.sessions * args.turns
+            if name == "write-behind":
+                store = WriteBehindChatStore(store)
+            latencies, seconds = run(store, args.sessions, args.turns)
+            if name == "write-behind":
+                commits = store.stats["batches"]
+                store.close()
+            print(f"{name:<14} {percentile(latencies, 0.5) * 1000:>8.3f} "
+                  f"{percentile(latencies, 0.95) * 1000:>8.3f} "
+                  f"{percentile(latencies, 0.99) * 1000:>8.3f} "
+                  f"{len(latencies) / seconds:>10.0f} {commits:>8}")
+
+
+if __name__ == "__main__":
+    main()
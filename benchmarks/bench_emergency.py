@@ -0,0 +1,78 @@
+"""Precision/recall and per-message latency of emergency routing.
+
+Compares the original substring check from 2.py with EmergencyClassifier on
+two labelled sets (English, Roman Urdu and Urdu):
+
+    tuning     benchmarks/data/emergency_labelled.csv, which the lexicon and
+               negations were written against, so its scores are optimistic
+    held-out   benchmarks/data/emergency_heldout.csv, kept out of tuning;
+               quote these. Do not change the lexicon to fit it: add cases
+               to the tuning set instead.
+
+Run from the repo root:  python benchmarks/bench_emergency.py [-v]
+"""
+import csv
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from emergency import EmergencyClassifier  # noqa: E402
+
+DATA = os.path.join(ROOT, "benchmarks", "data")
+SETS = [("tuning", "emergency_labelled.csv"), ("held-out", "emergency_heldout.csv")]
+EMERGENCY_WORDS = ["danger", "threat", "harass", "violence", "kidnap"]
+
+
+def legacy(text):
+    return any(word in text.lower() for word in EMERGENCY_WORDS)
+
+
+def evaluate(name, classify, rows, verbose, repeat=200):
+    tp = fp = fn = tn = 0
+    for text, label in rows:
+        predicted = classify(text)
+        if predicted and label:
+            tp += 1
+        elif predicted:
+            fp += 1
+            if verbose:
+                print(f"  FP {name}: {text}")
+        elif label:
+            fn += 1
+            if verbose:
+                print(f"  FN {name}: {text}")
+        else:
+            tn += 1
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for text, _ in rows:
+            classify(text)
+    per_message = (time.perf_counter() - start) / (repeat * len(rows))
+
+    precision = tp / (tp + fp) if tp + fp else 0.0
+    recall = tp / (tp + fn) if tp + fn else 0.0
+    print(f"{name:<12} precision {precision:.2f}  recall {recall:.2f}  "
+          f"(tp={tp} fp={fp} fn={fn} tn={tn})  {per_message * 1e6:.1f} us/message")
+
+
+def load(name):
+    with open(os.path.join(DATA, name), "r", encoding="utf-8", newline="") as f:
+        return [(row["text"], row["label"] == "1") for row in csv.DictReader(f)]
+
+
+def main():
+    verbose = "-v" in sys.argv
+    classifier = EmergencyClassifier()
+    for title, name in SETS:
+        rows = load(name)
+        print(f"{title} ({name}, {len(rows)} messages)")
+        evaluate("substring", legacy, rows, verbose)
+        evaluate("classifier", classifier, rows, verbose)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Login lookup latency: the old pandas scan of users.csv versus the SQLite UserStore.
+
+Run from the repo root:  python benchmarks/bench_login.py [n_users ...]
+Defaults to 10,000 and 100,000 users. Everything is written to a temp dir.
+"""
+import hashlib
+import os
+import random
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from user_store import UserStore  # noqa: E402
+
+
+def hash_password(password):
+    return hashlib.sha256(password.encode()).hexdigest()
+
+
+def legacy_authenticate(csv_path, email, password):
+    """The original users.csv lookup from 2.py"""
+    df = pd.read_csv(csv_path)
+    password_hash = hash_password(password)
+    user = df[(df["email"] == email) & (df["password_hash"] == password_hash)]
+    if not user.empty:
+        return user.iloc[0]["username"]
+    return None
+
+
+def store_authenticate(store, email, password):
+    user = store.get(email)
+    if user and user["password_hash"] == hash_password(password):
+        return user["username"]
+    return None
+
+
+def timed(func, emails, repeat):
+    samples = []
+    for email in emails[:repeat]:
+        start = time.perf_counter()
+        assert func(email, "secret") is not None
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return samples[len(samples) // 2] * 1000, samples[int(len(samples) * 0.95)] * 1000
+
+
+def run(n_users, workdir, repeat=50):
+    emails = [f"user{i}@example.com" for i in range(n_users)]
+    csv_path = os.path.join(workdir, f"users_{n_users}.csv")
+    pd.DataFrame({
+        "username": [f"User {i}" for i in range(n_users)],
+        "email": emails,
+        "password_hash": [hash_password("secret")] * n_users,
+    }).to_csv(csv_path, index=False)
+
+    store = UserStore(os.path.join(workdir, f"users_{n_users}.db"))
+    start = time.perf_counter()
+    store.migrate_csv(csv_path)
+    migrate = time.perf_counter() - start
+
+    sample = random.sample(emails, repeat)
+    legacy = timed(lambda e, p: legacy_authenticate(csv_path, e, p), sample, repeat)
+    indexed = timed(lambda e, p: store_authenticate(store, e, p), sample, repeat)
+    print(f"{n_users:>8,} users  migrate {migrate:6.2f}s  "
+          f"csv p50 {legacy[0]:8.2f} ms p95 {legacy[1]:8.2f} ms  "
+          f"sqlite p50 {indexed[0]:6.3f} ms p95 {indexed[1]:6.3f} ms")
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10_000, 100_000]
+    with tempfile.TemporaryDirectory() as workdir:
+        for n_users in sizes:
+            run(n_users, workdir)
+
+
+if __name__ == "__main__":
+    main()
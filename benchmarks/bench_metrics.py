@@ -0,0 +1,57 @@
+"""Overhead of the metrics layer per instrumented call, disabled and enabled.
+
+Run from the repo root:  python benchmarks/bench_metrics.py [--calls 200000]
+
+Times a bare call against the same call inside span() plus one counter
+increment, with a disabled and an enabled registry. The disabled numbers are
+what every turn pays when PAKLAW_METRICS is unset.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import metrics  # noqa: E402
+
+
+def work():
+    return None
+
+
+def bare(n):
+    start = time.perf_counter()
+    for _ in range(n):
+        work()
+    return time.perf_counter() - start
+
+
+def instrumented(n, registry, counter):
+    start = time.perf_counter()
+    for _ in range(n):
+        with registry.span("bench"):
+            work()
+        counter.inc(route="bench")
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=200000)
+    args = parser.parse_args()
+    n = args.calls
+
+    baseline = min(bare(n) for _ in range(3))
+    print(f"{'':<10} {'ns/call':>9} {'overhead ns':>12}")
+    print(f"{'bare':<10} {baseline / n * 1e9:>9.0f} {'':>12}")
+    for enabled in (False, True):
+        # span() records into the module-level histograms, so flip the shared registry
+        metrics.METRICS.enabled = enabled
+        elapsed = min(instrumented(n, metrics.METRICS, metrics.TURNS) for _ in range(3))
+        name = "enabled" if enabled else "disabled"
+        print(f"{name:<10} {elapsed / n * 1e9:>9.0f} {(elapsed - baseline) / n * 1e9:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
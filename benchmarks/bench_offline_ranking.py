@@ -0,0 +1,113 @@
+"""Recall@k and query latency of the offline ranking modes.
+
+Scores each ranking against benchmarks/data/offline_queries.csv: short
+questions, typos and Roman Urdu phrasings labelled with the CSV Topic that
+answers them. Questions with no topic are out of scope and should not
+return an answer.
+
+Run from the repo root:  python benchmarks/bench_offline_ranking.py [-k 3] [-v]
+
+Each ranking runs with and without the character n-gram fallback
+(--fuzzy-threshold, default 0.3).
+
+    R@1, R@k       labelled topic is the best hit / in the top k, after the
+                   threshold (what offline_response would answer)
+    R@k any        same, with no threshold (ranking quality on its own)
+    no answer      in-scope questions with nothing above the threshold
+    OOS answered   out-of-scope questions that still got an answer
+    p50/p95 us     per-query search time
+
+Needs the NLTK data (`python preprocess.py`).
+"""
+import argparse
+import csv
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from ingest import iter_rows  # noqa: E402
+from preprocess import Preprocessor, ensure_nltk_data  # noqa: E402
+from retrieval import (  # noqa: E402
+    DEFAULT_THRESHOLD,
+    RANKING_BM25F,
+    RANKING_HYBRID,
+    RANKING_TFIDF,
+    RetrievalEngine,
+)
+from retrieval_index import build_index_from_rows  # noqa: E402
+
+LABELLED = os.path.join(ROOT, "benchmarks", "data", "offline_queries.csv")
+RANKINGS = [RANKING_TFIDF, RANKING_BM25F, RANKING_HYBRID]
+
+
+def load_queries():
+    with open(LABELLED, encoding="utf-8", newline="") as f:
+        return [(row["text"], row["topic"]) for row in csv.DictReader(f)]
+
+
+def percentile(samples, q):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+def evaluate(name, engine, queries, k, verbose, repeat=20):
+    in_scope = [(text, topic) for text, topic in queries if topic]
+    out_of_scope = [text for text, topic in queries if not topic]
+    at_1 = at_k = any_k = unanswered = 0
+    for text, topic in in_scope:
+        topics = [hit.topic for hit in engine.search(text, k=k)]
+        ranked = [hit.topic for hit in engine.search(text, k=k, threshold=0.0)]
+        expected = engine.preprocess(topic)
+        at_1 += bool(topics) and topics[0] == expected
+        at_k += expected in topics
+        any_k += expected in ranked
+        unanswered += not topics
+        if verbose and (not topics or topics[0] != expected):
+            print(f"  miss {name}: {text!r} -> {topics[:1] or 'no answer'} (want {expected!r})")
+    answered_oos = sum(bool(engine.search(text, k=1)) for text in out_of_scope)
+
+    latencies = []
+    for _ in range(repeat):
+        for text, _topic in queries:
+            start = time.perf_counter()
+            engine.search(text, k=k)
+            latencies.append(time.perf_counter() - start)
+
+    n = len(in_scope)
+    print(f"{name:<13} {at_1 / n:>6.1%} {at_k / n:>6.1%} {any_k / n:>8.1%} "
+          f"{unanswered:>9} {answered_oos:>6}/{len(out_of_scope):<5} "
+          f"{percentile(latencies, 0.5) * 1e6:>8.0f} {percentile(latencies, 0.95) * 1e6:>8.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-k", type=int, default=3)
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument("--fuzzy-threshold", type=float, default=0.3)
+    parser.add_argument("-v", "--verbose", action="store_true")
+    args = parser.parse_args()
+
+    ensure_nltk_data()
+    preprocess = Preprocessor()
+    rows = list(iter_rows([os.path.join(ROOT, "AI_legal_assistance.csv")]))
+    index = build_index_from_rows(
+        [row["Topic"] for row in rows], [row["Details"] for row in rows], preprocess
+    )
+    queries = load_queries()
+    print(f"{len(rows)} topics, {len(queries)} labelled questions, "
+          f"k={args.k}, threshold={args.threshold}")
+    print(f"{'ranking':<13} {'R@1':>6} {'R@' + str(args.k):>6} {'R@k any':>8} "
+          f"{'no answer':>9} {'OOS answered':>12} {'p50 us':>8} {'p95 us':>8}")
+    for ranking in RANKINGS:
+        for fuzzy_threshold in (None, args.fuzzy_threshold):
+            engine = RetrievalEngine(index, preprocess, threshold=args.threshold,
+                                     ranking=ranking, fuzzy_threshold=fuzzy_threshold)
+            name = ranking if fuzzy_threshold is None else ranking + "+fuzzy"
+            evaluate(name, engine, queries, args.k, args.verbose)
+
+
+if __name__ == "__main__":
+    main()
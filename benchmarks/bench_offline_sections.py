@@ -0,0 +1,82 @@
+"""Section routing of offline answers: accuracy and reply size.
+
+Uses the `section` column of benchmarks/data/offline_queries.csv (blank
+when the question should get the whole entry). Reports how often
+SectionClassifier picks exactly the labelled sections, the size of the
+offline reply with and without section cutting, and the cost of parsing
+the corpus and of cutting one answer.
+
+Run from the repo root:  python benchmarks/bench_offline_sections.py [-v]
+
+Needs the NLTK data (`python preprocess.py`).
+"""
+import argparse
+import csv
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from ingest import iter_rows  # noqa: E402
+from preprocess import Preprocessor, ensure_nltk_data  # noqa: E402
+from retrieval import RANKING_BM25F, RetrievalEngine  # noqa: E402
+from retrieval_index import build_index_from_rows  # noqa: E402
+from sections import SectionClassifier, section_spans_many  # noqa: E402
+
+LABELLED = os.path.join(ROOT, "benchmarks", "data", "offline_queries.csv")
+
+
+def load_queries():
+    with open(LABELLED, encoding="utf-8", newline="") as f:
+        return [(row["text"], row["section"].split()) for row in csv.DictReader(f) if row["topic"]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-v", "--verbose", action="store_true")
+    args = parser.parse_args()
+
+    ensure_nltk_data()
+    preprocess = Preprocessor()
+    rows = list(iter_rows([os.path.join(ROOT, "AI_legal_assistance.csv")]))
+    details = [row["Details"] for row in rows]
+
+    start = time.perf_counter()
+    for _ in range(100):
+        section_spans_many(details)
+    parse_ms = (time.perf_counter() - start) / 100 * 1000
+
+    index = build_index_from_rows([row["Topic"] for row in rows], details, preprocess)
+    engine = RetrievalEngine(index, preprocess, ranking=RANKING_BM25F, fuzzy_threshold=0.3)
+    classify = SectionClassifier()
+    queries = load_queries()
+
+    correct = 0
+    full_chars = cut_chars = answered = 0
+    cut_seconds = []
+    for text, expected in queries:
+        names = classify(text)
+        correct += names == expected
+        if args.verbose and names != expected:
+            print(f"  {text!r}: got {names or 'whole entry'}, want {expected or 'whole entry'}")
+        hit = engine.best(text)
+        if hit is None:
+            continue
+        answered += 1
+        start = time.perf_counter()
+        reply = hit.section(classify(text)) or hit.details
+        cut_seconds.append(time.perf_counter() - start)
+        full_chars += len(hit.details)
+        cut_chars += len(reply)
+
+    print(f"{len(rows)} entries parsed in {parse_ms:.2f} ms; {len(queries)} labelled questions")
+    print(f"section choice exact match  {correct / len(queries):.1%}")
+    print(f"mean reply chars            whole entry {full_chars / answered:.0f}, "
+          f"sectioned {cut_chars / answered:.0f} ({cut_chars / full_chars:.0%})")
+    print(f"classify + cut per answer   {sum(cut_seconds) / len(cut_seconds) * 1e6:.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+"""Verify-time table for the password KDFs, plus calibrated parameters for a target.
+
+Run from the repo root:  python benchmarks/bench_password_hashing.py [target_ms]
+Copy the suggested params into PASSWORD_HASH_PARAMS in services.py.
+"""
+import hashlib
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import credentials  # noqa: E402
+
+
+def main():
+    target_ms = float(sys.argv[1]) if len(sys.argv) > 1 else 50.0
+
+    legacy = hashlib.sha256(b"calibration-password").hexdigest()
+    start = time.perf_counter()
+    credentials.verify_password("calibration-password", legacy)
+    print(f"legacy sha256     {(time.perf_counter() - start) * 1000:8.3f} ms  (unsalted)")
+    for log_n in range(12, 17):
+        params = {"algorithm": "scrypt", "n": 2 ** log_n, "r": 8, "p": 1}
+        memory_mib = 128 * params["n"] * params["r"] / (1 << 20)
+        print(f"scrypt n=2^{log_n:<2}     {credentials.time_verify(params) * 1000:8.2f} ms"
+              f"  ({memory_mib:.0f} MiB)")
+    for iterations in (100_000, 300_000, 600_000):
+        params = {"algorithm": "pbkdf2_sha256", "iterations": iterations}
+        print(f"pbkdf2 i={iterations:<8} {credentials.time_verify(params) * 1000:8.2f} ms")
+
+    print(f"\ncalibrated for {target_ms:.0f} ms:")
+    for algorithm in ("scrypt", "pbkdf2_sha256"):
+        params, elapsed = credentials.calibrate(target_ms / 1000, algorithm)
+        print(f"  {params}  -> {elapsed * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""Tokens/sec of the old per-call `preprocessing` versus the shared Preprocessor.
+
+Run from the repo root:  python benchmarks/bench_preprocessing.py
+"""
+import os
+import string
+import sys
+import time
+
+import pandas as pd
+from nltk.corpus import stopwords
+from nltk.stem import WordNetLemmatizer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from preprocess import Preprocessor  # noqa: E402
+
+
+def legacy_preprocessing(text):
+    """The original implementation from 2.py, kept here as the baseline"""
+    text = text.translate(str.maketrans("", "", string.punctuation))
+    stop_words = set(stopwords.words("english"))
+    tokens = text.split()
+    tokens = [word for word in tokens if word.lower() not in stop_words]
+    lemmatizer = WordNetLemmatizer()
+    tokens = [lemmatizer.lemmatize(word, pos="v") for word in tokens]
+    return " ".join(tokens)
+
+
+def run(name, func, texts, repeat):
+    n_tokens = sum(len(text.split()) for text in texts) * repeat
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for text in texts:
+            func(text)
+    elapsed = time.perf_counter() - start
+    print(f"{name:<14} {n_tokens / elapsed:>12,.0f} tokens/sec  ({elapsed:.3f}s)")
+    return elapsed
+
+
+def main(repeat=5):
+    df = pd.read_csv("AI_legal_assistance.csv")
+    texts = df["Topic"].astype(str).tolist() + df["Details"].astype(str).tolist()
+
+    preprocessor = Preprocessor()
+    # Sanity check: the new pipeline must produce the same output as before
+    for text in texts:
+        assert preprocessor(text) == legacy_preprocessing(text)
+
+    legacy = run("legacy", legacy_preprocessing, texts, repeat)
+    fresh = Preprocessor()
+    current = run("preprocessor", fresh.transform, texts, repeat)
+    print(f"speedup        {legacy / current:>12.1f}x")
+    print(f"lemma cache    {fresh.cache_info()}")
+
+
+if __name__ == "__main__":
+    main()
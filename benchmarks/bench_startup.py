@@ -0,0 +1,96 @@
+"""Cold-start cost of the app: import time and time to first paint of the login page.
+
+Run from the repo root:  python benchmarks/bench_startup.py [runs] [--json results.json]
+Every sample is a fresh interpreter, so nothing is warm. "first paint" is one
+full script run of 2.py for a logged-out visitor under streamlit's AppTest.
+The heavy-module column lists the libraries that page pulled in; it should stay
+empty now that NLTK, scikit-learn and Gemini are only loaded on first use.
+"""
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ["nltk", "sklearn", "pandas", "scipy", "google.generativeai"]
+
+# Each child prints one JSON line with its own timings
+IMPORT_CHILD = """
+import json, sys, time
+start = time.perf_counter()
+import streamlit
+streamlit_done = time.perf_counter()
+import services, prompts, credentials, response_cache, scheduler
+done = time.perf_counter()
+print(json.dumps({
+    "streamlit_s": streamlit_done - start,
+    "app_modules_s": done - streamlit_done,
+    "heavy": [m for m in HEAVY if m in sys.modules],
+}))
+"""
+
+PAINT_CHILD = """
+import json, logging, sys, time, warnings
+warnings.filterwarnings("ignore")
+logging.disable(logging.WARNING)
+from streamlit.testing.v1 import AppTest
+start = time.perf_counter()
+at = AppTest.from_file("2.py", default_timeout=120)
+at.run()
+done = time.perf_counter()
+assert not at.exception, at.exception
+print(json.dumps({
+    "first_paint_s": done - start,
+    "heavy": [m for m in HEAVY if m in sys.modules],
+}))
+"""
+
+
+def run_child(code):
+    code = f"HEAVY = {HEAVY_MODULES!r}\n" + code
+    out = subprocess.run(
+        [sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+
+def main():
+    args = sys.argv[1:]
+    json_path = None
+    if "--json" in args:
+        at = args.index("--json")
+        json_path = args[at + 1]
+        del args[at:at + 2]
+    runs = int(args[0]) if args else 5
+
+    imports = [run_child(IMPORT_CHILD) for _ in range(runs)]
+    paints = [run_child(PAINT_CHILD) for _ in range(runs)]
+
+    results = {
+        "runs": runs,
+        "python": sys.version.split()[0],
+        "streamlit_import_ms": median([r["streamlit_s"] for r in imports]) * 1000,
+        "app_import_ms": median([r["app_modules_s"] for r in imports]) * 1000,
+        "first_paint_ms": median([r["first_paint_s"] for r in paints]) * 1000,
+        "heavy_modules_at_import": imports[0]["heavy"],
+        "heavy_modules_at_first_paint": paints[0]["heavy"],
+    }
+    print(f"streamlit import  {results['streamlit_import_ms']:8.1f} ms (median of {runs})")
+    print(f"app modules       {results['app_import_ms']:8.1f} ms")
+    print(f"login first paint {results['first_paint_ms']:8.1f} ms")
+    print(f"heavy modules loaded for the login page: "
+          f"{', '.join(results['heavy_modules_at_first_paint']) or 'none'}")
+
+    if json_path:
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
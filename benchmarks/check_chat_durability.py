@@ -0,0 +1,134 @@
+"""Crash check for the write-behind chat store: no acknowledged message is lost.
+
+Each round starts a child process that appends numbered messages to a few
+chats through WriteBehindChatStore (synchronous=FULL, as services uses it)
+and prints every ticket it is given and every ticket the writer
+acknowledges. The parent kills the child with SIGKILL at a random moment,
+reopens the database and checks that each chat holds an unbroken run of
+messages 0..n that includes every acknowledged one.
+
+Run from the repo root:  python benchmarks/check_chat_durability.py [--rounds 20]
+Exits 1 if any round loses an acknowledged message. Everything is written
+to a temp dir.
+
+SIGKILL stands in for a process crash; it does not cut power, so it shows
+what the writer acknowledges is committed, not that the disk honours fsync.
+"""
+import argparse
+import os
+import random
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from chat_store import SQLiteChatStore  # noqa: E402
+from db import ConnectionPool  # noqa: E402
+from write_behind import WriteBehindChatStore  # noqa: E402
+
+EMAIL = "crash@example.com"
+CHATS_PER_THREAD = 3
+
+
+def child(path, threads):
+    """Append forever from `threads` threads, printing tickets and acks"""
+    store = WriteBehindChatStore(
+        SQLiteChatStore(path, pool=ConnectionPool(path, synchronous="FULL"))
+    )
+    out = threading.Lock()
+
+    def emit(line):
+        with out:
+            sys.stdout.write(line + "\n")
+            sys.stdout.flush()
+
+    store.listeners.append(lambda stats: emit(f"ack {stats.ticket}"))
+
+    def submit(worker):
+        rng = random.Random(worker)
+        chats = [f"t{worker}c{c}" for c in range(CHATS_PER_THREAD)]
+        counts = dict.fromkeys(chats, 0)
+        while True:
+            chat_id = rng.choice(chats)
+            messages = [
+                {"role": "user", "content": f"{chat_id}:{counts[chat_id] + i}"}
+                for i in range(rng.randint(1, 2))
+            ]
+            ticket = store.append_messages(EMAIL, chat_id, messages)
+            counts[chat_id] += len(messages)
+            emit(f"sent {ticket} {chat_id} {counts[chat_id]}")
+            time.sleep(rng.random() * 0.002)
+
+    for worker in range(threads):
+        threading.Thread(target=submit, args=(worker,), daemon=True).start()
+    threading.Event().wait()
+
+
+def run_round(path, threads, rng):
+    proc = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), "--child", path, "--threads", str(threads)],
+        stdout=subprocess.PIPE, text=True,
+    )
+    time.sleep(0.2 + rng.random() * 0.8)
+    proc.send_signal(signal.SIGKILL)
+    output, _ = proc.communicate()
+
+    # Highest message count per chat covered by the last acknowledged ticket
+    acked, sent = 0, []
+    for line in output.splitlines():
+        parts = line.split()
+        if parts[:1] == ["ack"] and len(parts) == 2:
+            acked = max(acked, int(parts[1]))
+        elif parts[:1] == ["sent"] and len(parts) == 4:
+            sent.append((int(parts[1]), parts[2], int(parts[3])))
+    required = {}
+    for ticket, chat_id, count in sent:
+        if ticket <= acked:
+            required[chat_id] = max(required.get(chat_id, 0), count)
+
+    store = SQLiteChatStore(path)
+    lost = stored = 0
+    for chat_id, count in required.items():
+        contents = [message["content"] for message in store.load_messages(EMAIL, chat_id)]
+        stored += len(contents)
+        if contents != [f"{chat_id}:{i}" for i in range(len(contents))]:
+            print(f"  {chat_id}: stored messages are out of order or have gaps")
+            lost += 1
+        elif len(contents) < count:
+            print(f"  {chat_id}: {count} acknowledged, {len(contents)} stored")
+            lost += 1
+    store.pool.close()
+    return acked, sum(required.values()), stored, lost
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        return child(args.child, args.threads)
+
+    rng = random.Random(args.seed)
+    failures = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in range(args.rounds):
+            path = os.path.join(tmp, f"round{n}.db")
+            acked, required, stored, lost = run_round(path, args.threads, rng)
+            failures += bool(lost)
+            print(f"round {n:>2}: {acked:>5} tickets acked, {required:>5} messages acknowledged, "
+                  f"{stored:>5} stored, {'LOST ' + str(lost) + ' chats' if lost else 'ok'}")
+    print(f"{args.rounds - failures}/{args.rounds} rounds kept every acknowledged message")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
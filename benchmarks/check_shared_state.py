@@ -0,0 +1,180 @@
+"""Several worker processes appending to one chat through the shared chat state.
+
+Each worker process runs its own WriteBehindChatStore and ChatCache over the
+same database, with the chat versions the app uses by default
+(services.SHARED_STATE, i.e. PAKLAW_SHARED_STATE; --state picks another).
+Every turn a worker reads the shared chat and a chat nobody writes to, then
+appends a two-message turn to the shared chat. The parent then checks that:
+
+    - the shared chat holds every turn of every worker, each turn's two
+      messages side by side and each worker's turns in order (appends are
+      merged, never overwritten);
+    - every worker's last read of the shared chat is a prefix of the final
+      chat that includes all of that worker's own turns;
+    - the quiet chat was loaded from disk once per worker and otherwise
+      served from the cache (only changed chats are reloaded);
+    - a worker that only reads, and cached the shared chat before the others
+      started writing, sees every message once they are done;
+    - with sqlite versions, the shared chat's final version equals the number
+      of batches the workers committed (each bump commits with its batch).
+
+--state local keeps versions in each worker's memory, so the reader check
+fails: the reader never learns of the other workers' appends. That mode is
+only for a single worker.
+
+Run from the repo root:  python benchmarks/check_shared_state.py [--workers 4] [--turns 100]
+                         [--state sqlite|local]
+Exits 1 if any check fails. Everything is written to a temp dir.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from chat_store import SQLiteChatStore  # noqa: E402
+from services import SHARED_STATE  # noqa: E402
+from shared_state import ChatCache, LocalSharedState, SQLiteSharedState  # noqa: E402
+from write_behind import WriteBehindChatStore  # noqa: E402
+
+EMAIL = "shared@example.com"
+SHARED, QUIET = "shared", "quiet"
+QUIET_MESSAGES = 200
+
+
+def make_state(kind, path):
+    return SQLiteSharedState(path) if kind == "sqlite" else LocalSharedState()
+
+
+def worker(path, n, turns, kind):
+    """Read both chats and append one turn, `turns` times; print stats as JSON"""
+    state = make_state(kind, path)
+    store = WriteBehindChatStore(SQLiteChatStore(path), state=state)
+    cache = ChatCache(store, state)
+    quiet_seconds = 0.0
+    for turn in range(turns):
+        start = time.perf_counter()
+        cache.load(EMAIL, QUIET)
+        quiet_seconds += time.perf_counter() - start
+        messages, version = cache.load(EMAIL, SHARED)
+        store.append_messages(EMAIL, SHARED, [
+            {"role": "user", "content": f"w{n}:{turn}:q"},
+            {"role": "bot", "content": f"w{n}:{turn}:a"},
+        ])
+    store.close()
+    messages, version = cache.load(EMAIL, SHARED)
+    print(json.dumps({
+        "batches": store.stats["batches"],
+        "cache": cache.info(),
+        "last_read": [message["content"] for message in messages],
+        "quiet_us": quiet_seconds / turns * 1e6,
+    }))
+
+
+def reader(path, kind):
+    """Cache the shared chat, wait for a line on stdin, then read it again"""
+    state = make_state(kind, path)
+    store = WriteBehindChatStore(SQLiteChatStore(path), state=state)
+    cache = ChatCache(store, state)
+    cache.load(EMAIL, SHARED)
+    print("ready", flush=True)
+    sys.stdin.readline()
+    messages, version = cache.load(EMAIL, SHARED)
+    store.close()
+    print(json.dumps({"messages": len(messages)}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--turns", type=int, default=100)
+    parser.add_argument("--state", choices=("sqlite", "local"), default=SHARED_STATE)
+    parser.add_argument("--worker", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--reader", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--db", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.reader:
+        return reader(args.db, args.state)
+    if args.worker is not None:
+        return worker(args.db, args.worker, args.turns, args.state)
+
+    failures = []
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "chats.db")
+        store = SQLiteChatStore(path)
+        store.append_messages(EMAIL, QUIET, [
+            {"role": "user", "content": f"quiet {i}"} for i in range(QUIET_MESSAGES)
+        ])
+        SQLiteSharedState(path)
+        watcher = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), "--reader", "--db", path,
+             "--state", args.state],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True,
+        )
+        watcher.stdout.readline()
+
+        start = time.perf_counter()
+        procs = [
+            subprocess.Popen(
+                [sys.executable, os.path.abspath(__file__), "--worker", str(n),
+                 "--db", path, "--turns", str(args.turns), "--state", args.state],
+                stdout=subprocess.PIPE, text=True,
+            )
+            for n in range(args.workers)
+        ]
+        reports = [json.loads(proc.communicate()[0]) for proc in procs]
+        seconds = time.perf_counter() - start
+        seen = json.loads(watcher.communicate("go\n")[0])["messages"]
+
+        contents = [message["content"] for message in store.load_messages(EMAIL, SHARED)]
+        expected = args.workers * args.turns * 2
+        if len(contents) != expected:
+            failures.append(f"shared chat has {len(contents)} messages, expected {expected}")
+        if seen != len(contents):
+            failures.append(f"the read-only worker sees {seen} of {len(contents)} messages "
+                            f"(stale cache)")
+        for i in range(0, len(contents) - 1, 2):
+            if contents[i][:-1] != contents[i + 1][:-1]:
+                failures.append(f"turn split at message {i}: {contents[i]!r}, {contents[i + 1]!r}")
+                break
+        for n in range(args.workers):
+            order = [int(c.split(":")[1]) for c in contents[::2] if c.startswith(f"w{n}:")]
+            if order != list(range(args.turns)):
+                failures.append(f"worker {n}'s turns are missing or out of order")
+        final = SQLiteSharedState(path).version(EMAIL, SHARED) if args.state == "sqlite" else None
+        batches = sum(report["batches"] for report in reports)
+        if final is not None and final != batches:
+            failures.append(f"shared chat version {final} after {batches} committed batches")
+        for n, report in enumerate(reports):
+            last_read = report["last_read"]
+            if last_read != contents[:len(last_read)]:
+                failures.append(f"worker {n}'s last read is not a prefix of the stored chat")
+            elif sum(c.startswith(f"w{n}:") for c in last_read) != args.turns * 2:
+                failures.append(f"worker {n}'s last read is missing its own turns")
+        store.pool.close()
+
+    hits = sum(report["cache"]["hits"] for report in reports)
+    misses = sum(report["cache"]["misses"] for report in reports)
+    print(f"{args.state} state, {args.workers} workers x {args.turns} turns in {seconds:.2f}s; "
+          f"shared chat {len(contents)} messages, version {final}")
+    print(f"cache: {hits} hits, {misses} misses over {2 * args.workers * args.turns + args.workers} "
+          f"reads; quiet chat read in {sum(r['quiet_us'] for r in reports) / len(reports):.0f} us "
+          f"on average")
+    for report in reports:
+        # One miss for the quiet chat, the rest for the shared chat as it changed
+        if report["cache"]["misses"] > args.turns + 2:
+            failures.append(f"worker reloaded {report['cache']['misses']} times for "
+                            f"{args.turns + 1} shared-chat reads")
+    for failure in failures:
+        print("FAIL", failure)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,424 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+from datetime import datetime
+
+from db import ConnectionPool
+
+
+DEFAULT_DB_PATH = "user_chats.db"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS chats (
+    email     TEXT NOT NULL,
+    chat_id   TEXT NOT NULL,
+    title     TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    n_messages INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (email, chat_id)
+);
+CREATE INDEX IF NOT EXISTS chats_by_time ON chats (email, timestamp);
+
+CREATE TABLE IF NOT EXISTS messages (
+    email   TEXT NOT NULL,
+    chat_id TEXT NOT NULL,
+    seq     INTEGER NOT NULL,
+    role    TEXT NOT NULL,
+    content TEXT NOT NULL,
+    PRIMARY KEY (email, chat_id, seq)
+);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+# Full-text index over message contents. `owner` is a one-token digest of the
+# email, so a search intersects the user's posting list with the query terms
+# instead of scanning every user's matches. Porter stemming lets "divorced"
+# find "divorce"; unicode61 keeps Urdu script words intact.
+_FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+    content,
+    owner,
+    chat_id UNINDEXED,
+    seq UNINDEXED,
+    tokenize = 'porter unicode61 remove_diacritics 2'
+);
+"""
+
+DEFAULT_SEARCH_LIMIT = 20
+SNIPPET_TOKENS = 12
+
+_WORD = re.compile(r"\w+")
+
+logger = logging.getLogger("paklaw.chat_store")
+
+
+def _marked(conn, key):
+    return conn.execute("SELECT 1 FROM meta WHERE key = ?", (key,)).fetchone() is not None
+
+
+def _mark(conn, key):
+    conn.execute(
+        "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, datetime.now().isoformat())
+    )
+
+
+def _bump_after_commit(state, keys):
+    try:
+        state.bump(keys)
+    except Exception:
+        # The messages are committed, so the batch must not be retried;
+        # other workers see them on the chat's next change.
+        logger.exception("chat version bump failed")
+
+
+def owner_token(email):
+    return "u" + hashlib.sha1(email.lower().encode()).hexdigest()[:20]
+
+
+def snippet(text, words, size=SNIPPET_TOKENS):
+    """About `size` words of `text` around the first query hit, hits in **bold**"""
+    # Stem-insensitive enough for display: "divorce" also marks "divorced"
+    stems = tuple(word[:max(3, len(word) - 2)] for word in words)
+    tokens = text.split()
+    hits = [i for i, token in enumerate(tokens)
+            if token.lower().strip(".,;:!?()\"'").startswith(stems)]
+    start = max(0, hits[0] - size // 3) if hits else 0
+    shown = tokens[start:start + size]
+    hit_set = set(hits)
+    shown = [f"**{token}**" if start + i in hit_set else token for i, token in enumerate(shown)]
+    return ("… " if start else "") + " ".join(shown) + (" …" if start + size < len(tokens) else "")
+
+
+def fts_query(email, text):
+    """FTS5 MATCH expression: the user's rows AND every word; the last word may be a prefix"""
+    words = _WORD.findall(text)
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += "*"  # match while the user is still typing
+    return f'owner : "{owner_token(email)}" AND content : ({" ".join(terms)})'
+
+
+# ----------------------- CHAT STORE -----------------------
+
+class ChatStore:
+    """Per-user chat storage.
+
+    Chats are returned in the same shape the app has always used:
+    {chat_id: {"title": ..., "messages": [...], "timestamp": ...}}.
+    Subclasses only need to implement the methods below.
+    """
+
+    def list_chats(self, email, limit=None, offset=0, title_filter=""):
+        """Return [{"chat_id", "title", "timestamp", "n_messages"}], newest first, without messages.
+
+        `limit` / `offset` select one page; `title_filter` keeps titles containing it.
+        """
+        raise NotImplementedError
+
+    def count_chats(self, email, title_filter=""):
+        return len(self.list_chats(email, title_filter=title_filter))
+
+    def load_messages(self, email, chat_id):
+        raise NotImplementedError
+
+    def search(self, email, query, limit=DEFAULT_SEARCH_LIMIT):
+        """Chats whose messages contain every word of `query`, best match first.
+
+        Returns [{"chat_id", "title", "timestamp", "snippet"}], one entry per chat.
+        """
+        raise NotImplementedError
+
+    def append_messages(self, email, chat_id, messages, title=None, timestamp=None):
+        """Append messages to the end of one chat, creating it if needed"""
+        raise NotImplementedError
+
+    def append_batch(self, appends, state=None):
+        """Apply several (email, chat_id, messages, title, timestamp) appends at once.
+
+        With a SharedState, each appended chat's version is bumped once the
+        messages are stored (in the same transaction, where the store can).
+        """
+        for email, chat_id, messages, title, timestamp in appends:
+            self.append_messages(email, chat_id, messages, title, timestamp)
+        if state is not None:
+            _bump_after_commit(state, [append[:2] for append in appends])
+
+    def flush(self, email=None, chat_id=None, timeout=None):
+        """Wait for buffered writes; stores that write straight through have none"""
+        return True
+
+    def wait(self, ticket, timeout=None):
+        """Wait for the append that returned `ticket`; already done unless buffered"""
+        return True
+
+    def load_chats(self, email):
+        chats = {}
+        for entry in self.list_chats(email):
+            chats[entry["chat_id"]] = {
+                "title": entry["title"],
+                "messages": self.load_messages(email, entry["chat_id"]),
+                "timestamp": entry["timestamp"],
+            }
+        return chats
+
+    def sync_chat(self, email, chat_id, chat):
+        """Persist the part of `chat["messages"]` the store does not have yet.
+
+        Returns what append_messages returns (a ticket, for buffered stores).
+        """
+        stored = self.message_count(email, chat_id)
+        return self.append_messages(
+            email, chat_id, chat["messages"][stored:],
+            title=chat.get("title", chat_id),
+            timestamp=chat.get("timestamp"),
+        )
+
+    def message_count(self, email, chat_id):
+        return len(self.load_messages(email, chat_id))
+
+
+class SQLiteChatStore(ChatStore):
+    """ChatStore on SQLite in WAL mode.
+
+    Appending a message is one indexed insert plus one row update, whatever
+    the size of the rest of the history, and concurrent sessions are
+    serialised by SQLite's write lock instead of racing on a JSON file.
+    """
+
+    def __init__(self, path=DEFAULT_DB_PATH, pool=None):
+        self.path = path
+        self.pool = pool or ConnectionPool(path)
+        with self.pool.connection() as conn:
+            conn.executescript(_SCHEMA)
+        self.full_text = self._create_search_index()
+
+    def list_chats(self, email, limit=None, offset=0, title_filter=""):
+        # Served from the chats table and its (email, timestamp) index alone;
+        # message bodies are never read.
+        with self.pool.connection() as conn:
+            rows = conn.execute(
+                "SELECT chat_id, title, timestamp, n_messages FROM chats "
+                "WHERE email = ? AND instr(lower(title), ?) > 0 "
+                "ORDER BY timestamp DESC LIMIT ? OFFSET ?",
+                (email, title_filter.lower(), -1 if limit is None else limit, offset),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def count_chats(self, email, title_filter=""):
+        with self.pool.connection() as conn:
+            row = conn.execute(
+                "SELECT COUNT(*) AS n FROM chats WHERE email = ? AND instr(lower(title), ?) > 0",
+                (email, title_filter.lower()),
+            ).fetchone()
+        return row["n"]
+
+    def load_messages(self, email, chat_id):
+        with self.pool.connection() as conn:
+            rows = conn.execute(
+                "SELECT role, content FROM messages WHERE email = ? AND chat_id = ? ORDER BY seq",
+                (email, chat_id),
+            ).fetchall()
+        return [{"role": row["role"], "content": row["content"]} for row in rows]
+
+    def message_count(self, email, chat_id):
+        with self.pool.connection() as conn:
+            row = conn.execute(
+                "SELECT n_messages FROM chats WHERE email = ? AND chat_id = ?",
+                (email, chat_id),
+            ).fetchone()
+        return row["n_messages"] if row else 0
+
+    def append_messages(self, email, chat_id, messages, title=None, timestamp=None):
+        self.append_batch([(email, chat_id, messages, title, timestamp)])
+
+    def append_batch(self, appends, state=None):
+        # One transaction, so one commit (and one WAL fsync) for the whole
+        # batch. BEGIN IMMEDIATE takes the write lock up front, so two
+        # sessions appending to the same chat cannot read the same next seq.
+        keys = [append[:2] for append in appends]
+        same_db = state is not None and state.shares_database(self.pool.path)
+        with self.pool.transaction() as conn:
+            for email, chat_id, messages, title, timestamp in appends:
+                self._append(conn, email, chat_id, messages, title, timestamp)
+            if same_db:
+                # Versions in this file commit with the messages, so no reader
+                # ever sees new messages under an old version or the reverse
+                state.bump(keys, conn=conn)
+        if state is not None and not same_db:
+            _bump_after_commit(state, keys)
+
+    def _append(self, conn, email, chat_id, messages, title, timestamp):
+        timestamp = timestamp or datetime.now().isoformat()
+        conn.execute(
+            "INSERT INTO chats (email, chat_id, title, timestamp) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (email, chat_id) DO UPDATE SET timestamp = excluded.timestamp",
+            (email, chat_id, title or chat_id, timestamp),
+        )
+        start = conn.execute(
+            "SELECT n_messages FROM chats WHERE email = ? AND chat_id = ?",
+            (email, chat_id),
+        ).fetchone()["n_messages"]
+        conn.executemany(
+            "INSERT INTO messages (email, chat_id, seq, role, content) VALUES (?, ?, ?, ?, ?)",
+            [
+                (email, chat_id, start + offset, message["role"], message["content"])
+                for offset, message in enumerate(messages)
+            ],
+        )
+        conn.execute(
+            "UPDATE chats SET n_messages = ? WHERE email = ? AND chat_id = ?",
+            (start + len(messages), email, chat_id),
+        )
+        if self.full_text:
+            owner = owner_token(email)
+            conn.executemany(
+                "INSERT INTO messages_fts (content, owner, chat_id, seq) VALUES (?, ?, ?, ?)",
+                [
+                    (message["content"], owner, chat_id, start + offset)
+                    for offset, message in enumerate(messages)
+                ],
+            )
+
+    def delete_chat(self, email, chat_id):
+        with self.pool.transaction() as conn:
+            conn.execute("DELETE FROM messages WHERE email = ? AND chat_id = ?", (email, chat_id))
+            conn.execute("DELETE FROM chats WHERE email = ? AND chat_id = ?", (email, chat_id))
+            if self.full_text:
+                conn.execute(
+                    "DELETE FROM messages_fts WHERE owner = ? AND chat_id = ?",
+                    (owner_token(email), chat_id),
+                )
+
+    # ----------------------- SEARCH -----------------------
+
+    def search(self, email, query, limit=DEFAULT_SEARCH_LIMIT):
+        if not self.full_text:
+            return self._search_scan(email, query, limit)
+        match = fts_query(email, query)
+        if match is None:
+            return []
+        with self.pool.connection() as conn:
+            # Rank messages by bm25 and keep the best one per chat. Snippets
+            # are only built for those winners, not for every match.
+            best = {}
+            for row in conn.execute(
+                "SELECT rowid, chat_id FROM messages_fts WHERE messages_fts MATCH ? ORDER BY rank",
+                (match,),
+            ):
+                best.setdefault(row["chat_id"], row["rowid"])
+                if len(best) == limit:
+                    break
+            if not best:
+                return []
+            # Plain rowid lookups; FTS5's snippet() would re-run the MATCH
+            marks = ",".join("?" * len(best))
+            contents = dict(conn.execute(
+                f"SELECT rowid, content FROM messages_fts WHERE rowid IN ({marks})",
+                tuple(best.values()),
+            ).fetchall())
+            chats = {
+                row["chat_id"]: row
+                for row in conn.execute(
+                    f"SELECT chat_id, title, timestamp FROM chats WHERE email = ? AND chat_id IN ({marks})",
+                    (email, *best),
+                )
+            }
+        words = [word.lower() for word in _WORD.findall(query)]
+        return [
+            {
+                "chat_id": chat_id,
+                "title": chats[chat_id]["title"],
+                "timestamp": chats[chat_id]["timestamp"],
+                "snippet": snippet(contents[rowid], words),
+            }
+            for chat_id, rowid in best.items()
+            if chat_id in chats
+        ]
+
+    def _search_scan(self, email, query, limit):
+        """Fallback for SQLite builds without FTS5: case-insensitive word match"""
+        words = [word.lower() for word in _WORD.findall(query)]
+        if not words:
+            return []
+        results = []
+        for entry in self.list_chats(email):
+            for message in self.load_messages(email, entry["chat_id"]):
+                content = message["content"].lower()
+                if all(word in content for word in words):
+                    results.append({
+                        "chat_id": entry["chat_id"],
+                        "title": entry["title"],
+                        "timestamp": entry["timestamp"],
+                        "snippet": snippet(message["content"], words),
+                    })
+                    break
+            if len(results) == limit:
+                break
+        return results
+
+    def _create_search_index(self):
+        """Create the FTS5 table and index any messages stored before it existed"""
+        try:
+            with self.pool.connection() as conn:
+                conn.executescript(_FTS_SCHEMA)
+        except sqlite3.OperationalError:
+            return False  # SQLite built without FTS5
+        if self._marked("fts_indexed"):
+            return True
+        # Checked again under the write lock: several workers starting at once
+        # must not all index the same messages. Rows another worker appended
+        # since the table appeared are indexed already, so start from empty.
+        with self.pool.transaction() as conn:
+            if not _marked(conn, "fts_indexed"):
+                conn.execute("DELETE FROM messages_fts")
+                rows = conn.execute("SELECT email, chat_id, seq, content FROM messages").fetchall()
+                conn.executemany(
+                    "INSERT INTO messages_fts (content, owner, chat_id, seq) VALUES (?, ?, ?, ?)",
+                    [(row["content"], owner_token(row["email"]), row["chat_id"], row["seq"])
+                     for row in rows],
+                )
+                _mark(conn, "fts_indexed")
+        return True
+
+    def _marked(self, key):
+        with self.pool.connection() as conn:
+            return _marked(conn, key)
+
+    # ----------------------- MIGRATION -----------------------
+
+    def migrate_json(self, json_path="user_chats.json"):
+        """One-shot import of the old whole-file JSON store. Returns the number of chats imported."""
+        if not os.path.exists(json_path) or self._marked("migrated_json"):
+            return 0
+
+        with open(json_path, "r", encoding="utf-8") as f:
+            all_chats = json.load(f)
+
+        # One transaction with the marker, so when several workers start at
+        # once the first imports everything and the rest find the marker.
+        imported = 0
+        with self.pool.transaction() as conn:
+            if _marked(conn, "migrated_json"):
+                return 0
+            for email, chats in all_chats.items():
+                for chat_id, chat in chats.items():
+                    stored = conn.execute(
+                        "SELECT 1 FROM chats WHERE email = ? AND chat_id = ?", (email, chat_id)
+                    ).fetchone()
+                    if stored is not None:
+                        continue
+                    self._append(
+                        conn, email, chat_id, chat.get("messages", []),
+                        chat.get("title", chat_id), chat.get("timestamp"),
+                    )
+                    imported += 1
+            _mark(conn, "migrated_json")
+        return imported
@@ -0,0 +1,116 @@
+import threading
+import time
+
+import requests
+
+
+# The model endpoint itself, not an unrelated site: if this is unreachable the
+# online bot cannot answer anyway.
+GEMINI_HEALTH_URL = "https://generativelanguage.googleapis.com/"
+DEFAULT_TTL = 30.0
+DEFAULT_TIMEOUT = 3.0
+
+
+# ----------------------- CONNECTIVITY MONITOR -----------------------
+
+class ConnectivityMonitor:
+    """Cached online/offline state refreshed by a background thread.
+
+    `is_online()` only reads a flag, so the chat path never waits on the
+    network. Any HTTP response below 500 counts as reachable; the probe is
+    about the network path, not about whether this particular URL is a
+    valid API call. `probe_url` can point at a local stub server in tests.
+    """
+
+    def __init__(self, probe_url=GEMINI_HEALTH_URL, ttl=DEFAULT_TTL, timeout=DEFAULT_TIMEOUT,
+                 session=None):
+        self.probe_url = probe_url
+        self.ttl = ttl
+        self.timeout = timeout
+        self._session = session or requests.Session()
+        # Optimistic until the first probe says otherwise; a failed model call
+        # flips this straight away through mark_unhealthy().
+        self._healthy = True
+        self._checked_at = 0.0
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def probe(self):
+        """Run one synchronous health check and update the cached state"""
+        try:
+            response = self._session.get(self.probe_url, timeout=self.timeout)
+            healthy = response.status_code < 500
+        except requests.RequestException:
+            healthy = False
+        self._set(healthy)
+        return healthy
+
+    def is_online(self):
+        return self._healthy
+
+    def is_stale(self):
+        return time.monotonic() - self._checked_at > self.ttl
+
+    def mark_unhealthy(self):
+        """Record a failed model call and ask the background thread to re-check soon"""
+        self._set(False)
+        self._wake.set()
+
+    def _set(self, healthy):
+        self._healthy = healthy
+        self._checked_at = time.monotonic()
+
+    # ----------------------- BACKGROUND REFRESH -----------------------
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return self
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._run, name="connectivity-monitor", daemon=True
+            )
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.probe()
+            # While offline, re-check more often so we come back quickly
+            wait = self.ttl if self._healthy else min(self.ttl, 5.0)
+            self._wake.wait(wait)
+            self._wake.clear()
+
+
+class StaticConnectivity:
+    """ConnectivityMonitor stand-in with a fixed answer, for tests and load runs.
+
+    Failed model calls do not flip it, so a run stays on the path it was
+    pinned to.
+    """
+
+    def __init__(self, online=True):
+        self.online = online
+
+    def probe(self):
+        return self.online
+
+    def is_online(self):
+        return self.online
+
+    def mark_unhealthy(self):
+        pass
+
+    def start(self):
+        return self
+
+    def stop(self, timeout=None):
+        pass
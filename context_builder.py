@@ -0,0 +1,162 @@
+import re
+import threading
+from collections import deque
+
+
+DEFAULT_TOKEN_BUDGET = 1500
+DEFAULT_RECENT_MESSAGES = 6
+DEFAULT_SUMMARY_TOKENS = 250
+SUMMARY_WORDS_PER_MESSAGE = 20
+
+_SENTENCE_END = re.compile(r"(?<=[.!?؟])\s")
+
+
+# ----------------------- TOKEN ESTIMATE -----------------------
+
+def estimate_tokens(text):
+    """Cheap local token estimate: ~4 characters per token for Gemini-style tokenizers"""
+    return (len(text) + 3) // 4
+
+
+# ----------------------- PROMPT OBJECT -----------------------
+
+class PromptStats:
+    """Size of one assembled prompt, in estimated tokens"""
+
+    __slots__ = ("system_tokens", "summary_tokens", "history_tokens", "input_tokens",
+                 "messages_verbatim", "messages_summarized", "messages_dropped")
+
+    def __init__(self, **values):
+        for name in self.__slots__:
+            setattr(self, name, values.get(name, 0))
+
+    @property
+    def content_tokens(self):
+        """Tokens sent as conversation contents (the system prompt goes separately)"""
+        return self.summary_tokens + self.history_tokens + self.input_tokens
+
+    def as_dict(self):
+        values = {name: getattr(self, name) for name in self.__slots__}
+        values["content_tokens"] = self.content_tokens
+        return values
+
+
+class Prompt:
+    """What gets sent to the model: a system instruction plus Gemini-style contents"""
+
+    __slots__ = ("system", "contents", "stats")
+
+    def __init__(self, system, contents, stats):
+        self.system = system
+        self.contents = contents
+        self.stats = stats
+
+
+# ----------------------- CONTEXT BUILDER -----------------------
+
+class ContextBuilder:
+    """Assembles a token-budgeted prompt from the chat history.
+
+    The static system prompt is passed as the model's system instruction, so
+    it is not re-sent as user text. Contents are: a short extractive summary
+    of older turns and any known session details, then the most recent
+    messages verbatim, then the new question. The oldest verbatim messages
+    are moved into the summary until the contents fit `token_budget`.
+    """
+
+    def __init__(self, system_prompt, token_budget=DEFAULT_TOKEN_BUDGET,
+                 recent_messages=DEFAULT_RECENT_MESSAGES, summary_tokens=DEFAULT_SUMMARY_TOKENS,
+                 estimator=estimate_tokens, keep_stats=1000):
+        self.system_prompt = system_prompt
+        self.token_budget = token_budget
+        self.recent_messages = recent_messages
+        self.summary_tokens = summary_tokens
+        self.estimator = estimator
+        self.recent_stats = deque(maxlen=keep_stats)
+        self._lock = threading.Lock()
+        self._system_tokens = estimator(system_prompt)
+
+    def build(self, history, user_input, session=None):
+        """Prompt for `user_input`, given earlier messages [{"role", "content"}, ...]"""
+        estimate = self.estimator
+        input_tokens = estimate(user_input)
+        history = list(history)
+        recent = history[-self.recent_messages:] if self.recent_messages else []
+        older = history[:len(history) - len(recent)]
+
+        # Trim verbatim turns from the front until everything fits the budget
+        recent_tokens = [estimate(message["content"]) for message in recent]
+        available = self.token_budget - input_tokens - self.summary_tokens
+        while recent and sum(recent_tokens) > available:
+            older.append(recent.pop(0))
+            recent_tokens.pop(0)
+        # Gemini expects the conversation to open with a user turn
+        while recent and recent[0]["role"] != "user":
+            older.append(recent.pop(0))
+            recent_tokens.pop(0)
+
+        preamble, messages_summarized, messages_dropped = self._preamble(older, session)
+        summary_tokens = estimate(preamble) if preamble else 0
+
+        contents = []
+        for message in recent:
+            role = "user" if message["role"] == "user" else "model"
+            contents.append({"role": role, "parts": [message["content"]]})
+        question = user_input
+        if preamble:
+            if contents:
+                contents[0] = {"role": "user", "parts": [preamble, contents[0]["parts"][0]]}
+            else:
+                question = f"{preamble}\n\n{user_input}"
+        contents.append({"role": "user", "parts": [question]})
+
+        stats = PromptStats(
+            system_tokens=self._system_tokens,
+            summary_tokens=summary_tokens,
+            history_tokens=sum(recent_tokens),
+            input_tokens=input_tokens,
+            messages_verbatim=len(recent),
+            messages_summarized=messages_summarized,
+            messages_dropped=messages_dropped,
+        )
+        with self._lock:
+            self.recent_stats.append(stats)
+        return Prompt(self.system_prompt, contents, stats)
+
+    def _preamble(self, older, session):
+        """Summary of older turns, newest kept first when it has to be cut"""
+        lines = []
+        if session:
+            known = {key: value for key, value in session.items() if value}
+            if known:
+                lines.append("Known session details: " + "; ".join(
+                    f"{key}: {', '.join(map(str, value)) if isinstance(value, list) else value}"
+                    for key, value in known.items()
+                ))
+
+        summary_lines = []
+        used = sum(self.estimator(line) for line in lines)
+        for message in reversed(older):
+            line = _summarize_message(message)
+            cost = self.estimator(line)
+            if used + cost > self.summary_tokens:
+                break
+            summary_lines.append(line)
+            used += cost
+        summary_lines.reverse()
+
+        if summary_lines:
+            lines.append("Summary of earlier conversation:")
+            lines.extend(summary_lines)
+        return "\n".join(lines), len(summary_lines), len(older) - len(summary_lines)
+
+
+def _summarize_message(message):
+    """First sentence of a message, capped at a few words"""
+    text = " ".join(message["content"].split())
+    first = _SENTENCE_END.split(text, 1)[0]
+    words = first.split()
+    if len(words) > SUMMARY_WORDS_PER_MESSAGE:
+        first = " ".join(words[:SUMMARY_WORDS_PER_MESSAGE]) + "…"
+    speaker = "User" if message["role"] == "user" else "Assistant"
+    return f"- {speaker}: {first}"
@@ -0,0 +1,141 @@
+import base64
+import hashlib
+import hmac
+import os
+import re
+import time
+
+
+SALT_BYTES = 16
+KEY_BYTES = 32
+
+# About 16 MiB and tens of milliseconds per verify on a typical server core.
+# Run benchmarks/bench_password_hashing.py to calibrate for your hardware.
+DEFAULT_PARAMS = {"algorithm": "scrypt", "n": 2 ** 14, "r": 8, "p": 1}
+PBKDF2_PARAMS = {"algorithm": "pbkdf2_sha256", "iterations": 600_000}
+
+_LEGACY_SHA256 = re.compile(r"^[0-9a-f]{64}$")
+
+
+# ----------------------- ENCODING -----------------------
+
+def _b64(data):
+    return base64.b64encode(data).decode("ascii").rstrip("=")
+
+
+def _unb64(text):
+    return base64.b64decode(text + "=" * (-len(text) % 4))
+
+
+def _derive(password, salt, params):
+    secret = password.encode()
+    if params["algorithm"] == "scrypt":
+        n, r, p = params["n"], params["r"], params["p"]
+        return hashlib.scrypt(
+            secret, salt=salt, n=n, r=r, p=p, dklen=KEY_BYTES,
+            # scrypt needs 128 * n * r bytes; leave headroom over that
+            maxmem=256 * n * r * p + (1 << 20),
+        )
+    if params["algorithm"] == "pbkdf2_sha256":
+        return hashlib.pbkdf2_hmac("sha256", secret, salt, params["iterations"], KEY_BYTES)
+    raise ValueError(f"Unknown password hash algorithm: {params['algorithm']}")
+
+
+def _encode(params, salt, key):
+    if params["algorithm"] == "scrypt":
+        cost = f"n={params['n']},r={params['r']},p={params['p']}"
+    else:
+        cost = f"i={params['iterations']}"
+    return f"${params['algorithm']}${cost}${_b64(salt)}${_b64(key)}"
+
+
+def parse_hash(stored):
+    """Split a stored hash into (params, salt, key). Legacy SHA-256 hex gives salt None."""
+    if _LEGACY_SHA256.match(stored):
+        return {"algorithm": "sha256"}, None, bytes.fromhex(stored)
+
+    _, algorithm, cost, salt, key = stored.split("$")
+    fields = dict(item.split("=") for item in cost.split(","))
+    if algorithm == "scrypt":
+        params = {"algorithm": algorithm, "n": int(fields["n"]), "r": int(fields["r"]),
+                  "p": int(fields["p"])}
+    else:
+        params = {"algorithm": algorithm, "iterations": int(fields["i"])}
+    return params, _unb64(salt), _unb64(key)
+
+
+# ----------------------- PUBLIC API -----------------------
+
+def hash_password(password, params=None):
+    """Salted, cost-parameterised hash in a self-describing `$alg$cost$salt$key` string"""
+    params = params or DEFAULT_PARAMS
+    salt = os.urandom(SALT_BYTES)
+    return _encode(params, salt, _derive(password, salt, params))
+
+
+def verify_password(password, stored):
+    """Constant-time check of `password` against any hash format we have ever stored"""
+    try:
+        params, salt, key = parse_hash(stored)
+    except (ValueError, KeyError):
+        return False
+    if salt is None:
+        candidate = hashlib.sha256(password.encode()).digest()
+    else:
+        candidate = _derive(password, salt, params)
+    return hmac.compare_digest(candidate, key)
+
+
+def needs_rehash(stored, params=None):
+    """True when `stored` is legacy or uses different cost parameters than `params`"""
+    params = params or DEFAULT_PARAMS
+    try:
+        stored_params, salt, _ = parse_hash(stored)
+    except (ValueError, KeyError):
+        return True
+    return salt is None or stored_params != params
+
+
+# ----------------------- CALIBRATION -----------------------
+
+def time_verify(params, rounds=3):
+    """Median seconds for one verify with `params`"""
+    stored = hash_password("calibration-password", params)
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        verify_password("calibration-password", stored)
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return samples[len(samples) // 2]
+
+
+def calibrate(target_seconds=0.05, algorithm="scrypt", max_steps=12):
+    """Pick the cost whose verify time is closest to `target_seconds`.
+
+    For scrypt `n` is doubled (r=8, p=1) until the target is passed, then the
+    nearer of the last two steps wins; for PBKDF2 the iteration count is
+    scaled from a measured baseline. Returns (params, measured_seconds).
+    """
+    if algorithm == "scrypt":
+        params = {"algorithm": "scrypt", "n": 2 ** 10, "r": 8, "p": 1}
+        elapsed = time_verify(params)
+        previous = (params, elapsed)
+        for _ in range(max_steps):
+            if elapsed >= target_seconds:
+                break
+            previous = (params, elapsed)
+            params = dict(params, n=params["n"] * 2)
+            elapsed = time_verify(params)
+        if abs(previous[1] - target_seconds) < abs(elapsed - target_seconds):
+            return previous
+        return params, elapsed
+
+    if algorithm == "pbkdf2_sha256":
+        base = {"algorithm": "pbkdf2_sha256", "iterations": 10_000}
+        per_iteration = time_verify(base) / base["iterations"]
+        iterations = max(base["iterations"], int(target_seconds / per_iteration))
+        params = {"algorithm": "pbkdf2_sha256", "iterations": iterations}
+        return params, time_verify(params)
+
+    raise ValueError(f"Unknown password hash algorithm: {algorithm}")
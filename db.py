@@ -0,0 +1,83 @@
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+
+DEFAULT_POOL_SIZE = 8
+DEFAULT_TIMEOUT = 10.0
+# NORMAL in WAL mode survives an application crash but may lose the last
+# commits on power loss; FULL fsyncs the WAL on every commit.
+DEFAULT_SYNCHRONOUS = "NORMAL"
+
+
+# ----------------------- CONNECTION POOL -----------------------
+
+class ConnectionPool:
+    """Process-wide pool of SQLite connections in WAL mode.
+
+    Streamlit runs each session on its own thread, so connections are
+    checked out per operation instead of being tied to a thread. At most
+    `size` connections are opened; extra callers wait for one to be returned.
+    """
+
+    def __init__(self, path, size=DEFAULT_POOL_SIZE, timeout=DEFAULT_TIMEOUT,
+                 synchronous=DEFAULT_SYNCHRONOUS):
+        self.path = path
+        self.size = size
+        self.timeout = timeout
+        self.synchronous = synchronous
+        self._idle = queue.LifoQueue()
+        self._opened = 0
+        self._lock = threading.Lock()
+
+    def _open(self):
+        conn = sqlite3.connect(self.path, timeout=self.timeout, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA synchronous={self.synchronous}")
+        return conn
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._opened < self.size:
+                self._opened += 1
+                try:
+                    return self._open()
+                except Exception:
+                    self._opened -= 1
+                    raise
+        return self._idle.get(timeout=self.timeout)
+
+    @contextmanager
+    def connection(self):
+        """Check out a connection; any open transaction is rolled back on error"""
+        conn = self._acquire()
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            self._idle.put(conn)
+
+    @contextmanager
+    def transaction(self, immediate=True):
+        """Connection inside BEGIN IMMEDIATE ... COMMIT"""
+        with self.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+            yield conn
+            conn.commit()
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+        with self._lock:
+            self._opened = 0
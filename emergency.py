@@ -0,0 +1,131 @@
+import json
+import re
+
+
+# Regex fragments, one per concept. Inflections are spelled out as optional
+# suffixes so a single pass over the text handles "harass", "harassed",
+# "harassment" and so on without a lemmatizer.
+DEFAULT_LEXICON = {
+    "english": [
+        r"danger(?:s|ous)?",
+        r"threat(?:s|en(?:s|ed|ing)?)?",
+        r"harass(?:es|ed|ing|ment)?",
+        r"violen(?:ce|t)",
+        r"kidnap(?:s|ped|ping|per|pers)?",
+        r"abduct(?:s|ed|ing|ion)?",
+        r"assault(?:s|ed|ing)?",
+        r"rap(?:e|ed|ist)",
+        r"sexual(?:ly)?\s+abus(?:e|ed|ing)",
+        r"beat(?:s|ing|en)?\s+(?:me|us|my|her|him)",
+        r"hit(?:s|ting)?\s+(?:me|us)",
+        r"stalk(?:s|ed|ing|er)?",
+        r"blackmail(?:s|ed|ing|er)?",
+        r"kill(?:s|ed|ing)?\s+(?:me|us|my|her|him)",
+        r"(?:going|want(?:s)?)\s+to\s+kill",
+        # "emergency" and "attack" alone also mean heart attacks and emergency
+        # passports, so like "kill" and "beat" they need a person or a plea
+        r"(?:is|it'?s|have|in)\s+an?\s+emergency",
+        r"emergency[\s,!.]+(?:please\s+)?help",
+        r"unsafe",
+        r"attack(?:s|ed|ing)?\s+(?:me|us|my|her|him|them)",
+        r"(?:was|were|got|been|being|is|are)\s+(?:\w+\s+)?attacked\s+(?:by|outside|at|in|on|with)",
+        r"(?:locked|trapped)\s+(?:me|in)",
+        r"domestic\s+abuse",
+        r"acid\s+attack",
+    ],
+    "roman_urdu": [
+        r"khat(?:a)?ra",
+        r"dhamk(?:i|iyan|iyaan|ee)",
+        r"a(?:g|gh)wa",
+        r"ighwa",
+        r"tashadd?ud",
+        r"maar\s*(?:peet|pitai|rahe|raha|rahi|dega|denge|dunga)",
+        r"mar\s+(?:dunga|denge|dega)",
+        r"jaan\s+(?:ka|ko)\s+khat(?:a)?ra",
+        r"bacha(?:o|ao|lo)",
+        r"zabardast(?:i|ee)",
+        r"z(?:i)?yad(?:a)?t(?:i|ee)",
+        r"pareshan\s+kar\s+(?:raha|rahe|rahi)",
+        r"tang\s+kar\s+(?:raha|rahe|rahi)",
+        r"peecha\s+kar\s+(?:raha|rahe|rahi)",
+    ],
+    "urdu": [
+        r"خطر[ہے]",
+        r"دھمک[یی]",
+        r"دھمکیاں",
+        r"اغوا",
+        r"ہراساں",
+        r"ہراسانی",
+        r"تشدد",
+        r"زیادتی",
+        r"بچاؤ",
+        r"مار\s+(?:رہا|رہے|رہی|دے)",
+        r"جان\s+کا\s+خطرہ",
+        r"قتل",
+        r"بلیک\s*میل",
+    ],
+}
+
+# Phrases that contain an emergency word but are not about physical safety.
+# They are tried before the lexicon at each position, so the longer benign
+# phrase is consumed first.
+DEFAULT_NEGATIONS = [
+    r"threat(?:s|en(?:s|ed|ing)?)?\s+(?:\w+\s+)?to\s+(?:sue|file|take\s+(?:me\s+)?to\s+court|complain|report|evict|cancel|fire|disconnect)",
+    r"legal\s+(?:threat|notice)s?",
+    r"no\s+(?:danger|threat)",
+    r"(?:not|never)\s+(?:in\s+)?danger",
+    r"danger(?:ous)?\s+driving",
+    r"traffic\s+violation",
+    r"dangerous\s+goods",
+    r"(?:any|some)\s+danger\s+in",
+    r"threat\s+assessment",
+    r"harassment\s+(?:policy|policies|law|laws|act)",
+]
+
+
+# ----------------------- CLASSIFIER -----------------------
+
+def load_lexicon(path):
+    """Read {"lexicon": {language: [patterns]}, "negations": [patterns]} from JSON"""
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return data.get("lexicon", DEFAULT_LEXICON), data.get("negations", DEFAULT_NEGATIONS)
+
+
+class EmergencyClassifier:
+    """Single-pass emergency detector over English, Roman Urdu and Urdu text.
+
+    The whole lexicon is compiled into one alternation with word boundaries,
+    so classifying a message is one linear scan regardless of lexicon size.
+    `normalize` can be set to a lemmatizing preprocessor to match on lemmas.
+    A message counts as an emergency when at least `min_hits` distinct
+    lexicon terms match outside of a negation phrase.
+    """
+
+    def __init__(self, lexicon=None, negations=None, min_hits=1, normalize=None):
+        lexicon = DEFAULT_LEXICON if lexicon is None else lexicon
+        negations = DEFAULT_NEGATIONS if negations is None else negations
+        positives = [pattern for patterns in lexicon.values() for pattern in patterns]
+        self.min_hits = min_hits
+        self.normalize = normalize
+        self.pattern = re.compile(
+            r"(?<!\w)(?:(?P<neg>" + "|".join(negations or [r"(?!)"]) + r")"
+            r"|(?P<pos>" + "|".join(positives) + r"))(?!\w)",
+            re.IGNORECASE,
+        )
+
+    def matches(self, text):
+        """Distinct emergency terms found in `text`, in order of appearance"""
+        if self.normalize is not None:
+            text = self.normalize(text)
+        found = []
+        for match in self.pattern.finditer(text):
+            term = match.group("pos")
+            if term and term.lower() not in found:
+                found.append(term.lower())
+        return found
+
+    def is_emergency(self, text):
+        return len(self.matches(text)) >= self.min_hits
+
+    __call__ = is_emergency
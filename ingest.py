@@ -0,0 +1,328 @@
+import csv
+import hashlib
+import json
+import logging
+import os
+import threading
+
+import numpy as np
+
+from retrieval import (
+    DEFAULT_FUZZY_THRESHOLD,
+    DEFAULT_RANKING,
+    DEFAULT_THRESHOLD,
+    DEFAULT_TOP_K,
+    DEFAULT_TOPIC_BOOST,
+    RetrievalEngine,
+)
+from retrieval_index import (
+    DEFAULT_CACHE_DIR,
+    build_delta_index,
+    load_or_build_index_from_rows,
+)
+
+
+DEFAULT_MERGE_RATIO = 0.25
+DEFAULT_WATCH_INTERVAL = 30.0
+
+logger = logging.getLogger("paklaw.ingest")
+
+
+# ----------------------- SOURCES -----------------------
+
+def expand_paths(paths):
+    """Files to ingest: plain files as given, directories as their *.csv / *.jsonl, sorted"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(
+                os.path.join(path, name)
+                for name in sorted(os.listdir(path))
+                if name.endswith((".csv", ".jsonl"))
+            )
+        elif os.path.exists(path):
+            files.append(path)
+    return files
+
+
+def iter_rows(paths):
+    """Stream {"Topic", "Details"} rows from CSV and JSONL files"""
+    for path in expand_paths(paths):
+        if path.endswith(".jsonl"):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if line:
+                        row = json.loads(line)
+                        yield {"Topic": str(row["Topic"]), "Details": str(row["Details"])}
+        else:
+            with open(path, "r", encoding="utf-8", newline="") as f:
+                for row in csv.DictReader(f):
+                    yield {"Topic": str(row["Topic"]), "Details": str(row["Details"])}
+
+
+def row_key(row):
+    """Identity of a knowledge-base entry: its Topic, case- and space-insensitive"""
+    return " ".join(row["Topic"].lower().split())
+
+
+def row_hash(row):
+    return hashlib.sha256(f"{row['Topic']}\0{row['Details']}".encode()).hexdigest()
+
+
+# ----------------------- SEGMENTS -----------------------
+
+class Segment:
+    """One immutable RetrievalIndex plus the keys of its rows and a live-row mask"""
+
+    __slots__ = ("index", "engine", "keys", "rows", "live")
+
+    def __init__(self, index, engine, keys, rows, live):
+        self.index = index
+        self.engine = engine
+        self.keys = keys
+        self.rows = rows
+        self.live = live
+
+
+class Snapshot:
+    """The set of segments searched by one query. Never mutated once published."""
+
+    def __init__(self, segments, generation):
+        self.segments = segments
+        self.generation = generation
+
+    def __len__(self):
+        return int(sum(segment.live.sum() for segment in self.segments))
+
+    def search(self, query, k=None, threshold=None):
+        if not self.segments:
+            return []
+        k = k or self.segments[0].engine.k
+        # Fuzzy matching only runs if no segment has a word match
+        hits = self._merge(
+            [segment.engine.search(query, k, threshold, live=segment.live, fuzzy=False)
+             for segment in self.segments], k
+        )
+        if not hits and self.segments[0].engine.fuzzy_threshold is not None:
+            hits = self._merge(
+                [segment.engine.fuzzy_search(query, k, live=segment.live)
+                 for segment in self.segments], k
+            )
+        return hits
+
+    @staticmethod
+    def _merge(results, k):
+        hits = [hit for segment_hits in results for hit in segment_hits]
+        hits.sort(key=lambda hit: hit.score, reverse=True)
+        return hits[:k]
+
+    def best(self, query, threshold=None):
+        hits = self.search(query, k=1, threshold=threshold)
+        return hits[0] if hits else None
+
+
+# ----------------------- PIPELINE -----------------------
+
+class IngestionPipeline:
+    """Keeps the offline index in step with its source files without full refits.
+
+    New or changed rows (detected by per-row hash) go into a small delta
+    segment and the rows they replace are masked out of older segments.
+    Deltas are indexed on the base segment's term statistics, so scores from
+    every segment are on one scale and can be merged by sorting.
+    When the deltas grow past `merge_ratio` of the corpus, every live row is
+    merged back into one base segment in a background thread. Each change
+    publishes a new Snapshot by swapping one attribute, so sessions that are
+    mid-query keep using the old one and nobody waits on a rebuild.
+    """
+
+    def __init__(self, paths, preprocess, chunk_words=None, cache_dir=DEFAULT_CACHE_DIR,
+                 k=DEFAULT_TOP_K, threshold=DEFAULT_THRESHOLD, topic_boost=DEFAULT_TOPIC_BOOST,
+                 ranking=DEFAULT_RANKING, fuzzy_threshold=DEFAULT_FUZZY_THRESHOLD,
+                 merge_ratio=DEFAULT_MERGE_RATIO):
+        self.paths = list(paths)
+        self.preprocess = preprocess
+        self.chunk_words = chunk_words
+        self.cache_dir = cache_dir
+        self.engine_options = {
+            "k": k,
+            "threshold": threshold,
+            "topic_boost": topic_boost,
+            "ranking": ranking,
+            "fuzzy_threshold": fuzzy_threshold,
+        }
+        self.merge_ratio = merge_ratio
+        self.current = Snapshot([], 0)
+        self.manifest = {}  # key -> (row hash, segment number, row number)
+        self._lock = threading.Lock()
+        self._merging = False
+        self._watcher = None
+        self._stop = threading.Event()
+        self._mtimes = {}
+
+        rows = self._dedupe(iter_rows(self.paths))
+        self._mtimes = self._source_mtimes()
+        self._publish([self._base_segment(rows)])
+
+    # ----------------------- QUERIES -----------------------
+
+    def search(self, query, k=None, threshold=None):
+        return self.current.search(query, k, threshold)
+
+    def best(self, query, threshold=None):
+        return self.current.best(query, threshold)
+
+    @property
+    def vectorizer(self):
+        """Vectorizer of the base segment, for callers that need a fixed vocabulary"""
+        return self.current.segments[0].index.vectorizer
+
+    # ----------------------- UPDATES -----------------------
+
+    def ingest(self, paths=None, full_sync=True):
+        """Apply changes from `paths` (default: the configured sources).
+
+        With `full_sync`, entries missing from the sources are removed.
+        Returns the number of rows added, changed or removed.
+        """
+        rows = self._dedupe(iter_rows(paths or self.paths))
+        with self._lock:
+            snapshot = self.current
+            manifest = dict(self.manifest)
+            changed = [
+                row for row in rows
+                if manifest.get(row_key(row), (None,))[0] != row_hash(row)
+            ]
+            removed = set(manifest) - {row_key(row) for row in rows} if full_sync else set()
+            if not changed and not removed:
+                return 0
+
+            segments = list(snapshot.segments)
+            copied = set()
+            for key in removed | {row_key(row) for row in changed}:
+                if key not in manifest:
+                    continue
+                _, seg_no, row_no = manifest.pop(key)
+                if seg_no not in copied:
+                    old = segments[seg_no]
+                    segments[seg_no] = Segment(old.index, old.engine, old.keys, old.rows,
+                                               old.live.copy())
+                    copied.add(seg_no)
+                segments[seg_no].live[row_no] = False
+
+            if changed:
+                segments.append(self._segment(changed, build_delta_index(
+                    [row["Topic"] for row in changed],
+                    [row["Details"] for row in changed],
+                    self.preprocess,
+                    segments[0].index,
+                    chunk_words=self.chunk_words,
+                )))
+            self._publish(segments)
+
+        if self._needs_merge():
+            self.merge_async()
+        return len(changed) + len(removed)
+
+    def merge(self):
+        """Fold every live row into a single freshly fitted base segment"""
+        with self._lock:
+            try:
+                rows = [
+                    row
+                    for segment in self.current.segments
+                    for row, live in zip(segment.rows, segment.live)
+                    if live
+                ]
+                self._publish([self._base_segment(rows)])
+            finally:
+                self._merging = False
+
+    def merge_async(self):
+        with self._lock:
+            if self._merging:
+                return
+            self._merging = True
+        threading.Thread(target=self.merge, name="index-merge", daemon=True).start()
+
+    def watch(self, interval=DEFAULT_WATCH_INTERVAL):
+        """Poll the source files and ingest whenever one of them changes"""
+        if self._watcher is not None:
+            return self
+        self._watcher = threading.Thread(
+            target=self._watch, args=(interval,), name="index-watch", daemon=True
+        )
+        self._watcher.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    # ----------------------- INTERNALS -----------------------
+
+    def _watch(self, interval):
+        while not self._stop.wait(interval):
+            mtimes = self._source_mtimes()
+            if mtimes != self._mtimes:
+                self._mtimes = mtimes
+                try:
+                    self.ingest()
+                except (OSError, ValueError, KeyError):
+                    # A half-written file; try again on the next tick
+                    self._mtimes = {}
+                except Exception:
+                    # Keep watching: the current snapshot is still served
+                    logger.exception("knowledge base ingest failed")
+                    self._mtimes = {}
+
+    def _source_mtimes(self):
+        mtimes = {}
+        for path in expand_paths(self.paths):
+            try:
+                mtimes[path] = os.stat(path).st_mtime_ns
+            except OSError:
+                pass
+        return mtimes
+
+    def _needs_merge(self):
+        segments = self.current.segments
+        if len(segments) < 2:
+            return False
+        base_rows = len(segments[0].rows)
+        delta_rows = sum(len(segment.rows) for segment in segments[1:])
+        return delta_rows > self.merge_ratio * max(base_rows, 1)
+
+    @staticmethod
+    def _dedupe(rows):
+        """Last occurrence of each key wins, in first-seen order"""
+        by_key = {}
+        for row in rows:
+            by_key[row_key(row)] = row
+        return list(by_key.values())
+
+    def _base_segment(self, rows):
+        # The base goes through the on-disk artifact cache, so restarts and
+        # merges that land on an already-seen corpus just memory-map it.
+        index = load_or_build_index_from_rows(
+            [row["Topic"] for row in rows],
+            [row["Details"] for row in rows],
+            self.preprocess,
+            cache_dir=self.cache_dir,
+            chunk_words=self.chunk_words,
+        )
+        return self._segment(rows, index)
+
+    def _segment(self, rows, index):
+        engine = RetrievalEngine(index, self.preprocess, **self.engine_options)
+        return Segment(index, engine, [row_key(row) for row in rows], rows,
+                       np.ones(len(rows), dtype=bool))
+
+    def _publish(self, segments):
+        manifest = {}
+        for seg_no, segment in enumerate(segments):
+            for row_no, (key, row, live) in enumerate(zip(segment.keys, segment.rows, segment.live)):
+                if live:
+                    manifest[key] = (row_hash(row), seg_no, row_no)
+        self.manifest = manifest
+        self.current = Snapshot(segments, self.current.generation + 1)
@@ -0,0 +1,273 @@
+"""In-process metrics: stage timers, counters and a Prometheus text endpoint.
+
+Everything is off unless PAKLAW_METRICS=1. When off, span() hands back one
+shared no-op context manager and inc()/observe() return at their first line,
+so instrumented code pays about one attribute check per call.
+
+    PAKLAW_METRICS=1         record metrics
+    PAKLAW_METRICS_PORT=9464 serve them at http://127.0.0.1:<port>/metrics
+    PAKLAW_METRICS_LOG=1     also log every span as one JSON line ("paklaw.metrics")
+"""
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192)
+BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+logger = logging.getLogger("paklaw.metrics")
+
+_NOOP = nullcontext()
+
+
+# ----------------------- METRIC TYPES -----------------------
+
+def _labels_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(key):
+    if not key:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in key) + "}"
+
+
+def _format_number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, registry, name, help_text):
+        self.registry = registry
+        self.name = name
+        self.help = help_text
+        self._values = {}
+
+    def inc(self, value=1, **labels):
+        if not self.registry.enabled:
+            return
+        key = _labels_key(labels)
+        with self.registry.lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def value(self, **labels):
+        return self._values.get(_labels_key(labels), 0)
+
+    def samples(self):
+        for key, value in sorted(self._values.items()):
+            yield self.name, key, value
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, registry, name, help_text, buckets=SECONDS_BUCKETS):
+        self.registry = registry
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self._series = {}  # labels -> [bucket counts..., sum, count]
+
+    def observe(self, value, **labels):
+        if not self.registry.enabled:
+            return
+        key = _labels_key(labels)
+        with self.registry.lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def count(self, **labels):
+        series = self._series.get(_labels_key(labels))
+        return series[-1] if series else 0
+
+    def samples(self):
+        for key, series in sorted(self._series.items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets, series):
+                cumulative += n
+                yield self.name + "_bucket", key + (("le", _format_number(bound)),), cumulative
+            yield self.name + "_bucket", key + (("le", "+Inf"),), series[-1]
+            yield self.name + "_sum", key, series[-2]
+            yield self.name + "_count", key, series[-1]
+
+
+# ----------------------- REGISTRY -----------------------
+
+class Metrics:
+    """Named counters and histograms plus collectors read at scrape time.
+
+    Collectors are callables returning [(name, kind, help, {labels: value})];
+    they report state that already lives elsewhere (cache and scheduler
+    stats) without adding work to the request path.
+    """
+
+    def __init__(self, enabled=False, log_json=False):
+        self.enabled = enabled
+        self.log_json = log_json
+        self.lock = threading.Lock()
+        self._metrics = {}
+        self._collectors = []
+
+    def counter(self, name, help_text):
+        return self._register(name, lambda: Counter(self, name, help_text))
+
+    def histogram(self, name, help_text, buckets=SECONDS_BUCKETS):
+        return self._register(name, lambda: Histogram(self, name, help_text, buckets))
+
+    def _register(self, name, factory):
+        with self.lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = factory()
+        return metric
+
+    def add_collector(self, collector):
+        self._collectors.append(collector)
+
+    def span(self, stage, **labels):
+        """Time a block into paklaw_stage_seconds{stage=...}"""
+        if not self.enabled:
+            return _NOOP
+        return _Span(self, stage, labels)
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        with self.lock:
+            for metric in self._metrics.values():
+                lines.append(f"# HELP {metric.name} {metric.help}")
+                lines.append(f"# TYPE {metric.name} {metric.kind}")
+                for name, key, value in metric.samples():
+                    lines.append(f"{name}{_format_labels(key)} {_format_number(value)}")
+        for collector in self._collectors:
+            for name, kind, help_text, values in collector():
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in values.items():
+                    lines.append(f"{name}{_format_labels(labels)} {_format_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+class _Span:
+    __slots__ = ("metrics", "stage", "labels", "start")
+
+    def __init__(self, metrics, stage, labels):
+        self.metrics = metrics
+        self.stage = stage
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.start
+        STAGE_SECONDS.observe(elapsed, stage=self.stage)
+        # GeneratorExit means the caller stopped reading a stream, not a failure
+        if exc_type is not None and exc_type is not GeneratorExit:
+            STAGE_ERRORS.inc(stage=self.stage)
+        if self.metrics.log_json:
+            logger.info(json.dumps({
+                "event": "span", "stage": self.stage, "ms": round(elapsed * 1000, 3),
+                "error": exc_type.__name__ if exc_type else None, **self.labels,
+            }))
+        return False
+
+
+METRICS = Metrics(
+    enabled=os.getenv("PAKLAW_METRICS") == "1",
+    log_json=os.getenv("PAKLAW_METRICS_LOG") == "1",
+)
+span = METRICS.span
+
+STAGE_SECONDS = METRICS.histogram(
+    "paklaw_stage_seconds", "Time spent in each stage of a request")
+STAGE_ERRORS = METRICS.counter(
+    "paklaw_stage_errors_total", "Stages that ended with an exception")
+TURNS = METRICS.counter(
+    "paklaw_turns_total", "Chat turns answered, by route (emergency, cache, online, offline)")
+OFFLINE_FALLBACKS = METRICS.counter(
+    "paklaw_offline_fallbacks_total", "Turns answered offline, by reason")
+LOGINS = METRICS.counter(
+    "paklaw_logins_total", "Login attempts, by result")
+MODEL_CALLS = METRICS.counter(
+    "paklaw_model_calls_total", "Model calls, by label and outcome")
+MODEL_TTFT = METRICS.histogram(
+    "paklaw_model_first_chunk_seconds", "Time to the first streamed chunk of a model call")
+MODEL_TOKENS = METRICS.histogram(
+    "paklaw_model_tokens", "Estimated tokens per model call (about 4 characters per token)",
+    TOKEN_BUCKETS)
+CHAT_WRITE_SECONDS = METRICS.histogram(
+    "paklaw_chat_write_seconds", "Time to commit one batch of queued chat writes")
+CHAT_WRITE_LAG = METRICS.histogram(
+    "paklaw_chat_write_lag_seconds", "Time from queueing a chat write to its commit")
+CHAT_WRITE_BATCH = METRICS.histogram(
+    "paklaw_chat_write_batch_chats", "Chats written per batch", BATCH_BUCKETS)
+
+
+def record_model_call(stats):
+    """LatencyRecorder listener: one model call's outcome, first-chunk time and token sizes"""
+    if not METRICS.enabled:
+        return
+    MODEL_CALLS.inc(label=stats.label, ok=str(stats.ok).lower())
+    if stats.ttft is not None:
+        MODEL_TTFT.observe(stats.ttft, label=stats.label)
+    MODEL_TOKENS.observe((stats.prompt_chars + 3) // 4, label=stats.label, direction="input")
+    MODEL_TOKENS.observe((stats.chars + 3) // 4, label=stats.label, direction="output")
+
+
+def record_chat_write(stats):
+    """WriteBehindChatStore listener: commit time, queueing lag and size of one batch"""
+    if not METRICS.enabled:
+        return
+    CHAT_WRITE_SECONDS.observe(stats.seconds)
+    CHAT_WRITE_LAG.observe(stats.lag)
+    CHAT_WRITE_BATCH.observe(stats.chats)
+
+
+# ----------------------- ENDPOINT -----------------------
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = METRICS.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port, host="127.0.0.1"):
+    """Serve /metrics from a daemon thread; returns the server"""
+    server = ThreadingHTTPServer((host, port), _Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
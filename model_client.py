@@ -0,0 +1,180 @@
+import random
+import threading
+import time
+from collections import deque
+
+
+DEFAULT_TIMEOUT = 20
+DEFAULT_KEEP_PROMPTS = 100
+
+
+# ----------------------- LATENCY RECORDING -----------------------
+
+class CallStats:
+    """Timing of one model call: time to first chunk and total time, in seconds,
+    plus the characters sent (prompt_chars) and received (chars)"""
+
+    __slots__ = ("label", "ttft", "total", "chars", "ok", "prompt_chars")
+
+    def __init__(self, label, ttft, total, chars, ok, prompt_chars=0):
+        self.label = label
+        self.ttft = ttft
+        self.total = total
+        self.chars = chars
+        self.ok = ok
+        self.prompt_chars = prompt_chars
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class LatencyRecorder:
+    """Keeps the most recent CallStats and hands each one to optional listeners"""
+
+    def __init__(self, maxlen=1000):
+        self.calls = deque(maxlen=maxlen)
+        self.listeners = []
+        self._lock = threading.Lock()
+
+    def record(self, stats):
+        with self._lock:
+            self.calls.append(stats)
+        for listener in self.listeners:
+            listener(stats)
+
+    def recent(self, n=None):
+        with self._lock:
+            calls = list(self.calls)
+        return calls if n is None else calls[-n:]
+
+
+def prompt_length(prompt, system=None):
+    """Characters of text in a string or Gemini-style contents prompt"""
+    if isinstance(prompt, str):
+        total = len(prompt)
+    else:
+        total = sum(
+            len(part) for content in prompt for part in content.get("parts", ())
+            if isinstance(part, str)
+        )
+    return total + len(system or "")
+
+
+def timed_stream(chunks, recorder, label="", prompt_chars=0):
+    """Yield from `chunks`, recording time to first chunk and total latency"""
+    start = time.perf_counter()
+    ttft = None
+    chars = 0
+    ok = False
+    try:
+        for chunk in chunks:
+            if ttft is None:
+                ttft = time.perf_counter() - start
+            chars += len(chunk)
+            yield chunk
+        ok = True
+    finally:
+        recorder.record(
+            CallStats(label, ttft, time.perf_counter() - start, chars, ok, prompt_chars)
+        )
+
+
+# ----------------------- CLIENTS -----------------------
+
+class ModelClient:
+    """Interface the app talks to. Subclasses implement `_stream`.
+
+    `prompt` is a string or a list of Gemini-style contents
+    ({"role": "user" | "model", "parts": [...]}); `system` is an optional
+    system instruction sent alongside it.
+    """
+
+    def __init__(self, recorder=None):
+        self.recorder = recorder or LatencyRecorder()
+
+    def stream(self, prompt, label="", system=None):
+        """Yield response text chunks as they arrive"""
+        return timed_stream(
+            self._stream(prompt, system), self.recorder, label, prompt_length(prompt, system)
+        )
+
+    def generate(self, prompt, label="", system=None):
+        return "".join(self.stream(prompt, label, system))
+
+    def _stream(self, prompt, system):
+        raise NotImplementedError
+
+
+class GeminiClient(ModelClient):
+    """Streams from google.generativeai GenerativeModels.
+
+    The SDK fixes the system instruction when the model object is created,
+    so `model_factory(system_instruction)` is called once per distinct
+    system prompt and the result is reused.
+    """
+
+    def __init__(self, model_factory, timeout=DEFAULT_TIMEOUT, recorder=None):
+        super().__init__(recorder)
+        self.model_factory = model_factory
+        self.timeout = timeout
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def model_for(self, system):
+        with self._lock:
+            model = self._models.get(system)
+            if model is None:
+                model = self._models[system] = self.model_factory(system)
+        return model
+
+    def _stream(self, prompt, system):
+        response = self.model_for(system).generate_content(
+            prompt, stream=True, request_options={"timeout": self.timeout}
+        )
+        for chunk in response:
+            try:
+                text = chunk.text
+            except ValueError:
+                # Chunks without text parts (e.g. finish or safety metadata)
+                continue
+            if text:
+                yield text
+
+
+class FakeModelClient(ModelClient):
+    """Local stand-in that streams a canned or computed reply.
+
+    `reply` is a string or a callable taking the prompt. `first_chunk_delay`
+    and `chunk_delay` simulate network latency, `error` is raised instead of
+    answering when set, and `error_rate` makes that happen on a random
+    fraction of calls (a ConnectionError if `error` is not set). `prompts`
+    holds the last `keep_prompts` (system, prompt) pairs sent, so a long load
+    test does not grow without bound.
+    """
+
+    def __init__(self, reply="This is general guidance based on Pakistani procedures.",
+                 chunk_size=16, first_chunk_delay=0.0, chunk_delay=0.0, error=None,
+                 error_rate=0.0, seed=None, recorder=None, keep_prompts=DEFAULT_KEEP_PROMPTS):
+        super().__init__(recorder)
+        self.reply = reply
+        self.chunk_size = chunk_size
+        self.first_chunk_delay = first_chunk_delay
+        self.chunk_delay = chunk_delay
+        self.error = error
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.prompts = deque(maxlen=keep_prompts)
+
+    def _stream(self, prompt, system):
+        self.prompts.append((system, prompt))
+        if self.first_chunk_delay:
+            time.sleep(self.first_chunk_delay)
+        if self.error_rate and self.rng.random() < self.error_rate:
+            raise self.error or ConnectionError("injected model failure")
+        if self.error is not None and not self.error_rate:
+            raise self.error
+        text = self.reply(prompt) if callable(self.reply) else self.reply
+        for start in range(0, len(text), self.chunk_size):
+            if start and self.chunk_delay:
+                time.sleep(self.chunk_delay)
+            yield text[start:start + self.chunk_size]
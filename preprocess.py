@@ -0,0 +1,114 @@
+import os
+import string
+import sys
+from functools import lru_cache
+
+import nltk
+from nltk.corpus import stopwords
+from nltk.stem import WordNetLemmatizer
+
+
+DEFAULT_LEMMA_CACHE_SIZE = 50_000
+
+# Corpora are vendored next to the app (or found on the usual NLTK search
+# path); nothing is downloaded while the app is running.
+NLTK_DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "nltk_data")
+NLTK_RESOURCES = {
+    "stopwords": "corpora/stopwords",
+    "wordnet": "corpora/wordnet",
+    "omw-1.4": "corpora/omw-1.4",
+}
+
+
+# ----------------------- NLTK DATA -----------------------
+
+def missing_nltk_data(data_dir=NLTK_DATA_DIR):
+    """Names of the required corpora that are not installed locally"""
+    if data_dir not in nltk.data.path:
+        nltk.data.path.insert(0, data_dir)
+    missing = []
+    for name, resource in NLTK_RESOURCES.items():
+        try:
+            nltk.data.find(resource)
+        except LookupError:
+            missing.append(name)
+    return missing
+
+
+def ensure_nltk_data(data_dir=NLTK_DATA_DIR):
+    """Check the corpora are available offline; raise LookupError naming any that aren't"""
+    missing = missing_nltk_data(data_dir)
+    if missing:
+        raise LookupError(
+            f"NLTK data not installed: {', '.join(missing)}. "
+            f"Run `python preprocess.py` once to vendor it into {data_dir}."
+        )
+
+
+def download_nltk_data(data_dir=NLTK_DATA_DIR):
+    """One-off setup step: fetch the required corpora into `data_dir`"""
+    for name in NLTK_RESOURCES:
+        nltk.download(name, download_dir=data_dir, quiet=True)
+    return missing_nltk_data(data_dir)
+
+
+# ----------------------- PREPROCESSOR -----------------------
+
+class Preprocessor:
+    """Punctuation strip, stopword filter and verb lemmatization with shared state.
+
+    The punctuation table, stopword set and lemmatizer are built once, and
+    per-token lemmas are memoized in a bounded LRU cache, so calling this for
+    every corpus row and every query does no repeated setup work.
+
+    With `basic=True` no NLTK data is needed: scikit-learn's English stopword
+    list is used and words are not lemmatized. `tag` tells the two apart, so
+    index artifacts built with one are never loaded for the other.
+    """
+
+    def __init__(self, language="english", lemma_cache_size=DEFAULT_LEMMA_CACHE_SIZE,
+                 basic=False):
+        self.punctuation_table = str.maketrans("", "", string.punctuation)
+        if basic:
+            from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
+
+            self.tag = "basic"
+            self.stop_words = frozenset(ENGLISH_STOP_WORDS)
+            self._lemma = lru_cache(maxsize=lemma_cache_size)(lambda word: word)
+            return
+        self.tag = ""
+        self.stop_words = frozenset(stopwords.words(language))
+        lemmatizer = WordNetLemmatizer()
+        self._lemma = lru_cache(maxsize=lemma_cache_size)(
+            lambda word: lemmatizer.lemmatize(word, pos="v")
+        )
+
+    def tokens(self, text):
+        """Return the cleaned, lemmatized tokens of one text"""
+        stop_words = self.stop_words
+        lemma = self._lemma
+        return [
+            lemma(word)
+            for word in text.translate(self.punctuation_table).split()
+            if word.lower() not in stop_words
+        ]
+
+    def transform(self, text):
+        return " ".join(self.tokens(text))
+
+    __call__ = transform
+
+    def transform_many(self, texts):
+        """Stream preprocessed strings for an iterable of texts"""
+        for text in texts:
+            yield self.transform(text)
+
+    def cache_info(self):
+        return self._lemma.cache_info()
+
+
+if __name__ == "__main__":
+    missing = download_nltk_data()
+    if missing:
+        sys.exit(f"Could not download: {', '.join(missing)}")
+    print(f"NLTK data ready in {NLTK_DATA_DIR}")
@@ -0,0 +1,220 @@
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from db import ConnectionPool
+
+
+DEFAULT_MAX_ENTRIES = 1024
+DEFAULT_TTL = 24 * 3600
+DEFAULT_MAX_DISK_ENTRIES = 50_000
+DEFAULT_SEMANTIC_THRESHOLD = 0.9
+
+_WORD = re.compile(r"\w+")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key      TEXT PRIMARY KEY,
+    context  TEXT NOT NULL,
+    query    TEXT NOT NULL,
+    response TEXT NOT NULL,
+    expires  REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_by_expiry ON responses (expires);
+"""
+
+
+# ----------------------- KEYS -----------------------
+
+def normalize_query(text):
+    """Lower-cased words of a question, in order, without punctuation or extra spaces.
+
+    Every word is kept: "how"/"when", "not" and word order can all change
+    the legal answer, so only formatting differences share a cache entry.
+    """
+    return " ".join(_WORD.findall(text.lower()))
+
+
+def context_key(*parts):
+    """Stable hash of everything besides the question that shapes the answer"""
+    digest = hashlib.sha256()
+    for part in parts:
+        if not isinstance(part, str):
+            part = json.dumps(part, sort_keys=True, default=str)
+        digest.update(part.encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+# ----------------------- RESPONSE CACHE -----------------------
+
+class ResponseCache:
+    """Model answers keyed on (normalised question, context hash).
+
+    Lookups try three tiers in order: an in-memory LRU with TTL, an optional
+    SQLite tier that survives restarts, and an optional semantic tier that
+    serves a cached answer for a different wording whose TF-IDF vector is at
+    least `semantic_threshold` similar under the same context. The vectorizer
+    only knows the knowledge-base vocabulary, so a semantic hit also needs
+    both questions to have exactly the same words outside it: "FIR for
+    murder" and "FIR for theft" are not rewordings of each other.
+    Callers decide what is cacheable; the app never caches emergency mode.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL, disk_path=None,
+                 max_disk_entries=DEFAULT_MAX_DISK_ENTRIES, vectorizer=None,
+                 semantic_threshold=DEFAULT_SEMANTIC_THRESHOLD, clock=time.time):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_disk_entries = max_disk_entries
+        self.vectorizer = vectorizer
+        self.semantic_threshold = semantic_threshold
+        self.clock = clock
+        self._memory = OrderedDict()  # key -> (response, expires, context)
+        # context -> {key: (query vector as {col: weight}, words outside the vocabulary,
+        #                  response, expires)}
+        self._vectors = {}
+        self._lock = threading.Lock()
+        self._puts = 0
+        self.stats = {"hits": 0, "memory_hits": 0, "disk_hits": 0, "semantic_hits": 0,
+                      "misses": 0, "evictions": 0}
+
+        self.pool = None
+        if disk_path:
+            self.pool = ConnectionPool(disk_path)
+            with self.pool.connection() as conn:
+                conn.executescript(_SCHEMA)
+
+    @staticmethod
+    def make_key(query, context):
+        return hashlib.sha256(f"{context}\0{query}".encode()).hexdigest()
+
+    def get(self, query, context):
+        """Return a cached answer for the normalised `query` under `context`, or None"""
+        if not query:
+            return None
+        key = self.make_key(query, context)
+        now = self.clock()
+
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self._memory.move_to_end(key)
+                else:
+                    self._drop(key, context)
+                    entry = None
+        if entry is not None:
+            return self._hit("memory_hits", entry[0])
+
+        row = self._disk_get(key, now)
+        if row is not None:
+            response, expires = row
+            self._remember(key, query, context, response, expires)
+            return self._hit("disk_hits", response)
+
+        response = self._semantic_get(query, context, now)
+        if response is not None:
+            return self._hit("semantic_hits", response)
+
+        with self._lock:
+            self.stats["misses"] += 1
+        return None
+
+    def put(self, query, context, response):
+        if not query or not response:
+            return
+        key = self.make_key(query, context)
+        now = self.clock()
+        self._remember(key, query, context, response, now + self.ttl)
+        if self.pool is not None:
+            with self.pool.transaction() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, context, query, response, expires) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (key, context, query, response, now + self.ttl),
+                )
+            self._puts += 1
+            if self._puts % 100 == 0:
+                self._prune_disk(now)
+
+    def info(self):
+        with self._lock:
+            total = self.stats["hits"] + self.stats["misses"]
+            return dict(self.stats, size=len(self._memory),
+                        hit_rate=self.stats["hits"] / total if total else 0.0)
+
+    # ----------------------- TIERS -----------------------
+
+    def _hit(self, tier, response):
+        with self._lock:
+            self.stats["hits"] += 1
+            self.stats[tier] += 1
+        return response
+
+    def _remember(self, key, query, context, response, expires):
+        vector, unknown = self._vectorize(query)
+        with self._lock:
+            self._memory[key] = (response, expires, context)
+            self._memory.move_to_end(key)
+            if vector:
+                self._vectors.setdefault(context, {})[key] = (vector, unknown, response, expires)
+            while len(self._memory) > self.max_entries:
+                old_key, (_, _, old_context) = self._memory.popitem(last=False)
+                self._vectors.get(old_context, {}).pop(old_key, None)
+                self.stats["evictions"] += 1
+
+    def _drop(self, key, context):
+        self._memory.pop(key, None)
+        self._vectors.get(context, {}).pop(key, None)
+
+    def _disk_get(self, key, now):
+        if self.pool is None:
+            return None
+        with self.pool.connection() as conn:
+            row = conn.execute(
+                "SELECT response, expires FROM responses WHERE key = ? AND expires > ?",
+                (key, now),
+            ).fetchone()
+        return (row["response"], row["expires"]) if row else None
+
+    def _prune_disk(self, now):
+        with self.pool.transaction() as conn:
+            conn.execute("DELETE FROM responses WHERE expires <= ?", (now,))
+            conn.execute(
+                "DELETE FROM responses WHERE key IN ("
+                "SELECT key FROM responses ORDER BY expires DESC LIMIT -1 OFFSET ?)",
+                (self.max_disk_entries,),
+            )
+
+    def _vectorize(self, query):
+        """(TF-IDF vector as {col: weight}, words the vectorizer does not know)"""
+        if self.vectorizer is None:
+            return None, None
+        row = self.vectorizer.transform([query])
+        vocabulary = self.vectorizer.vocabulary_
+        unknown = frozenset(
+            term for term in self.vectorizer.build_analyzer()(query) if term not in vocabulary
+        )
+        return dict(zip(row.indices.tolist(), row.data.tolist())), unknown
+
+    def _semantic_get(self, query, context, now):
+        vector, unknown = self._vectorize(query)
+        if not vector:
+            return None
+        best_score, best_response = 0.0, None
+        with self._lock:
+            entries = list(self._vectors.get(context, {}).values())
+        for cached, cached_unknown, response, expires in entries:
+            if expires <= now or cached_unknown != unknown:
+                continue
+            small, large = (vector, cached) if len(vector) <= len(cached) else (cached, vector)
+            score = sum(weight * large.get(col, 0.0) for col, weight in small.items())
+            if score > best_score:
+                best_score, best_response = score, response
+        if best_score >= self.semantic_threshold:
+            return best_response
+        return None
@@ -0,0 +1,236 @@
+import numpy as np
+
+from sections import extract
+
+
+DEFAULT_TOP_K = 3
+DEFAULT_THRESHOLD = 0.3
+DEFAULT_TOPIC_BOOST = 2.0
+
+# How word matches are scored: TF-IDF cosine on the Topic (and passages),
+# normalised BM25F over Topic + Details, or the higher of the two
+RANKING_TFIDF = "tfidf"
+RANKING_BM25F = "bm25f"
+RANKING_HYBRID = "hybrid"
+RANKINGS = (RANKING_TFIDF, RANKING_BM25F, RANKING_HYBRID)
+DEFAULT_RANKING = RANKING_TFIDF
+# Cosine over Topic character n-grams, tried only when no word match clears the threshold
+DEFAULT_FUZZY_THRESHOLD = None
+
+
+# ----------------------- RESULTS -----------------------
+
+class Hit:
+    """One retrieval result: corpus row, score and the passage that matched"""
+
+    __slots__ = ("doc_id", "score", "topic", "details", "passage", "spans")
+
+    def __init__(self, doc_id, score, topic, details, passage=None, spans=None):
+        self.doc_id = doc_id
+        self.score = score
+        self.topic = topic
+        self.details = details
+        self.passage = passage
+        self.spans = spans
+
+    def section(self, names):
+        """Only the named Details sections (see sections.SECTIONS), or None"""
+        if self.spans is None or not names:
+            return None
+        return extract(self.details, self.spans, names)
+
+    def __repr__(self):
+        return f"Hit(doc_id={self.doc_id}, score={self.score:.3f}, topic={self.topic!r})"
+
+
+# ----------------------- SCORING -----------------------
+
+def sparse_scores(csc, query):
+    """Dot product of every row of `csc` with a 1 x V sparse query.
+
+    Only the posting lists of the query's terms are touched, so cost scales
+    with the number of matching rows rather than with the corpus size.
+    Returns (row ids, scores) for rows with a non-zero score.
+    """
+    indptr, indices, data = csc.indptr, csc.indices, csc.data
+    rows, contribs = [], []
+    for col, weight in zip(query.indices, query.data):
+        start, end = indptr[col], indptr[col + 1]
+        if start == end:
+            continue
+        rows.append(indices[start:end])
+        contribs.append(data[start:end] * weight)
+    if not rows:
+        return np.empty(0, dtype=np.int64), np.empty(0)
+
+    rows = np.concatenate(rows)
+    contribs = np.concatenate(contribs)
+    unique_rows, inverse = np.unique(rows, return_inverse=True)
+    return unique_rows, np.bincount(inverse, weights=contribs)
+
+
+def top_k(ids, scores, k):
+    """Best `k` (id, score) pairs, using partial selection instead of a full sort"""
+    if len(scores) > k:
+        part = np.argpartition(-scores, k - 1)[:k]
+        ids, scores = ids[part], scores[part]
+    order = np.argsort(-scores, kind="stable")
+    return ids[order], scores[order]
+
+
+# ----------------------- ENGINE -----------------------
+
+class RetrievalEngine:
+    """Top-k offline search over a RetrievalIndex.
+
+    Rows are L2-normalised by the vectorizer, so the sparse dot product is the
+    cosine similarity. When the index has Details passages, a passage scores
+    (passage + topic_boost * topic) / (1 + topic_boost) and each corpus entry
+    is represented by its best passage.
+
+    BM25F scores are divided by the sum of the query terms' IDFs, which puts
+    them in [0, 1) like the cosine, so one threshold serves every ranking.
+    Query terms the corpus has never seen count in that sum at the mean IDF,
+    so a query that is mostly unknown words cannot clear the threshold on
+    the strength of one known term.
+    The hybrid takes the higher of the two per entry and keeps the TF-IDF
+    passage, if any.
+    If nothing clears it and `fuzzy_threshold` is set, the Topic character
+    n-grams are tried instead, which catches typos and spelling variants.
+    """
+
+    def __init__(self, index, preprocess, k=DEFAULT_TOP_K, threshold=DEFAULT_THRESHOLD,
+                 topic_boost=DEFAULT_TOPIC_BOOST, ranking=DEFAULT_RANKING,
+                 fuzzy_threshold=DEFAULT_FUZZY_THRESHOLD):
+        if ranking not in RANKINGS:
+            raise ValueError(f"ranking must be one of {', '.join(RANKINGS)}")
+        self.index = index
+        self.preprocess = preprocess
+        self.k = k
+        self.threshold = threshold
+        self.topic_boost = topic_boost
+        self.ranking = ranking
+        self.fuzzy_threshold = fuzzy_threshold
+        # Column-major makes each query term's posting list a contiguous slice.
+        # Saved artifacts are already CSC, so tocsc() hands back the memory-mapped
+        # matrix itself; only freshly built indexes are converted.
+        self._topics = index.matrix.tocsc()
+        self._passages = index.passage_matrix.tocsc() if index.chunked else None
+        self._bm25 = index.bm25_matrix.tocsc()
+        self._chars = index.char_matrix.tocsc()
+        term_vectorizer = index.term_vectorizer
+        self._query_terms = term_vectorizer.build_analyzer()
+        self._term_vocabulary = (
+            getattr(term_vectorizer, "vocabulary_", None) or term_vectorizer.vocabulary
+        )
+        self._unseen_idf = float(index.bm25_idf.mean()) if len(index.bm25_idf) else 0.0
+
+    def vectorize(self, query):
+        return self.index.vectorizer.transform([self.preprocess(query)])
+
+    def search(self, query, k=None, threshold=None, live=None, fuzzy=True):
+        """Return up to `k` hits scoring above `threshold`, best first.
+
+        `live` is an optional boolean mask over corpus rows; rows set to False
+        (superseded or deleted entries) are skipped. Pass `fuzzy=False` to
+        leave out the character n-gram fallback.
+        """
+        k = k or self.k
+        threshold = self.threshold if threshold is None else threshold
+        clean = self.preprocess(query)
+        hits = self._hits(*self._score(clean), k, threshold, live)
+        if not hits and fuzzy and self.fuzzy_threshold is not None:
+            hits = self.fuzzy_search(query, k, live, clean=clean)
+        return hits
+
+    def fuzzy_search(self, query, k=None, live=None, clean=None):
+        """Topic character n-gram matches above `fuzzy_threshold` (or any, if unset)"""
+        if clean is None:
+            clean = self.preprocess(query)
+        doc_ids, scores = sparse_scores(self._chars, self.index.char_vectorizer.transform([clean]))
+        threshold = self.fuzzy_threshold or 0.0
+        return self._hits(doc_ids, scores, {}, k or self.k, threshold, live)
+
+    def best(self, query, threshold=None):
+        hits = self.search(query, k=1, threshold=threshold)
+        return hits[0] if hits else None
+
+    def _score(self, clean):
+        """(doc ids, scores, doc id -> passage row) for the configured ranking"""
+        passage_of = {}
+        if self.ranking == RANKING_BM25F:
+            doc_ids, scores = self._score_bm25(clean)
+            return doc_ids, scores, passage_of
+
+        query_vec = self.index.vectorizer.transform([clean])
+        doc_ids, scores = sparse_scores(self._topics, query_vec)
+        if self._passages is not None and query_vec.nnz:
+            doc_ids, scores, passage_of = self._score_passages(query_vec, doc_ids, scores)
+        if self.ranking == RANKING_TFIDF:
+            return doc_ids, scores, passage_of
+
+        bm25_ids, bm25_scores = self._score_bm25(clean)
+        combined = np.zeros(len(self.index))
+        combined[doc_ids] = scores
+        combined[bm25_ids] = np.maximum(combined[bm25_ids], bm25_scores)
+        doc_ids = np.flatnonzero(combined)
+        return doc_ids, combined[doc_ids], passage_of
+
+    def _score_bm25(self, clean):
+        query_vec = self.index.term_vectorizer.transform([clean])
+        if query_vec.nnz == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        # Each query term counts once; scores are over the best possible total,
+        # including the terms no entry contains
+        query_vec.data[:] = 1.0
+        doc_ids, scores = sparse_scores(self._bm25, query_vec)
+        unseen = sum(
+            term not in self._term_vocabulary for term in set(self._query_terms(clean))
+        )
+        total = self.index.bm25_idf[query_vec.indices].sum() + unseen * self._unseen_idf
+        return doc_ids, scores / total
+
+    def _hits(self, doc_ids, scores, passage_of, k, threshold, live):
+        keep = scores > threshold
+        if live is not None:
+            keep &= live[doc_ids]
+        doc_ids, scores = top_k(doc_ids[keep], scores[keep], k)
+        index = self.index
+        return [
+            Hit(
+                int(doc_id),
+                float(score),
+                index.topics[doc_id],
+                index.details[doc_id],
+                index.passages[passage_of[doc_id]] if doc_id in passage_of else None,
+                index.section_spans[doc_id] if index.section_spans is not None else None,
+            )
+            for doc_id, score in zip(doc_ids, scores)
+        ]
+
+    def _score_passages(self, query_vec, topic_ids, topic_scores):
+        boost = self.topic_boost
+        n_docs = len(self.index)
+        topic_dense = np.zeros(n_docs)
+        topic_dense[topic_ids] = topic_scores
+
+        passage_ids, passage_scores = sparse_scores(self._passages, query_vec)
+        passage_docs = np.asarray(self.index.passage_doc)[passage_ids]
+        combined = (passage_scores + boost * topic_dense[passage_docs]) / (1 + boost)
+
+        # Best passage per document: sort by (doc, score) and keep each group's last row
+        order = np.lexsort((combined, passage_docs))
+        docs_sorted = passage_docs[order]
+        last = np.ones(len(order), dtype=bool)
+        last[:-1] = docs_sorted[1:] != docs_sorted[:-1]
+        best_docs = docs_sorted[last]
+
+        # Entries that match only on Topic still count, without a passage
+        best = topic_dense * boost / (1 + boost)
+        best[best_docs] = combined[order][last]
+        best_passage = np.full(n_docs, -1, dtype=np.int64)
+        best_passage[best_docs] = passage_ids[order][last]
+
+        doc_ids = np.flatnonzero(best)
+        passage_of = {int(d): int(best_passage[d]) for d in doc_ids if best_passage[d] >= 0}
+        return doc_ids, best[doc_ids], passage_of
@@ -0,0 +1,454 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+from collections import Counter
+
+import numpy as np
+from scipy.sparse import csc_matrix, csr_matrix, diags
+from sklearn.feature_extraction.text import CountVectorizer, TfidfVectorizer
+
+from sections import section_spans_many
+
+
+# Bump this whenever the artifact layout or the preprocessing changes so old
+# artifacts on disk are ignored and rebuilt.
+INDEX_VERSION = 6
+
+DEFAULT_CACHE_DIR = ".index_cache"
+DEFAULT_CHUNK_WORDS = 80
+
+# BM25F: term-frequency saturation, and (weight, length normalisation b) per field
+BM25_K1 = 1.2
+BM25F_FIELDS = {"topic": (3.0, 0.5), "details": (1.0, 0.75)}
+# Character n-grams of the Topic, for misspelt and Roman Urdu queries
+CHAR_NGRAM_RANGE = (3, 4)
+
+_BLANK_LINE = re.compile(r"\n\s*\n")
+
+
+# ----------------------- INDEX OBJECT -----------------------
+
+class RetrievalIndex:
+    """Fitted TF-IDF vectorizer, sparse matrices and row -> Details mapping.
+
+    Built indexes hold CSR matrices; loaded artifacts hold memory-mapped CSC.
+
+    `matrix` has one row per corpus entry (its Topic). When Details chunking is
+    enabled, `passage_matrix` has one row per passage and `passage_doc` maps
+    each passage row back to its corpus entry.
+
+    `bm25_matrix` holds the BM25F weight of every (entry, term) over the Topic
+    and Details fields, with field lengths and document frequencies already
+    folded in, and `bm25_idf` the per-term IDF used to normalise query scores.
+    `bm25_avg_lengths` are the mean Topic and Details lengths behind it.
+    `char_matrix` is the Topic as TF-IDF character n-grams for fuzzy matching.
+    `section_spans` holds the (start, end) offsets of every Details section
+    (see sections.SECTIONS), so answers can quote one part of an entry.
+    """
+
+    def __init__(self, vectorizer, matrix, topics, details, content_hash,
+                 passage_matrix=None, passage_doc=None, passages=None,
+                 term_vectorizer=None, bm25_matrix=None, bm25_idf=None,
+                 char_vectorizer=None, char_matrix=None, section_spans=None,
+                 bm25_avg_lengths=None):
+        self.vectorizer = vectorizer
+        self.matrix = matrix
+        self.topics = topics
+        self.details = details
+        self.content_hash = content_hash
+        self.passage_matrix = passage_matrix
+        self.passage_doc = passage_doc
+        self.passages = passages
+        self.term_vectorizer = term_vectorizer
+        self.bm25_matrix = bm25_matrix
+        self.bm25_idf = bm25_idf
+        self.bm25_avg_lengths = bm25_avg_lengths
+        self.char_vectorizer = char_vectorizer
+        self.char_matrix = char_matrix
+        self.section_spans = section_spans
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+    @property
+    def chunked(self):
+        return self.passage_matrix is not None
+
+
+# ----------------------- BUILD -----------------------
+
+def chunk_details(text, chunk_words=DEFAULT_CHUNK_WORDS):
+    """Split a Details blob into paragraph passages of at most `chunk_words` words"""
+    passages = []
+    for paragraph in _BLANK_LINE.split(text):
+        words = paragraph.split()
+        for start in range(0, len(words), chunk_words):
+            passages.append(" ".join(words[start:start + chunk_words]))
+    return passages
+
+
+def _transform_all(preprocess, texts):
+    if hasattr(preprocess, "transform_many"):
+        return list(preprocess.transform_many(texts))
+    return [preprocess(text) for text in texts]
+
+
+def rows_hash(topics, details, chunk_words=None):
+    """Content hash of (Topic, Details) rows, salted with the artifact version and options"""
+    digest = hashlib.sha256(f"v{INDEX_VERSION}:chunk={chunk_words}:rows:".encode())
+    for topic, text in zip(topics, details):
+        digest.update(topic.encode())
+        digest.update(b"\0")
+        digest.update(text.encode())
+        digest.update(b"\1")
+    return digest.hexdigest()
+
+
+def make_term_vectorizer(vocabulary=None):
+    return CountVectorizer(vocabulary=vocabulary, dtype=np.float32)
+
+
+def make_char_vectorizer(vocabulary=None):
+    return TfidfVectorizer(analyzer="char_wb", ngram_range=CHAR_NGRAM_RANGE, sublinear_tf=True,
+                           vocabulary=vocabulary)
+
+
+def _bm25_idf(df, n_docs):
+    return np.log1p((n_docs - df + 0.5) / (df + 0.5)).astype(np.float32)
+
+
+def _tfidf_idf(df, n_docs):
+    """TfidfVectorizer's smoothed IDF"""
+    return np.log((1 + n_docs) / (1 + df)) + 1
+
+
+def bm25f_weights(field_counts, field_params, k1=BM25_K1, idf=None, avg_lengths=None):
+    """Query-independent BM25F weights as one CSR matrix, the per-term IDF and
+    the mean length of each field.
+
+    Each field's term counts are scaled by weight / (1 - b + b * len / avg_len)
+    and summed into a pseudo-frequency tf, which is stored as
+    idf * tf / (k1 + tf). A query's score is then a sparse dot product, and
+    no weight exceeds its term's IDF. `idf` and `avg_lengths` default to
+    this corpus's own; pass another index's to score on its scale.
+    """
+    pseudo = None
+    fitted_lengths = []
+    for field, (counts, (weight, b)) in enumerate(zip(field_counts, field_params)):
+        lengths = np.asarray(counts.sum(axis=1)).ravel()
+        if avg_lengths is not None:
+            avg_length = avg_lengths[field]
+        else:
+            avg_length = lengths.mean() if lengths.any() else 1.0
+        fitted_lengths.append(avg_length)
+        scaled = diags(weight / (1 - b + b * lengths / avg_length)) @ counts
+        pseudo = scaled if pseudo is None else pseudo + scaled
+    pseudo = csr_matrix(pseudo, dtype=np.float32)
+
+    if idf is None:
+        df = np.bincount(pseudo.indices, minlength=pseudo.shape[1])
+        idf = _bm25_idf(df, pseudo.shape[0])
+    tf = pseudo.data
+    pseudo.data = idf[pseudo.indices] * tf / (k1 + tf)
+    return pseudo, idf, np.asarray(fitted_lengths, dtype=np.float32)
+
+
+def _ranking_fields(topics, details, clean_details):
+    """BM25F, character n-gram and section arrays, shared by the plain and chunked builds"""
+    term_vectorizer = make_term_vectorizer()
+    term_vectorizer.fit(topics + clean_details)
+    bm25_matrix, idf, avg_lengths = bm25f_weights(
+        [term_vectorizer.transform(topics), term_vectorizer.transform(clean_details)],
+        [BM25F_FIELDS["topic"], BM25F_FIELDS["details"]],
+    )
+    char_vectorizer = make_char_vectorizer()
+    char_matrix = char_vectorizer.fit_transform(topics).tocsr()
+    return {
+        "term_vectorizer": term_vectorizer,
+        "bm25_matrix": bm25_matrix,
+        "bm25_idf": idf,
+        "bm25_avg_lengths": avg_lengths,
+        "char_vectorizer": char_vectorizer,
+        "char_matrix": char_matrix,
+        "section_spans": section_spans_many(details),
+    }
+
+
+def _extend(base_vectorizer, base_idf, texts, n_docs, idf_of_df):
+    """Base vocabulary plus the terms only `texts` use, and the matching IDFs.
+
+    Known terms keep the base IDF; new ones get `idf_of_df(df, n_docs)` from
+    their document frequency in `texts`.
+    """
+    analyze = base_vectorizer.build_analyzer()
+    vocabulary = _vocabulary(base_vectorizer)
+    df = Counter()
+    for text in texts:
+        df.update(term for term in set(analyze(text)) if term not in vocabulary)
+    new_terms = sorted(df)
+    for term in new_terms:
+        vocabulary[term] = len(vocabulary)
+    new_idf = idf_of_df(np.asarray([df[term] for term in new_terms], dtype=np.float64), n_docs)
+    return vocabulary, np.concatenate([base_idf, new_idf]).astype(np.asarray(base_idf).dtype)
+
+
+def build_delta_index(raw_topics, details, preprocess, base, chunk_words=None):
+    """Index rows that will be searched next to `base`, on the base's scale.
+
+    Terms the base knows keep its IDFs and BM25F field lengths, so a delta's
+    scores can be compared with the base's. Terms new to the delta are added
+    with IDFs over the base and delta documents together, so new words are
+    still found before the next merge.
+    """
+    topics = _transform_all(preprocess, raw_topics)
+    details = list(details)
+    clean_details = _transform_all(preprocess, details)
+    n_base = len(base)
+
+    passages, passage_doc = [], []
+    if chunk_words:
+        for doc_id, text in enumerate(details):
+            for passage in chunk_details(text, chunk_words):
+                passages.append(passage)
+                passage_doc.append(doc_id)
+    clean_passages = _transform_all(preprocess, passages)
+    fitted = base.matrix.shape[0] + (base.passage_matrix.shape[0] if base.chunked else 0)
+
+    vocabulary, idf = _extend(base.vectorizer, base.vectorizer.idf_, topics + clean_passages,
+                              fitted + len(topics) + len(clean_passages), _tfidf_idf)
+    vectorizer = TfidfVectorizer(vocabulary=vocabulary)
+    vectorizer.idf_ = idf
+
+    # A BM25F document is a row's Topic and Details together
+    documents = [f"{topic} {text}" for topic, text in zip(topics, clean_details)]
+    vocabulary, term_idf = _extend(base.term_vectorizer, base.bm25_idf, documents,
+                                   n_base + len(topics), _bm25_idf)
+    term_vectorizer = make_term_vectorizer(vocabulary)
+    bm25_matrix, term_idf, _ = bm25f_weights(
+        [term_vectorizer.transform(topics), term_vectorizer.transform(clean_details)],
+        [BM25F_FIELDS["topic"], BM25F_FIELDS["details"]],
+        idf=term_idf,
+        avg_lengths=base.bm25_avg_lengths,
+    )
+
+    vocabulary, char_idf = _extend(base.char_vectorizer, base.char_vectorizer.idf_, topics,
+                                   n_base + len(topics), _tfidf_idf)
+    char_vectorizer = make_char_vectorizer(vocabulary)
+    char_vectorizer.idf_ = char_idf
+
+    ranking = {
+        "term_vectorizer": term_vectorizer,
+        "bm25_matrix": bm25_matrix,
+        "bm25_idf": term_idf,
+        "bm25_avg_lengths": base.bm25_avg_lengths,
+        "char_vectorizer": char_vectorizer,
+        "char_matrix": char_vectorizer.transform(topics).tocsr(),
+        "section_spans": section_spans_many(details),
+    }
+    content_hash = _preprocess_key(rows_hash(raw_topics, details, chunk_words), preprocess)
+    if not chunk_words:
+        return RetrievalIndex(vectorizer, vectorizer.transform(topics).tocsr(), topics, details,
+                              content_hash, **ranking)
+    return RetrievalIndex(
+        vectorizer,
+        vectorizer.transform(topics).tocsr(),
+        topics,
+        details,
+        content_hash,
+        passage_matrix=vectorizer.transform(clean_passages).tocsr(),
+        passage_doc=np.asarray(passage_doc, dtype=np.int32),
+        passages=passages,
+        **ranking,
+    )
+
+
+def build_index_from_rows(raw_topics, details, preprocess, content_hash=None, chunk_words=None):
+    """Preprocess every Topic and Details and fit the vectorizers.
+
+    Pass `chunk_words` to also index the Details as passages.
+    """
+    topics = _transform_all(preprocess, raw_topics)
+    details = list(details)
+    content_hash = content_hash or rows_hash(raw_topics, details, chunk_words)
+    ranking = _ranking_fields(topics, details, _transform_all(preprocess, details))
+
+    vectorizer = TfidfVectorizer()
+    if not chunk_words:
+        matrix = vectorizer.fit_transform(topics).tocsr()
+        return RetrievalIndex(vectorizer, matrix, topics, details, content_hash, **ranking)
+
+    passages, passage_doc = [], []
+    for doc_id, text in enumerate(details):
+        for passage in chunk_details(text, chunk_words):
+            passages.append(passage)
+            passage_doc.append(doc_id)
+    clean_passages = _transform_all(preprocess, passages)
+
+    vectorizer.fit(topics + clean_passages)
+    return RetrievalIndex(
+        vectorizer,
+        vectorizer.transform(topics).tocsr(),
+        topics,
+        details,
+        content_hash,
+        passage_matrix=vectorizer.transform(clean_passages).tocsr(),
+        passage_doc=np.asarray(passage_doc, dtype=np.int32),
+        passages=passages,
+        **ranking,
+    )
+
+
+# ----------------------- SAVE / LOAD -----------------------
+
+def _artifact_dir(cache_dir, content_hash):
+    return os.path.join(cache_dir, content_hash[:16])
+
+
+def _save_csc(path, name, matrix):
+    # Column-major on disk, since RetrievalEngine scores one term column at a
+    # time; a loaded artifact is then searched straight from the memory map.
+    matrix = matrix.tocsc()
+    np.save(os.path.join(path, f"{name}.data.npy"), matrix.data)
+    np.save(os.path.join(path, f"{name}.indices.npy"), matrix.indices)
+    np.save(os.path.join(path, f"{name}.indptr.npy"), matrix.indptr)
+
+
+def _load_csc(path, name, shape):
+    def _load(part):
+        return np.load(os.path.join(path, f"{name}.{part}.npy"), mmap_mode="r")
+
+    return csc_matrix(
+        (_load("data"), _load("indices"), _load("indptr")),
+        shape=tuple(shape),
+        copy=False,
+    )
+
+
+def _vocabulary(vectorizer):
+    # A vectorizer built from a saved vocabulary only sets vocabulary_ once used
+    vocabulary = getattr(vectorizer, "vocabulary_", None) or vectorizer.vocabulary
+    return {term: int(col) for term, col in vocabulary.items()}
+
+
+def _load_array(path, name):
+    return np.asarray(np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r"))
+
+
+def save_index(index, cache_dir=DEFAULT_CACHE_DIR):
+    """Write the index as a versioned artifact, atomically replacing any old copy"""
+    os.makedirs(cache_dir, exist_ok=True)
+    target = _artifact_dir(cache_dir, index.content_hash)
+    tmp = tempfile.mkdtemp(dir=cache_dir, prefix=".tmp-")
+    try:
+        _save_csc(tmp, "topics", index.matrix)
+        np.save(os.path.join(tmp, "idf.npy"), index.vectorizer.idf_)
+        _save_csc(tmp, "bm25", index.bm25_matrix)
+        np.save(os.path.join(tmp, "bm25_idf.npy"), index.bm25_idf)
+        np.save(os.path.join(tmp, "bm25_avg_lengths.npy"), index.bm25_avg_lengths)
+        _save_csc(tmp, "chars", index.char_matrix)
+        np.save(os.path.join(tmp, "char_idf.npy"), index.char_vectorizer.idf_)
+        np.save(os.path.join(tmp, "section_spans.npy"), index.section_spans)
+        meta = {
+            "version": INDEX_VERSION,
+            "content_hash": index.content_hash,
+            "shape": list(index.matrix.shape),
+            "vocabulary": _vocabulary(index.vectorizer),
+            "bm25_shape": list(index.bm25_matrix.shape),
+            "term_vocabulary": _vocabulary(index.term_vectorizer),
+            "char_shape": list(index.char_matrix.shape),
+            "char_vocabulary": _vocabulary(index.char_vectorizer),
+            "topics": index.topics,
+            "details": index.details,
+        }
+        if index.chunked:
+            _save_csc(tmp, "passages", index.passage_matrix)
+            np.save(os.path.join(tmp, "passage_doc.npy"), index.passage_doc)
+            meta["passage_shape"] = list(index.passage_matrix.shape)
+            meta["passages"] = index.passages
+        with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        if os.path.exists(target):
+            shutil.rmtree(target)
+        os.replace(tmp, target)
+    except Exception:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    return target
+
+
+def load_index(content_hash, cache_dir=DEFAULT_CACHE_DIR):
+    """Memory-map a saved artifact, or return None if it is missing or stale"""
+    path = _artifact_dir(cache_dir, content_hash)
+    meta_path = os.path.join(path, "meta.json")
+    if not os.path.exists(meta_path):
+        return None
+
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("version") != INDEX_VERSION or meta.get("content_hash") != content_hash:
+            return None
+
+        matrix = _load_csc(path, "topics", meta["shape"])
+        vectorizer = TfidfVectorizer(vocabulary=meta["vocabulary"])
+        vectorizer.idf_ = _load_array(path, "idf")
+        char_vectorizer = make_char_vectorizer(meta["char_vocabulary"])
+        char_vectorizer.idf_ = _load_array(path, "char_idf")
+        ranking = {
+            "term_vectorizer": make_term_vectorizer(meta["term_vocabulary"]),
+            "bm25_matrix": _load_csc(path, "bm25", meta["bm25_shape"]),
+            "bm25_idf": _load_array(path, "bm25_idf"),
+            "bm25_avg_lengths": _load_array(path, "bm25_avg_lengths"),
+            "char_vectorizer": char_vectorizer,
+            "char_matrix": _load_csc(path, "chars", meta["char_shape"]),
+            "section_spans": _load_array(path, "section_spans"),
+        }
+
+        passage_matrix = passage_doc = None
+        if "passage_shape" in meta:
+            passage_matrix = _load_csc(path, "passages", meta["passage_shape"])
+            passage_doc = np.load(os.path.join(path, "passage_doc.npy"), mmap_mode="r")
+    except (OSError, ValueError, KeyError):
+        return None
+
+    return RetrievalIndex(
+        vectorizer, matrix, meta["topics"], meta["details"], content_hash,
+        passage_matrix=passage_matrix,
+        passage_doc=passage_doc,
+        passages=meta.get("passages"),
+        **ranking,
+    )
+
+
+def _preprocess_key(content_hash, preprocess):
+    # Artifacts built by a differently configured preprocessor get their own key
+    tag = getattr(preprocess, "tag", "")
+    if not tag:
+        return content_hash
+    return hashlib.sha256(f"{content_hash}:{tag}".encode()).hexdigest()
+
+
+def load_or_build_index_from_rows(raw_topics, details, preprocess, cache_dir=DEFAULT_CACHE_DIR,
+                                  chunk_words=None):
+    """Load the artifact for these rows, building and saving it only if they changed"""
+    content_hash = _preprocess_key(rows_hash(raw_topics, details, chunk_words), preprocess)
+    index = load_index(content_hash, cache_dir)
+    if index is not None:
+        return index
+    return _build_and_save(
+        lambda: build_index_from_rows(raw_topics, details, preprocess, content_hash, chunk_words),
+        cache_dir,
+    )
+
+
+def _build_and_save(build, cache_dir):
+    index = build()
+    try:
+        save_index(index, cache_dir)
+    except OSError:
+        # A read-only checkout still works, it just rebuilds on the next cold start
+        pass
+    return index
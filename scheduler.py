@@ -0,0 +1,213 @@
+import itertools
+import queue
+import random
+import threading
+import time
+
+
+PRIORITY_EMERGENCY = 0
+PRIORITY_NORMAL = 10
+
+DEFAULT_CONCURRENCY = 4
+DEFAULT_RATE = 2.0  # requests per second
+DEFAULT_BURST = 4
+DEFAULT_DEADLINE = 20.0  # seconds until the first chunk must arrive
+DEFAULT_CHUNK_TIMEOUT = 20.0  # seconds allowed between later chunks
+DEFAULT_MAX_RETRIES = 2
+
+_DONE = object()
+
+
+class DeadlineExceeded(Exception):
+    """The request did not start streaming within its deadline"""
+
+
+# ----------------------- RATE LIMIT -----------------------
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, at most `burst` saved up"""
+
+    def __init__(self, rate=DEFAULT_RATE, burst=DEFAULT_BURST, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self._tokens = float(burst)
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = self.clock()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self):
+        """Take a token if one is available; otherwise return seconds until one is"""
+        with self._lock:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    def acquire(self, deadline=None):
+        """Block until a token is taken. Returns False if `deadline` (monotonic) passes first."""
+        while True:
+            wait = self.try_acquire()
+            if wait == 0.0:
+                return True
+            if deadline is not None and time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+
+# ----------------------- SCHEDULER -----------------------
+
+class _Job:
+    __slots__ = ("prompt", "system", "label", "deadline", "chunks", "cancelled")
+
+    def __init__(self, prompt, system, label, deadline):
+        self.prompt = prompt
+        self.system = system
+        self.label = label
+        self.deadline = deadline
+        self.chunks = queue.Queue()
+        self.cancelled = threading.Event()
+
+
+class LLMScheduler:
+    """Shared front door for every model call.
+
+    A fixed set of worker threads caps concurrent in-flight requests, a token
+    bucket caps the request rate, and a priority queue lets emergency prompts
+    jump ahead of normal ones. Failures before the first chunk are retried
+    with jittered exponential backoff while the deadline allows; a request
+    that has not started streaming by its deadline raises DeadlineExceeded so
+    the caller can fall back to the offline answer.
+    """
+
+    def __init__(self, client, max_concurrency=DEFAULT_CONCURRENCY, rate=DEFAULT_RATE,
+                 burst=DEFAULT_BURST, deadline=DEFAULT_DEADLINE,
+                 chunk_timeout=DEFAULT_CHUNK_TIMEOUT, max_retries=DEFAULT_MAX_RETRIES,
+                 backoff_base=0.5, backoff_max=8.0, seed=None):
+        self.client = client
+        self.bucket = TokenBucket(rate, burst)
+        self.deadline = deadline
+        self.chunk_timeout = chunk_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.rng = random.Random(seed)
+        self.stats = {"submitted": 0, "retries": 0, "failed": 0, "deadline_exceeded": 0}
+        self._queue = queue.PriorityQueue()
+        self._seq = itertools.count()
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._workers = [
+            threading.Thread(target=self._work, name=f"llm-worker-{i}", daemon=True)
+            for i in range(max_concurrency)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def stream(self, prompt, label="", priority=PRIORITY_NORMAL, deadline=None, system=None):
+        """Queue a prompt and yield its chunks as the worker receives them"""
+        budget = self.deadline if deadline is None else deadline
+        job = _Job(prompt, system, label, time.monotonic() + budget)
+        with self._lock:
+            self.stats["submitted"] += 1
+        self._queue.put((priority, next(self._seq), job))
+        return self._consume(job)
+
+    def generate(self, prompt, label="", priority=PRIORITY_NORMAL, deadline=None, system=None):
+        return "".join(self.stream(prompt, label, priority, deadline, system))
+
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def in_flight(self):
+        return self._in_flight
+
+    def shutdown(self):
+        for _ in self._workers:
+            self._queue.put((float("inf"), next(self._seq), None))
+        for worker in self._workers:
+            worker.join()
+
+    # ----------------------- INTERNALS -----------------------
+
+    def _consume(self, job):
+        started = False
+        try:
+            while True:
+                if started:
+                    timeout = self.chunk_timeout
+                else:
+                    timeout = max(0.0, job.deadline - time.monotonic())
+                try:
+                    item = job.chunks.get(timeout=timeout)
+                except queue.Empty:
+                    if not started:
+                        with self._lock:
+                            self.stats["deadline_exceeded"] += 1
+                        raise DeadlineExceeded(f"no response within deadline ({job.label})")
+                    raise TimeoutError(f"model stream stalled ({job.label})")
+                if item is _DONE:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                started = True
+                yield item
+        finally:
+            # Tell the worker to stop if the caller gave up or stopped reading
+            job.cancelled.set()
+
+    def _backoff(self, attempt):
+        delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        return self.rng.uniform(0, delay)  # "full jitter"
+
+    def _work(self):
+        while True:
+            _, _, job = self._queue.get()
+            if job is None:
+                return
+            if job.cancelled.is_set() or time.monotonic() >= job.deadline:
+                continue
+            with self._lock:
+                self._in_flight += 1
+            try:
+                self._run(job)
+            finally:
+                with self._lock:
+                    self._in_flight -= 1
+
+    def _run(self, job):
+        attempt = 0
+        while True:
+            if not self.bucket.acquire(job.deadline):
+                return  # the consumer times out and falls back
+            started = False
+            try:
+                for chunk in self.client.stream(job.prompt, job.label, job.system):
+                    if job.cancelled.is_set():
+                        return
+                    started = True
+                    job.chunks.put(chunk)
+                job.chunks.put(_DONE)
+                return
+            except Exception as exc:
+                delay = self._backoff(attempt)
+                retryable = (
+                    not started
+                    and attempt < self.max_retries
+                    and time.monotonic() + delay < job.deadline
+                    and not job.cancelled.is_set()
+                )
+                if not retryable:
+                    with self._lock:
+                        self.stats["failed"] += 1
+                    job.chunks.put(exc)
+                    return
+                with self._lock:
+                    self.stats["retries"] += 1
+                attempt += 1
+                time.sleep(delay)
@@ -0,0 +1,154 @@
+import re
+
+import numpy as np
+
+
+# Headings used in the Details column, in the order they appear
+SECTIONS = (
+    "WhatItIs",
+    "StepByStep",
+    "RequiredDocuments",
+    "WhereToGo",
+    "FeesAndTime",
+    "ImportantNotes",
+    "Escalation",
+)
+SECTION_COLUMN = {name: i for i, name in enumerate(SECTIONS)}
+
+# Any "CamelCase:" at the start of a line opens a section, so an unknown
+# heading ends the one before it instead of being swallowed by it.
+_HEADING = re.compile(r"^([A-Z][a-z]+(?:[A-Z][a-z]*)*):", re.MULTILINE)
+
+# Question phrasings (English and Roman Urdu) that ask for one section.
+# Topic names such as "Divorce Process" are deliberately not listed, so
+# naming a topic still returns the whole entry.
+DEFAULT_SECTION_LEXICON = {
+    "StepByStep": [
+        r"how\s+(?:do|can|should|to)",
+        r"steps?",
+        r"kaise",
+        r"kese",
+        r"tareeq[ae]",
+        r"tariq[ae]",
+    ],
+    "RequiredDocuments": [
+        r"documents?",
+        r"docs",
+        r"papers?",
+        r"paperwork",
+        r"required",
+        r"requirements?",
+        r"need(?:ed)?\s+to\s+bring",
+        r"what\s+(?:do\s+)?i\s+need",
+        r"kaghzat",
+        r"kagzat",
+        r"dastawez(?:at)?",
+    ],
+    "WhereToGo": [
+        r"where",
+        r"which\s+(?:office|court|center|centre)",
+        r"kahan",
+        r"kidhar",
+    ],
+    "FeesAndTime": [
+        r"fees?",
+        r"cost(?:s)?",
+        r"charges?",
+        r"price",
+        r"how\s+(?:much|long)",
+        r"time",
+        r"days",
+        r"duration",
+        r"kitn[aei]",
+        r"pais[ae]y?",
+    ],
+    "ImportantNotes": [
+        r"tips?",
+        r"notes?",
+        r"warnings?",
+        r"careful",
+        r"precautions?",
+        r"avoid",
+        r"ehtiyat",
+    ],
+    "Escalation": [
+        r"refus(?:e|es|ed|ing)",
+        r"ignor(?:e|es|ed|ing)",
+        r"escalat(?:e|es|ed|ing|ion)",
+        r"appeal",
+        r"not\s+(?:listening|responding|helping)",
+        r"no\s+action",
+        r"higher\s+authority",
+        r"inkar",
+    ],
+    "WhatItIs": [
+        r"what\s+is",
+        r"what's",
+        r"meaning",
+        r"define",
+        r"definition",
+        r"matlab",
+    ],
+}
+
+
+# ----------------------- PARSING -----------------------
+
+def section_spans(text):
+    """(start, end) of each known section in `text`, one row per SECTIONS entry.
+
+    Spans cover the heading line through the end of the section's body, with
+    trailing blank lines trimmed; missing sections are (-1, -1).
+    """
+    spans = np.full((len(SECTIONS), 2), -1, dtype=np.int32)
+    headings = list(_HEADING.finditer(text))
+    for i, match in enumerate(headings):
+        column = SECTION_COLUMN.get(match.group(1))
+        if column is None:
+            continue
+        end = headings[i + 1].start() if i + 1 < len(headings) else len(text)
+        spans[column] = (match.start(), len(text[:end].rstrip()))
+    return spans
+
+
+def section_spans_many(texts):
+    """Stacked section_spans for a list of texts: shape (len(texts), len(SECTIONS), 2)"""
+    if not texts:
+        return np.empty((0, len(SECTIONS), 2), dtype=np.int32)
+    return np.stack([section_spans(text) for text in texts])
+
+
+def extract(text, spans, names):
+    """The named sections of `text` in document order, or None if it has none of them"""
+    picked = sorted(
+        tuple(spans[SECTION_COLUMN[name]]) for name in names
+        if spans[SECTION_COLUMN[name]][0] >= 0
+    )
+    if not picked:
+        return None
+    return "\n\n".join(text[start:end] for start, end in picked)
+
+
+# ----------------------- QUESTION INTENT -----------------------
+
+class SectionClassifier:
+    """Which Details sections a question asks for, from a regex lexicon.
+
+    Returns section names in SECTIONS order, or an empty list when the
+    question names no section (answer with the whole entry). "WhatItIs" is
+    only returned on its own, so "what is the fee" asks for the fee alone.
+    """
+
+    def __init__(self, lexicon=None):
+        lexicon = lexicon or DEFAULT_SECTION_LEXICON
+        self._patterns = [
+            (name, re.compile(r"\b(?:" + "|".join(lexicon[name]) + r")\b", re.IGNORECASE))
+            for name in SECTIONS
+            if lexicon.get(name)
+        ]
+
+    def __call__(self, question):
+        names = [name for name, pattern in self._patterns if pattern.search(question)]
+        if len(names) > 1 and "WhatItIs" in names:
+            names.remove("WhatItIs")
+        return names
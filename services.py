@@ -0,0 +1,328 @@
+"""Process-wide services shared by every session, each built on first use.
+
+Nothing here is constructed at import time and the heavy libraries (nltk,
+scikit-learn, google-generativeai) are only imported inside the getter
+that needs them, so the login page never pays for the NLP stack or the model.
+"""
+import atexit
+import functools
+import logging
+import os
+import threading
+
+import credentials
+import metrics
+from chat_store import SQLiteChatStore
+from connectivity import ConnectivityMonitor, StaticConnectivity
+from context_builder import ContextBuilder
+from db import ConnectionPool
+from emergency import EmergencyClassifier, load_lexicon
+from model_client import FakeModelClient, GeminiClient
+from prompts import CHAT_SYSTEM_PROMPT
+from response_cache import ResponseCache
+from scheduler import LLMScheduler
+from sections import SectionClassifier
+from shared_state import ChatCache, LocalSharedState, SQLiteSharedState
+from user_store import UserStore
+from write_behind import WriteBehindChatStore
+
+
+# ----------------------- SETTINGS -----------------------
+
+# Cost of the password KDF; benchmarks/bench_password_hashing.py picks values
+# that hit a target verify time on the machine it runs on.
+PASSWORD_HASH_PARAMS = credentials.DEFAULT_PARAMS
+
+USERS_DB = "users.db"
+CHATS_DB = "user_chats.db"
+# Chat writes are batched by one background thread, so each batch can afford
+# a full fsync: an acknowledged message survives power loss, not just a crash.
+CHATS_SYNCHRONOUS = "FULL"
+RESPONSE_CACHE_DB = "response_cache.db"
+# Serve a cached answer for a reworded question (TF-IDF cosine >= 0.9 and the
+# same words outside the knowledge-base vocabulary). Off by default: a reworded
+# legal question can still need a different answer.
+RESPONSE_CACHE_SEMANTIC = False
+# Where chat versions live: "sqlite" (a table in CHATS_DB, bumped in the same
+# commit as the messages; right for any number of workers or replicas sharing
+# that file) or "local" (this process's memory: only safe with one worker,
+# since other workers' appends would never invalidate its chat cache)
+SHARED_STATE = os.getenv("PAKLAW_SHARED_STATE", "sqlite")
+
+MODEL_NAME = "gemini-2.5-flash-lite"
+MODEL_TIMEOUT = 20
+API_KEY_FILE = "Secret_key.env"
+
+SCHEDULER_CONCURRENCY = 4
+SCHEDULER_RATE = 2.0  # model requests per second
+SCHEDULER_BURST = 4
+
+OFFLINE_TOP_K = 3
+OFFLINE_THRESHOLD = 0.3
+# Set to a word count (e.g. 80) to also index Details passages, not just Topic
+OFFLINE_CHUNK_WORDS = None
+OFFLINE_TOPIC_BOOST = 2.0
+# "tfidf", "bm25f" or "hybrid"; benchmarks/bench_offline_ranking.py compares them
+OFFLINE_RANKING = "bm25f"
+# Topic character n-gram match used when no word match clears the threshold (None = off)
+OFFLINE_FUZZY_THRESHOLD = 0.3
+# The main CSV plus any extra *.csv / *.jsonl files dropped into knowledge/
+KNOWLEDGE_SOURCES = ["AI_legal_assistance.csv", "knowledge"]
+KNOWLEDGE_WATCH_INTERVAL = 30
+
+# Estimated-token budget for conversation contents sent with each chat turn
+CONTEXT_TOKEN_BUDGET = 1500
+CONTEXT_RECENT_MESSAGES = 6
+
+EMERGENCY_LEXICON_FILE = "emergency_lexicon.json"
+
+# Port for the Prometheus /metrics endpoint (needs PAKLAW_METRICS=1); unset = no server
+METRICS_PORT = os.getenv("PAKLAW_METRICS_PORT")
+
+
+logger = logging.getLogger("paklaw.services")
+
+
+# ----------------------- LAZY SINGLETONS -----------------------
+
+def lazy_singleton(factory):
+    """Call `factory` once, on first use, and hand every caller the same object"""
+    lock = threading.Lock()
+    instance = []
+
+    @functools.wraps(factory)
+    def get():
+        if not instance:
+            with lock:
+                if not instance:
+                    instance.append(factory())
+        return instance[0]
+
+    get.initialized = lambda: bool(instance)
+    return get
+
+
+# ----------------------- STORAGE -----------------------
+
+@lazy_singleton
+def get_user_store():
+    """Shared SQLite user store; imports the old users.csv the first time"""
+    store = UserStore(USERS_DB)
+    store.migrate_csv("users.csv")
+    return store
+
+
+@lazy_singleton
+def get_chat_store():
+    """Shared SQLite chat store behind a write-behind queue, flushed at exit.
+
+    Imports the old user_chats.json the first time.
+    """
+    store = SQLiteChatStore(CHATS_DB, pool=ConnectionPool(CHATS_DB, synchronous=CHATS_SYNCHRONOUS))
+    store.migrate_json("user_chats.json")
+    chats = WriteBehindChatStore(store, state=get_shared_state())
+    chats.listeners.append(metrics.record_chat_write)
+    atexit.register(chats.close)
+    return chats
+
+
+@lazy_singleton
+def get_shared_state():
+    """Per-chat versions that tell every worker which chats changed"""
+    if SHARED_STATE == "sqlite":
+        return SQLiteSharedState(CHATS_DB)
+    if SHARED_STATE != "local":
+        raise ValueError(f"unknown PAKLAW_SHARED_STATE {SHARED_STATE!r}")
+    return LocalSharedState()
+
+
+@lazy_singleton
+def get_chat_cache():
+    """This worker's cache of chat messages, reloaded per chat when its version moves"""
+    return ChatCache(get_chat_store(), get_shared_state())
+
+
+# ----------------------- NLP -----------------------
+
+@lazy_singleton
+def get_preprocessor():
+    """One shared Preprocessor (stopwords, punctuation table, lemma cache) per process.
+
+    Without the NLTK corpora this falls back to the basic preprocessor rather
+    than fail every turn; `python preprocess.py` fetches them.
+    """
+    from preprocess import Preprocessor, missing_nltk_data
+
+    missing = missing_nltk_data()
+    if missing:
+        logger.warning(
+            "NLTK data not installed (%s); matching without lemmas. "
+            "Run `python preprocess.py` once to fetch it.", ", ".join(missing)
+        )
+        return Preprocessor(basic=True)
+    return Preprocessor()
+
+
+@lazy_singleton
+def get_ingestion_pipeline():
+    """Offline index shared by all sessions; picks up source edits without a restart"""
+    from ingest import IngestionPipeline
+
+    pipeline = IngestionPipeline(
+        KNOWLEDGE_SOURCES,
+        get_preprocessor(),
+        chunk_words=OFFLINE_CHUNK_WORDS,
+        k=OFFLINE_TOP_K,
+        threshold=OFFLINE_THRESHOLD,
+        topic_boost=OFFLINE_TOPIC_BOOST,
+        ranking=OFFLINE_RANKING,
+        fuzzy_threshold=OFFLINE_FUZZY_THRESHOLD,
+    )
+    return pipeline.watch(KNOWLEDGE_WATCH_INTERVAL)
+
+
+@lazy_singleton
+def get_emergency_classifier():
+    """English / Roman Urdu / Urdu lexicon compiled once into a single regex"""
+    if os.path.exists(EMERGENCY_LEXICON_FILE):
+        lexicon, negations = load_lexicon(EMERGENCY_LEXICON_FILE)
+        return EmergencyClassifier(lexicon, negations)
+    return EmergencyClassifier()
+
+
+@lazy_singleton
+def get_section_classifier():
+    """Which part of an offline entry (steps, documents, fees...) a question asks for"""
+    return SectionClassifier()
+
+
+@lazy_singleton
+def get_context_builder():
+    return ContextBuilder(
+        CHAT_SYSTEM_PROMPT,
+        token_budget=CONTEXT_TOKEN_BUDGET,
+        recent_messages=CONTEXT_RECENT_MESSAGES,
+    )
+
+
+# ----------------------- MODEL -----------------------
+
+def make_model(system_instruction=None):
+    import google.generativeai as genai
+
+    return genai.GenerativeModel(
+        MODEL_NAME,
+        generation_config={"max_output_tokens": 1080, "temperature": 0.3},
+        system_instruction=system_instruction,
+    )
+
+
+@lazy_singleton
+def get_model_client():
+    """Streaming client shared by all sessions; PAKLAW_FAKE_MODEL=1 uses a local fake.
+
+    The fake's latency comes from PAKLAW_FAKE_MODEL_DELAY (seconds to the first
+    chunk) and PAKLAW_FAKE_MODEL_CHUNK_DELAY (seconds between chunks).
+    """
+    if os.getenv("PAKLAW_FAKE_MODEL"):
+        client = FakeModelClient(
+            first_chunk_delay=float(os.getenv("PAKLAW_FAKE_MODEL_DELAY", "0")),
+            chunk_delay=float(os.getenv("PAKLAW_FAKE_MODEL_CHUNK_DELAY", "0.02")),
+        )
+    else:
+        import google.generativeai as genai
+        from dotenv import load_dotenv
+
+        load_dotenv(API_KEY_FILE)
+        genai.configure(api_key=os.getenv("YOUR_API_KEY"))
+        client = GeminiClient(make_model, timeout=MODEL_TIMEOUT)
+    client.recorder.listeners.append(metrics.record_model_call)
+    return client
+
+
+@lazy_singleton
+def get_scheduler():
+    """Every model call goes through this: shared concurrency cap, rate limit and retries"""
+    return LLMScheduler(
+        get_model_client(),
+        max_concurrency=SCHEDULER_CONCURRENCY,
+        rate=SCHEDULER_RATE,
+        burst=SCHEDULER_BURST,
+        deadline=MODEL_TIMEOUT,
+    )
+
+
+@lazy_singleton
+def get_connectivity_monitor():
+    """Shared background health check against the Gemini endpoint.
+
+    PAKLAW_CONNECTIVITY=online (or offline) pins the answer instead of probing.
+    """
+    pinned = os.getenv("PAKLAW_CONNECTIVITY")
+    if pinned:
+        return StaticConnectivity(pinned.lower() == "online")
+    return ConnectivityMonitor().start()
+
+
+@lazy_singleton
+def get_response_cache():
+    """Shared answer cache; its semantic tier, if on, reuses the offline TF-IDF vectorizer"""
+    return ResponseCache(
+        disk_path=RESPONSE_CACHE_DB,
+        vectorizer=get_ingestion_pipeline().vectorizer if RESPONSE_CACHE_SEMANTIC else None,
+    )
+
+
+# ----------------------- METRICS -----------------------
+
+def service_metrics():
+    """Metrics collector: chat queue and caches, scheduler state, for services already started"""
+    families = []
+    if get_chat_store.initialized():
+        chats = get_chat_store()
+        families.append(("paklaw_chat_write_queue_depth", "gauge",
+                         "Chat messages queued or being written", {(): chats.queue_depth()}))
+        families.append(("paklaw_chat_write_events_total", "counter",
+                         "Chat write-behind counters since start, by event",
+                         {(("event", name),): value for name, value in chats.stats.items()}))
+    if get_chat_cache.initialized():
+        info = get_chat_cache().info()
+        families.append(("paklaw_chat_cache_events_total", "counter",
+                         "Chat cache counters since start, by event",
+                         {(("event", name),): value for name, value in info.items()
+                          if name != "size"}))
+        families.append(("paklaw_chat_cache_entries", "gauge",
+                         "Chats held in this worker's chat cache", {(): info["size"]}))
+    if get_response_cache.initialized():
+        info = get_response_cache().info()
+        families.append(("paklaw_response_cache_events_total", "counter",
+                         "Response cache counters since start, by event",
+                         {(("event", name),): value for name, value in info.items()
+                          if name not in ("size", "hit_rate")}))
+        families.append(("paklaw_response_cache_entries", "gauge",
+                         "Answers held in the in-memory cache tier", {(): info["size"]}))
+    if get_scheduler.initialized():
+        scheduler = get_scheduler()
+        families.append(("paklaw_scheduler_queue_depth", "gauge",
+                         "Model calls waiting for a scheduler worker", {(): scheduler.queue_depth()}))
+        families.append(("paklaw_scheduler_in_flight", "gauge",
+                         "Model calls currently running", {(): scheduler.in_flight()}))
+        families.append(("paklaw_scheduler_events_total", "counter",
+                         "Scheduler counters since start, by event",
+                         {(("event", name),): value for name, value in scheduler.stats.items()}))
+    return families
+
+
+metrics.METRICS.add_collector(service_metrics)
+
+
+@lazy_singleton
+def get_metrics_server():
+    """Start the /metrics endpoint once per process if PAKLAW_METRICS_PORT is set"""
+    if not (metrics.METRICS.enabled and METRICS_PORT):
+        return None
+    try:
+        return metrics.serve(int(METRICS_PORT))
+    except OSError:
+        # Another worker on this host already holds the port
+        return None
@@ -0,0 +1,148 @@
+import os
+import threading
+from collections import OrderedDict
+
+from db import ConnectionPool
+
+
+DEFAULT_MAX_CHATS = 256
+# How long a read waits for this worker's queued writes to the chat
+DEFAULT_FLUSH_TIMEOUT = 2.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS chat_versions (
+    email   TEXT NOT NULL,
+    chat_id TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    PRIMARY KEY (email, chat_id)
+);
+"""
+
+
+# ----------------------- CHAT VERSIONS -----------------------
+
+class SharedState:
+    """Per-chat version numbers shared by every worker that serves a user.
+
+    A chat's version goes up by one each time a change to it commits (an
+    append or a delete) and never goes down; chats never changed through
+    the app are at version 0. Writers never check a version before writing:
+    appends from any worker land at the end of the chat in commit order, so
+    concurrent turns are merged rather than overwritten. Readers keep the
+    version their copy reflects and reload only when it has moved.
+    Subclasses only need to implement version and bump.
+    """
+
+    def version(self, email, chat_id):
+        raise NotImplementedError
+
+    def bump(self, keys, conn=None):
+        """Record one committed change to each (email, chat_id) in `keys`.
+
+        `conn` is an open transaction on the chat database; states that live
+        in that database bump within it (see shares_database).
+        """
+        raise NotImplementedError
+
+    def shares_database(self, path):
+        """True if versions are stored in the SQLite file at `path`"""
+        return False
+
+
+class LocalSharedState(SharedState):
+    """Versions in this process's memory: enough for sessions of one worker"""
+
+    def __init__(self):
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def version(self, email, chat_id):
+        with self._lock:
+            return self._versions.get((email, chat_id), 0)
+
+    def bump(self, keys, conn=None):
+        with self._lock:
+            for key in keys:
+                self._versions[key] = self._versions.get(key, 0) + 1
+
+
+class SQLiteSharedState(SharedState):
+    """Versions in a SQLite table, shared by every process that opens the file"""
+
+    def __init__(self, path, pool=None):
+        self.path = path
+        self.pool = pool or ConnectionPool(path)
+        with self.pool.connection() as conn:
+            conn.executescript(_SCHEMA)
+
+    def version(self, email, chat_id):
+        with self.pool.connection() as conn:
+            row = conn.execute(
+                "SELECT version FROM chat_versions WHERE email = ? AND chat_id = ?",
+                (email, chat_id),
+            ).fetchone()
+        return row["version"] if row else 0
+
+    def bump(self, keys, conn=None):
+        if conn is None:
+            with self.pool.transaction() as conn:
+                return self.bump(keys, conn)
+        conn.executemany(
+            "INSERT INTO chat_versions (email, chat_id, version) VALUES (?, ?, 1) "
+            "ON CONFLICT (email, chat_id) DO UPDATE SET version = version + 1",
+            list(keys),
+        )
+
+    def shares_database(self, path):
+        return os.path.abspath(path) == os.path.abspath(self.path)
+
+
+# ----------------------- CHAT CACHE -----------------------
+
+class ChatCache:
+    """Per-worker LRU of chat messages, checked against SharedState on every read.
+
+    A cached chat is served while its version is unchanged; a chat changed
+    by any worker is reloaded on its next read, and nothing else is.
+    """
+
+    def __init__(self, store, state, max_chats=DEFAULT_MAX_CHATS,
+                 flush_timeout=DEFAULT_FLUSH_TIMEOUT):
+        self.store = store
+        self.state = state
+        self.max_chats = max_chats
+        self.flush_timeout = flush_timeout
+        self._chats = OrderedDict()  # (email, chat_id) -> (version, messages)
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def load(self, email, chat_id):
+        """(messages, version) of one chat; the list is the caller's to change"""
+        key = (email, chat_id)
+        # This worker's queued writes have to commit (and bump the version)
+        # before the version says anything about them. If they are slow the
+        # read goes ahead without them; their commit moves the version later.
+        self.store.flush(email, chat_id, timeout=self.flush_timeout)
+        # Read the version before the messages: a change in between leaves
+        # newer messages under an older version, which only costs a reload.
+        version = self.state.version(email, chat_id)
+        with self._lock:
+            entry = self._chats.get(key)
+            if entry is not None and entry[0] == version:
+                self._chats.move_to_end(key)
+                self.stats["hits"] += 1
+                return list(entry[1]), version
+            self.stats["misses"] += 1
+
+        messages = self.store.load_messages(email, chat_id)
+        with self._lock:
+            self._chats[key] = (version, messages)
+            self._chats.move_to_end(key)
+            while len(self._chats) > self.max_chats:
+                self._chats.popitem(last=False)
+                self.stats["evictions"] += 1
+        return list(messages), version
+
+    def info(self):
+        with self._lock:
+            return dict(self.stats, size=len(self._chats))
@@ -0,0 +1,110 @@
+import csv
+import os
+import sqlite3
+from datetime import datetime
+
+from db import ConnectionPool
+
+
+DEFAULT_DB_PATH = "users.db"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    email         TEXT NOT NULL,
+    username      TEXT NOT NULL,
+    password_hash TEXT NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS users_by_email ON users (email);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+# ----------------------- USER STORE -----------------------
+
+class UserStore:
+    """User accounts keyed by email on SQLite.
+
+    Lookups go through the unique email index, and signup is a single
+    insert-if-absent, so two people registering the same email at once
+    cannot both succeed.
+    """
+
+    def __init__(self, path=DEFAULT_DB_PATH, pool=None):
+        self.path = path
+        self.pool = pool or ConnectionPool(path)
+        with self.pool.connection() as conn:
+            conn.executescript(_SCHEMA)
+
+    def get(self, email):
+        """Return {"email", "username", "password_hash"} or None"""
+        with self.pool.connection() as conn:
+            row = conn.execute(
+                "SELECT email, username, password_hash FROM users WHERE email = ?",
+                (email,),
+            ).fetchone()
+        return dict(row) if row else None
+
+    def exists(self, email):
+        with self.pool.connection() as conn:
+            row = conn.execute("SELECT 1 FROM users WHERE email = ?", (email,)).fetchone()
+        return row is not None
+
+    def add(self, username, email, password_hash):
+        """Insert a new user. Returns False if the email is already registered."""
+        try:
+            with self.pool.transaction() as conn:
+                conn.execute(
+                    "INSERT INTO users (email, username, password_hash) VALUES (?, ?, ?)",
+                    (email, username, password_hash),
+                )
+        except sqlite3.IntegrityError:
+            return False
+        return True
+
+    def set_password_hash(self, email, password_hash):
+        with self.pool.transaction() as conn:
+            conn.execute(
+                "UPDATE users SET password_hash = ? WHERE email = ?",
+                (password_hash, email),
+            )
+
+    def count(self):
+        with self.pool.connection() as conn:
+            return conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+
+    # ----------------------- MIGRATION -----------------------
+
+    def migrate_csv(self, csv_path="users.csv"):
+        """One-shot import of the old users.csv. Returns the number of users imported."""
+        if not os.path.exists(csv_path):
+            return 0
+        with self.pool.connection() as conn:
+            done = conn.execute("SELECT value FROM meta WHERE key = 'migrated_csv'").fetchone()
+        if done is not None:
+            return 0
+
+        with open(csv_path, "r", encoding="utf-8", newline="") as f:
+            rows = [
+                (row["email"], row["username"], row["password_hash"])
+                for row in csv.DictReader(f)
+                if row.get("email")
+            ]
+
+        with self.pool.transaction() as conn:
+            before = conn.total_changes
+            # First row wins for duplicate emails, matching the old
+            # authenticate(), which returned the first matching row.
+            conn.executemany(
+                "INSERT OR IGNORE INTO users (email, username, password_hash) VALUES (?, ?, ?)",
+                rows,
+            )
+            imported = conn.total_changes - before
+            conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('migrated_csv', ?)",
+                (datetime.now().isoformat(),),
+            )
+        return imported
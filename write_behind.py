@@ -0,0 +1,334 @@
+import itertools
+import logging
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from chat_store import DEFAULT_SEARCH_LIMIT, ChatStore
+
+
+DEFAULT_CLOSE_TIMEOUT = 10.0
+# Reads wait at most this long for the reader's own queued writes
+DEFAULT_READ_FLUSH_TIMEOUT = 2.0
+RETRY_BASE = 0.05
+RETRY_MAX = 5.0
+# Errors worth retrying the whole batch for (a locked or busy database, a
+# full disk); anything else is blamed on the appends themselves
+TRANSIENT_ERRORS = (sqlite3.OperationalError,)
+
+logger = logging.getLogger("paklaw.write_behind")
+
+
+class WriteStats:
+    """One committed batch: last ticket covered, size, commit time and queueing lag, in seconds"""
+
+    __slots__ = ("ticket", "chats", "messages", "seconds", "lag")
+
+    def __init__(self, ticket, chats, messages, seconds, lag):
+        self.ticket = ticket
+        self.chats = chats
+        self.messages = messages
+        self.seconds = seconds
+        self.lag = lag
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class _Pending:
+    """Appends queued for one chat as (ticket, messages), in submission order"""
+
+    __slots__ = ("parts", "title", "timestamp", "queued_at")
+
+    def __init__(self, ticket, messages, title, timestamp):
+        self.parts = [(ticket, list(messages))]
+        self.title = title
+        self.timestamp = timestamp
+        self.queued_at = time.monotonic()
+
+    @property
+    def messages(self):
+        return [message for _, messages in self.parts for message in messages]
+
+    def merge(self, later):
+        self.parts.extend(later.parts)
+        self.timestamp = later.timestamp
+
+
+# ----------------------- WRITE-BEHIND STORE -----------------------
+
+class WriteBehindChatStore(ChatStore):
+    """Wraps a ChatStore so appends return at once and one thread writes them.
+
+    Appends are queued per chat. Everything queued when the writer wakes goes
+    to the store as a single append_batch (one transaction, so one commit and
+    one fsync), and appends to a chat that arrive meanwhile are merged into
+    one write. `append_messages` returns a ticket; a ticket is acknowledged
+    once the batch holding it has committed (see `acked` and `wait`), and
+    `listeners` get a WriteStats for every batch.
+
+    A batch that fails with a transient error (TRANSIENT_ERRORS) is retried
+    with backoff. Any other error is blamed on its appends, which are then
+    written one at a time: the ones that still fail are dropped, logged,
+    counted in stats["failed"] and their tickets released as failed, so one
+    bad row never holds up anybody else's writes.
+
+    Reads of messages first wait (briefly) for that user's queued writes, so
+    a session always sees its own messages; other users are never held up.
+    The chat index (`list_chats`, `count_chats`) never waits: queued chats
+    are merged into the committed rows from memory. `message_count` (and so
+    `sync_chat`) counts queued messages as well.
+    With a SharedState, every committed chat has its version bumped (in the
+    batch's own transaction when the versions share the chat database)
+    before its tickets are acknowledged.
+    """
+
+    def __init__(self, store, state=None):
+        self.store = store
+        self.state = state
+        self.listeners = []
+        self.stats = {"submitted": 0, "coalesced": 0, "batches": 0, "messages": 0, "errors": 0,
+                      "failed": 0}
+        self.acked = 0
+        self._failed = set()  # tickets whose append was dropped
+        self._tickets = itertools.count(1)
+        self._last_ticket = 0
+        self._pending = {}  # (email, chat_id) -> _Pending, in submission order
+        self._writing = {}
+        self._closed = False
+        self._cond = threading.Condition()
+        self._writer = threading.Thread(target=self._run, name="chat-writer", daemon=True)
+        self._writer.start()
+
+    # ----------------------- WRITES -----------------------
+
+    def append_messages(self, email, chat_id, messages, title=None, timestamp=None):
+        """Queue the append and return its ticket"""
+        key = (email, chat_id)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("chat store is closed")
+            ticket = next(self._tickets)
+            pending = _Pending(ticket, messages, title or chat_id,
+                               timestamp or datetime.now().isoformat())
+            queued = self._pending.get(key)
+            if queued is None:
+                self._pending[key] = pending
+            else:
+                queued.merge(pending)
+                self.stats["coalesced"] += 1
+            self.stats["submitted"] += 1
+            self._last_ticket = ticket
+            self._cond.notify_all()
+            return ticket
+
+    def delete_chat(self, email, chat_id):
+        self.flush(email, chat_id)
+        self.store.delete_chat(email, chat_id)
+        if self.state is not None:
+            self.state.bump([(email, chat_id)])
+
+    def wait(self, ticket, timeout=None):
+        """Block until `ticket` is committed; False on timeout or if its append was dropped"""
+        with self._cond:
+            done = self._cond.wait_for(lambda: self.acked >= ticket, timeout)
+            return done and ticket not in self._failed
+
+    def flush(self, email=None, chat_id=None, timeout=None):
+        """Block until queued writes (all, one user's or one chat's) are committed.
+
+        Returns False if `timeout` passes first.
+        """
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._queued(email, chat_id), timeout)
+
+    def queue_depth(self):
+        """Messages queued or being written"""
+        with self._cond:
+            return sum(
+                len(pending.messages)
+                for pending in itertools.chain(self._pending.values(), self._writing.values())
+            )
+
+    def close(self, timeout=DEFAULT_CLOSE_TIMEOUT):
+        """Write out everything queued and stop the writer; False if it timed out"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._writer.join(timeout)
+        if self._writer.is_alive():
+            logger.error("chat writer did not finish: %d messages not written", self.queue_depth())
+            return False
+        return True
+
+    # ----------------------- READS -----------------------
+
+    def list_chats(self, email, limit=None, offset=0, title_filter=""):
+        chats = self._chat_index(email, title_filter)
+        if chats is None:
+            return self.store.list_chats(email, limit, offset, title_filter)
+        return chats[offset:None if limit is None else offset + limit]
+
+    def count_chats(self, email, title_filter=""):
+        chats = self._chat_index(email, title_filter)
+        if chats is None:
+            return self.store.count_chats(email, title_filter)
+        return len(chats)
+
+    def load_messages(self, email, chat_id):
+        self.flush(email, chat_id, timeout=DEFAULT_READ_FLUSH_TIMEOUT)
+        return self.store.load_messages(email, chat_id)
+
+    def message_count(self, email, chat_id):
+        """Stored plus queued messages; only waits while the chat is mid-write"""
+        key = (email, chat_id)
+        with self._cond:
+            # A batch moves from pending to writing under the lock, so while
+            # this chat is not being written the stored count cannot change.
+            self._cond.wait_for(lambda: key not in self._writing)
+            pending = self._pending.get(key)
+            queued = len(pending.messages) if pending else 0
+            return self.store.message_count(email, chat_id) + queued
+
+    def search(self, email, query, limit=DEFAULT_SEARCH_LIMIT):
+        self.flush(email, timeout=DEFAULT_READ_FLUSH_TIMEOUT)
+        return self.store.search(email, query, limit=limit)
+
+    def _chat_index(self, email, title_filter):
+        """The user's committed chats merged with their queued ones, newest first.
+
+        None if nothing of theirs is queued.
+        """
+        with self._cond:
+            queued = [
+                (chat_id, pending.title, pending.timestamp, len(pending.messages))
+                for key_chats in (self._writing, self._pending)
+                for (owner, chat_id), pending in key_chats.items()
+                if owner == email
+            ]
+        if not queued:
+            return None
+        chats = {entry["chat_id"]: entry for entry in self.store.list_chats(email)}
+        for chat_id, title, timestamp, count in queued:
+            entry = chats.get(chat_id)
+            if entry is None:
+                chats[chat_id] = {"chat_id": chat_id, "title": title, "timestamp": timestamp,
+                                  "n_messages": count}
+            elif timestamp > entry["timestamp"]:
+                # Not committed yet (a committed append stamps its chat's row)
+                entry["timestamp"] = timestamp
+                entry["n_messages"] += count
+        title_filter = title_filter.lower()
+        return sorted(
+            (entry for entry in chats.values() if title_filter in entry["title"].lower()),
+            key=lambda entry: entry["timestamp"],
+            reverse=True,
+        )
+
+    # ----------------------- WRITER -----------------------
+
+    def _queued(self, email, chat_id):
+        return any(
+            (email is None or key[0] == email) and (chat_id is None or key[1] == chat_id)
+            for key in itertools.chain(self._pending, self._writing)
+        )
+
+    def _run(self):
+        delay = RETRY_BASE
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending or self._closed)
+                if not self._pending:
+                    return
+                # Everything queued so far goes into this batch, so committing
+                # it acknowledges every ticket issued up to now.
+                batch, self._pending = self._pending, {}
+                self._writing = batch
+                ticket = self._last_ticket
+
+            chats = len(batch)
+            messages = sum(len(pending.messages) for pending in batch.values())
+            lag = time.monotonic() - min(pending.queued_at for pending in batch.values())
+            start = time.perf_counter()
+            failed = []
+            split = False
+            try:
+                try:
+                    self.store.append_batch([
+                        (email, chat_id, pending.messages, pending.title, pending.timestamp)
+                        for (email, chat_id), pending in batch.items()
+                    ], state=self.state)
+                except TRANSIENT_ERRORS:
+                    raise
+                except Exception:
+                    logger.exception("chat batch failed; writing its appends one at a time")
+                    split = True
+                    self._write_each(batch, failed)
+            except TRANSIENT_ERRORS:
+                logger.exception("chat write failed; retrying in %.2fs", delay)
+                with self._cond:
+                    self._drop(failed)
+                    self.stats["errors"] += 1
+                    self._requeue(batch)
+                    self._cond.wait(delay)
+                delay = min(delay * 2, RETRY_MAX)
+                continue
+            delay = RETRY_BASE
+            done = time.perf_counter()
+
+            stats = WriteStats(
+                ticket, chats, messages - sum(n for _, n in failed), done - start, lag
+            )
+            with self._cond:
+                self._writing = {}
+                self._drop(failed)
+                self.acked = ticket
+                self.stats["batches"] += 1
+                self.stats["messages"] += stats.messages
+                self.stats["errors"] += split
+                self._cond.notify_all()
+            for listener in self.listeners:
+                try:
+                    listener(stats)
+                except Exception:
+                    # A broken listener must not stop the only writer
+                    logger.exception("chat write listener failed")
+
+    def _write_each(self, batch, failed):
+        """Write a failed batch one append at a time, in order.
+
+        Each append that still fails is dropped and its (ticket, message
+        count) added to `failed`. Appends leave `batch` as they are dealt
+        with, so after a transient error (re-raised) only the unwritten ones
+        are left to retry.
+        """
+        for (email, chat_id), pending in list(batch.items()):
+            while pending.parts:
+                ticket, messages = pending.parts[0]
+                try:
+                    self.store.append_batch(
+                        [(email, chat_id, messages, pending.title, pending.timestamp)],
+                        state=self.state,
+                    )
+                except TRANSIENT_ERRORS:
+                    raise
+                except Exception:
+                    logger.exception("chat append %d failed; dropping it", ticket)
+                    failed.append((ticket, len(messages)))
+                pending.parts.pop(0)
+            del batch[(email, chat_id)]
+
+    def _drop(self, failed):
+        self._failed.update(ticket for ticket, _ in failed)
+        self.stats["failed"] += len(failed)
+
+    def _requeue(self, batch):
+        """Put a failed batch back ahead of anything queued since, keeping per-chat order"""
+        for key, later in self._pending.items():
+            if key in batch:
+                batch[key].merge(later)
+            else:
+                batch[key] = later
+        self._pending = batch
+        self._writing = {}